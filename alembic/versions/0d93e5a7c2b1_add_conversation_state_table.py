@@ -0,0 +1,58 @@
+"""Add conversation_state table
+
+Revision ID: 0d93e5a7c2b1
+Revises: 6c1f0b8d4e52
+Create Date: 2026-03-22 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0d93e5a7c2b1"
+down_revision: Union[str, Sequence[str], None] = "6c1f0b8d4e52"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "conversation_state",
+        sa.Column("platform", sa.String(), nullable=False),
+        sa.Column("contact_id", sa.String(), nullable=False),
+        sa.Column("stage", sa.String(), nullable=False, server_default="chatting"),
+        sa.Column("pending_order_id", sa.Integer(), nullable=True),
+        sa.Column("last_activity_at", sa.BigInteger(), nullable=True),
+        sa.PrimaryKeyConstraint("platform", "contact_id"),
+    )
+    # One row per conversation with replies, staged from its latest reply the
+    # way the old substring check read it.
+    op.execute(
+        """
+        INSERT INTO conversation_state (platform, contact_id, stage, last_activity_at)
+        SELECT m.platform,
+               m.contact_id,
+               CASE WHEN lower(m.body) LIKE '%type the name on your bank account%'
+                    THEN 'awaiting_payment_name' ELSE 'chatting' END,
+               m.timestamp
+        FROM messages m
+        WHERE m.direction = 'outbound'
+          AND m.platform IS NOT NULL
+          AND m.contact_id IS NOT NULL
+          AND m.id = (
+              SELECT latest.id FROM messages latest
+              WHERE latest.platform = m.platform
+                AND latest.contact_id = m.contact_id
+                AND latest.direction = 'outbound'
+              ORDER BY latest.timestamp DESC, latest.id DESC
+              LIMIT 1
+          )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("conversation_state")
@@ -0,0 +1,48 @@
+"""Add inbound work queue columns to processed webhook events
+
+Revision ID: 5d7a3f1e9b20
+Revises: 2a1d9e7c6b34
+Create Date: 2026-03-10 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5d7a3f1e9b20"
+down_revision: Union[str, Sequence[str], None] = "2a1d9e7c6b34"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing rows were processed inline by the webhooks, so they default to "done".
+    with op.batch_alter_table("processed_webhook_events") as batch_op:
+        batch_op.add_column(sa.Column("status", sa.String(), nullable=False, server_default="done"))
+        batch_op.add_column(sa.Column("payload", sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column("locked_by", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("locked_at", sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column("processed_at", sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column("last_error", sa.String(), nullable=True))
+    op.create_index(
+        "ix_processed_webhook_events_status_id",
+        "processed_webhook_events",
+        ["status", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_processed_webhook_events_status_id", table_name="processed_webhook_events")
+    with op.batch_alter_table("processed_webhook_events") as batch_op:
+        batch_op.drop_column("last_error")
+        batch_op.drop_column("processed_at")
+        batch_op.drop_column("locked_at")
+        batch_op.drop_column("locked_by")
+        batch_op.drop_column("attempts")
+        batch_op.drop_column("payload")
+        batch_op.drop_column("status")
@@ -0,0 +1,48 @@
+"""Add composite indexes for the messages hot path and pending orders
+
+Revision ID: 6c1f0b8d4e52
+Revises: a3c7d2e9f180
+Create Date: 2026-03-20 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "6c1f0b8d4e52"
+down_revision: Union[str, Sequence[str], None] = "a3c7d2e9f180"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+MESSAGE_INDEXES = {
+    "ix_messages_contact_platform_direction_ts": ["contact_id", "platform", "direction", "timestamp"],
+    "ix_messages_contact_platform_ts": ["contact_id", "platform", "timestamp"],
+    "ix_messages_timestamp": ["timestamp"],
+}
+PENDING_ORDER_FILTER = "status = 'Pending'"
+
+
+def upgrade() -> None:
+    for name, columns in MESSAGE_INDEXES.items():
+        op.create_index(name, "messages", columns, unique=False)
+    op.create_index(
+        "ix_orders_pending_user_id",
+        "orders",
+        ["user_id"],
+        unique=False,
+        postgresql_where=sa.text(PENDING_ORDER_FILTER),
+        sqlite_where=sa.text(PENDING_ORDER_FILTER),
+    )
+    # Fresh statistics so the planner picks the new indexes straight away.
+    if op.get_bind().dialect.name in ("sqlite", "postgresql"):
+        op.execute("ANALYZE")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_orders_pending_user_id", table_name="orders")
+    for name in reversed(list(MESSAGE_INDEXES)):
+        op.drop_index(name, table_name="messages")
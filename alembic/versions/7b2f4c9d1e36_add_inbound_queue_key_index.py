@@ -0,0 +1,30 @@
+"""Index the inbound queue by conversation for per-conversation ordering
+
+Revision ID: 7b2f4c9d1e36
+Revises: 0d93e5a7c2b1
+Create Date: 2026-03-24 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7b2f4c9d1e36"
+down_revision: Union[str, Sequence[str], None] = "0d93e5a7c2b1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_processed_webhook_events_key_status_id",
+        "processed_webhook_events",
+        ["conversation_key", "status", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_processed_webhook_events_key_status_id", table_name="processed_webhook_events")
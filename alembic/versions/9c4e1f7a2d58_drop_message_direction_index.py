@@ -0,0 +1,33 @@
+"""Drop the messages (contact, platform, direction, timestamp) index
+
+The latest-outbound-reply lookup it served was replaced by the
+conversation_state row, and no query filters on direction any more.
+
+Revision ID: 9c4e1f7a2d58
+Revises: 7b2f4c9d1e36
+Create Date: 2026-03-25 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9c4e1f7a2d58"
+down_revision: Union[str, Sequence[str], None] = "7b2f4c9d1e36"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_index("ix_messages_contact_platform_direction_ts", table_name="messages")
+
+
+def downgrade() -> None:
+    op.create_index(
+        "ix_messages_contact_platform_direction_ts",
+        "messages",
+        ["contact_id", "platform", "direction", "timestamp"],
+        unique=False,
+    )
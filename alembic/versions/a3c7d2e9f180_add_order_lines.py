@@ -0,0 +1,107 @@
+"""Add structured cart lines to orders
+
+Revision ID: a3c7d2e9f180
+Revises: e1f6a8c3b457
+Create Date: 2026-03-18 00:00:00.000000
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a3c7d2e9f180"
+down_revision: Union[str, Sequence[str], None] = "e1f6a8c3b457"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+orders = sa.table(
+    "orders",
+    sa.column("id", sa.Integer),
+    sa.column("items", sa.String),
+    sa.column("status", sa.String),
+    sa.column("lines", sa.JSON),
+)
+menu_items = sa.table(
+    "menu_items",
+    sa.column("id", sa.Integer),
+    sa.column("name", sa.String),
+    sa.column("price", sa.Integer),
+)
+
+
+def _parse_summary(summary: str | None) -> list[tuple[str, int]]:
+    parsed = []
+    for segment in (summary or "").split(","):
+        match = re.match(r"^(\d+)\s*x\s*(.+)$", segment.strip(), flags=re.IGNORECASE)
+        if match and int(match.group(1)) > 0 and match.group(2).strip():
+            parsed.append((match.group(2).strip(), int(match.group(1))))
+    return parsed
+
+
+def _normalize(value: str) -> str:
+    cleaned = "".join(ch.lower() if ch.isalnum() else " " for ch in value)
+    return " ".join(cleaned.split())
+
+
+def _resolve(name: str, menu_rows: list):
+    """
+    The cart's name matching as of this revision, frozen here so later
+    changes to app code don't change what the migration writes: an equal
+    name, else the first name containing (or contained in) it, else the
+    most shared words.
+    """
+    target = _normalize(name)
+    if not target:
+        return None
+    names = [(row, _normalize(row.name)) for row in menu_rows]
+    for row, row_name in names:
+        if row_name == target:
+            return row
+    for row, row_name in names:
+        if target in row_name or row_name in target:
+            return row
+    target_tokens = set(target.split())
+    best_row, best_score = None, 0
+    for row, row_name in names:
+        score = len(target_tokens & set(row_name.split()))
+        if score > best_score:
+            best_row, best_score = row, score
+    return best_row
+
+
+def backfill_order_lines(bind) -> None:
+    """Writes `lines` for open carts from their "2 x Jollof Rice" summaries."""
+    menu_rows = bind.execute(
+        sa.select(menu_items.c.id, menu_items.c.name, menu_items.c.price)
+        .where(menu_items.c.name.isnot(None))
+        .order_by(menu_items.c.id)
+    ).fetchall()
+    pending = bind.execute(
+        sa.select(orders.c.id, orders.c["items"]).where(orders.c.status == "Pending")
+    ).fetchall()
+    for order in pending:
+        lines = []
+        for name, qty in _parse_summary(order.items):
+            item = _resolve(name, menu_rows)
+            if item is not None:
+                lines.append({"item_id": item.id, "name": item.name, "qty": qty, "unit_price": int(item.price or 0)})
+            else:
+                # Re-resolved by name on the next cart update or confirmation.
+                lines.append({"item_id": None, "name": name, "qty": qty, "unit_price": 0})
+        bind.execute(orders.update().where(orders.c.id == order.id).values(lines=lines))
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("orders") as batch_op:
+        batch_op.add_column(sa.Column("lines", sa.JSON(), nullable=True))
+    backfill_order_lines(op.get_bind())
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("orders") as batch_op:
+        batch_op.drop_column("lines")
@@ -0,0 +1,37 @@
+"""Add conversation sharding columns to the inbound work queue
+
+Revision ID: b9e4c2a7d613
+Revises: 5d7a3f1e9b20
+Create Date: 2026-03-12 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b9e4c2a7d613"
+down_revision: Union[str, Sequence[str], None] = "5d7a3f1e9b20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("processed_webhook_events") as batch_op:
+        batch_op.add_column(sa.Column("conversation_key", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("shard", sa.Integer(), nullable=True))
+    op.create_index(
+        "ix_processed_webhook_events_status_shard_id",
+        "processed_webhook_events",
+        ["status", "shard", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_processed_webhook_events_status_shard_id", table_name="processed_webhook_events")
+    with op.batch_alter_table("processed_webhook_events") as batch_op:
+        batch_op.drop_column("shard")
+        batch_op.drop_column("conversation_key")
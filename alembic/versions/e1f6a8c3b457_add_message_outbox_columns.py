@@ -0,0 +1,48 @@
+"""Add outbox delivery columns to messages
+
+Revision ID: e1f6a8c3b457
+Revises: b9e4c2a7d613
+Create Date: 2026-03-15 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e1f6a8c3b457"
+down_revision: Union[str, Sequence[str], None] = "b9e4c2a7d613"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("messages") as batch_op:
+        batch_op.add_column(sa.Column("delivery_status", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("delivery_attempts", sa.Integer(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column("next_attempt_at", sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column("delivered_at", sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column("last_delivery_error", sa.String(), nullable=True))
+    op.create_index(
+        "ix_messages_delivery_status_next_attempt",
+        "messages",
+        ["delivery_status", "next_attempt_at"],
+        unique=False,
+    )
+    # Replies written before the outbox existed were sent inline; never resend them.
+    op.execute(
+        "UPDATE messages SET delivery_status = 'sent', delivered_at = timestamp "
+        "WHERE direction = 'outbound'"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_delivery_status_next_attempt", table_name="messages")
+    with op.batch_alter_table("messages") as batch_op:
+        batch_op.drop_column("last_delivery_error")
+        batch_op.drop_column("delivered_at")
+        batch_op.drop_column("next_attempt_at")
+        batch_op.drop_column("delivery_attempts")
+        batch_op.drop_column("delivery_status")
@@ -4,8 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
-from app.services.chat_manager import process_message
-from app.services.webhook_dedupe import claim_webhook_event, release_webhook_claim
+from app.services.inbound_queue import enqueue_inbound_message
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -42,21 +41,19 @@ async def telegram_webhook(request: Request, db: Session = Depends(get_db)):
         user_id = str(msg["chat"]["id"])
         event_id = str(data.get("update_id") or f"{user_id}:{msg.get('message_id')}")
 
-        if not claim_webhook_event(db, "telegram", event_id):
-            logger.info("duplicate Telegram webhook ignored event_id=%s", event_id)
-            return {"status": "duplicate_ignored"}
-
-        processed = process_message(
-            platform="telegram",
+        # Processing happens in the worker pool (worker.py); the webhook only enqueues.
+        queued = enqueue_inbound_message(
+            db,
+            "telegram",
+            event_id,
             user_id=user_id,
             user_name=msg.get("from", {}).get("first_name", "User"),
             message_text=msg.get("text", ""),
-            db=db,
             source_timestamp_ms=parse_source_timestamp_ms(msg.get("date")),
         )
-        if not processed:
-            release_webhook_claim(db, "telegram", event_id)
-            raise HTTPException(status_code=500, detail="Failed to process message")
+        if not queued:
+            logger.info("duplicate Telegram webhook ignored event_id=%s", event_id)
+            return {"status": "duplicate_ignored"}
     except HTTPException:
         raise
     except (KeyError, TypeError, ValueError):
@@ -3,15 +3,14 @@ import hmac
 import logging
 import os
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import PlainTextResponse
 from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
 from app.models.schemas import WhatsAppWebhookSchema
-from app.services.chat_manager import process_message
-from app.services.webhook_dedupe import claim_webhook_event, release_webhook_claim
+from app.services.inbound_queue import enqueue_inbound_message
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -75,7 +74,6 @@ async def verify_webhook(
 @router.post("/webhook")
 async def whatsapp_webhook(
     request: Request,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
 ):
     """
@@ -83,7 +81,7 @@ async def whatsapp_webhook(
     
     CRITICAL FASTAPI PATTERN:
     - Return 200 OK immediately to Meta (they retry if no response within ~30s)
-    - Queue message processing in BackgroundTasks
+    - Only enqueue here; the worker pool (worker.py) runs process_message
     - Safe parsing for status updates (delivered/read receipts)
     """
     raw_body = await request.body()
@@ -101,105 +99,88 @@ async def whatsapp_webhook(
         logger.warning("Invalid webhook payload: %s", e)
         raise HTTPException(status_code=400, detail="Invalid webhook payload")
 
-    # Queue the message processing in the background
-    background_tasks.add_task(
-        _process_whatsapp_message,
-        payload_dict=payload.model_dump(by_alias=True),
-        db=db,
-    )
+    try:
+        message = extract_whatsapp_message(payload.model_dump(by_alias=True))
+        if message is None:
+            return {"status": "received"}
+
+        # Deduplication and enqueue happen in a single insert
+        event_id = message.pop("event_id")
+        queued = enqueue_inbound_message(db, "whatsapp", event_id, **message)
+        if not queued:
+            logger.info("Duplicate WhatsApp webhook ignored - event_id=%s", event_id)
+    except (KeyError, TypeError, ValueError) as e:
+        logger.exception("Invalid WhatsApp payload shape: %s", e)
+    except Exception as e:
+        logger.exception("Unexpected error queueing WhatsApp message: %s", e)
+        raise HTTPException(status_code=500, detail="Webhook processing error")
 
     # Return 200 OK immediately to Meta
     return {"status": "received"}
 
 
-async def _process_whatsapp_message(payload_dict: dict, db: Session):
+def extract_whatsapp_message(payload_dict: dict) -> dict | None:
     """
-    Background task: Process the WhatsApp message.
+    Pull the first inbound message out of a webhook payload.
     
     Safely extracts: wa_id (sender's phone), name (profile name), text.body (message).
-    Handles status updates (delivered/read) gracefully without crashing.
+    Returns None for status updates (delivered/read) and unusable messages.
     """
-    try:
-        # Safe nested navigation - handles status updates without 'messages' field
-        entries = payload_dict.get("entry", [])
-        if not entries:
-            logger.debug("No entries in webhook payload")
-            return
-
-        entry = entries[0]
-        changes = entry.get("changes", [])
-        if not changes:
-            logger.debug("No changes in entry")
-            return
-
-        value = changes[0].get("value", {})
-        
-        # Status updates (delivered/read) have no 'messages' field - ignore gracefully
-        messages = value.get("messages")
-        if not messages:
-            logger.debug("No messages in value (possibly a status update)")
-            return
-
-        msg = messages[0]
-        user_id = msg.get("from")
-        if not user_id:
-            logger.warning("Message missing 'from' field")
-            return
-
-        # Extract contact name from contacts array (safe .get())
-        user_name = "Student"  # Default fallback
-        contacts = value.get("contacts", [])
-        if contacts:
-            contact_profile = contacts[0].get("profile", {})
-            user_name = contact_profile.get("name", "Student")
-
-        # Extract message text (safe handling for different message types)
-        message_type = msg.get("type", "text")
-        if message_type == "text":
-            text_body = msg.get("text", {}).get("body", "")
-        else:
-            # Handle media, image, audio, etc.
-            text_body = f"[{message_type.upper()} received - not yet supported]"
-
-        if not text_body:
-            logger.debug("Empty message body")
-            return
-
-        # Extract message ID for deduplication
-        event_id = msg.get("id")
-        if not event_id:
-            logger.warning("Message missing 'id' field")
-            return
-
-        # Deduplication: check if we've already processed this message
-        if not claim_webhook_event(db, "whatsapp", event_id):
-            logger.info("Duplicate WhatsApp webhook ignored - event_id=%s", event_id)
-            return
-
-        # Extract timestamp and process the message
-        source_ts = parse_source_timestamp_ms(msg.get("timestamp"))
-        
-        processed = process_message(
-            platform="whatsapp",
-            user_id=user_id,
-            user_name=user_name,
-            message_text=text_body,
-            db=db,
-            source_timestamp_ms=source_ts,
-        )
-
-        if not processed:
-            logger.error("Failed to process message for user %s", user_id)
-            release_webhook_claim(db, "whatsapp", event_id)
-            return
-
-        logger.info(
-            "WhatsApp message processed - user=%s, text=%s",
-            user_id,
-            text_body[:50],
-        )
+    # Safe nested navigation - handles status updates without 'messages' field
+    entries = payload_dict.get("entry", [])
+    if not entries:
+        logger.debug("No entries in webhook payload")
+        return None
 
-    except (KeyError, TypeError, ValueError) as e:
-        logger.exception("Invalid WhatsApp payload shape: %s", e)
-    except Exception as e:
-        logger.exception("Unexpected error processing WhatsApp message: %s", e)
+    entry = entries[0]
+    changes = entry.get("changes", [])
+    if not changes:
+        logger.debug("No changes in entry")
+        return None
+
+    value = changes[0].get("value", {})
+    
+    # Status updates (delivered/read) have no 'messages' field - ignore gracefully
+    messages = value.get("messages")
+    if not messages:
+        logger.debug("No messages in value (possibly a status update)")
+        return None
+
+    msg = messages[0]
+    user_id = msg.get("from")
+    if not user_id:
+        logger.warning("Message missing 'from' field")
+        return None
+
+    # Extract contact name from contacts array (safe .get())
+    user_name = "Student"  # Default fallback
+    contacts = value.get("contacts", [])
+    if contacts:
+        contact_profile = contacts[0].get("profile", {})
+        user_name = contact_profile.get("name", "Student")
+
+    # Extract message text (safe handling for different message types)
+    message_type = msg.get("type", "text")
+    if message_type == "text":
+        text_body = msg.get("text", {}).get("body", "")
+    else:
+        # Handle media, image, audio, etc.
+        text_body = f"[{message_type.upper()} received - not yet supported]"
+
+    if not text_body:
+        logger.debug("Empty message body")
+        return None
+
+    # Extract message ID for deduplication
+    event_id = msg.get("id")
+    if not event_id:
+        logger.warning("Message missing 'id' field")
+        return None
+
+    return {
+        "event_id": event_id,
+        "user_id": user_id,
+        "user_name": user_name,
+        "message_text": text_body,
+        "source_timestamp_ms": parse_source_timestamp_ms(msg.get("timestamp")),
+    }
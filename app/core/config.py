@@ -46,10 +46,24 @@ class Settings:
     # Meta / WhatsApp Keys
     META_API_TOKEN: str = os.getenv("META_API_TOKEN")
     WHATSAPP_PHONE_ID: str = os.getenv("WHATSAPP_PHONE_ID")
+    TELEGRAM_BOT_TOKEN: str = os.getenv("TELEGRAM_BOT_TOKEN")
     OWNER_PHONE: str = os.getenv("OWNER_PHONE")
 
     DATABASE_URL: str = os.getenv("DATABASE_URL")
 
+    # Engine profile: server databases (Postgres)
+    DB_POOL_SIZE: int = _get_int("DB_POOL_SIZE", 10)  # API + INBOUND_CONCURRENCY turns per process
+    DB_MAX_OVERFLOW: int = _get_int("DB_MAX_OVERFLOW", 10)
+    DB_POOL_TIMEOUT_SEC: float = _get_float("DB_POOL_TIMEOUT_SEC", 10.0)
+    DB_POOL_RECYCLE_SEC: int = _get_int("DB_POOL_RECYCLE_SEC", 1800)  # below typical proxy idle cut-offs
+    DB_POOL_PRE_PING: bool = _get_bool("DB_POOL_PRE_PING", True)
+    DB_QUERY_CACHE_SIZE: int = _get_int("DB_QUERY_CACHE_SIZE", 500)  # compiled-statement cache per engine
+    # Engine profile: SQLite
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")  # WAL | DELETE | TRUNCATE | MEMORY
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # FULL | NORMAL | OFF
+    SQLITE_BUSY_TIMEOUT_MS: int = _get_int("SQLITE_BUSY_TIMEOUT_MS", 10000)
+    SQLITE_MMAP_SIZE: int = _get_int("SQLITE_MMAP_SIZE", 64 * 1024 * 1024)  # bytes, 0 disables
+
     # Redis / Prompt Cache
     REDIS_URL: str | None = os.getenv("REDIS_URL")
     CACHE_ENABLED: bool = _get_bool("CACHE_ENABLED", True)
@@ -58,6 +72,84 @@ class Settings:
     CACHE_COOLDOWN_SEC: int = _get_int("CACHE_COOLDOWN_SEC", 15)
     CACHE_SIMILARITY_THRESHOLD: float = _get_float("CACHE_SIMILARITY_THRESHOLD", 0.8)
     CACHE_MAX_CANDIDATES: int = _get_int("CACHE_MAX_CANDIDATES", 20)
+    CACHE_SEMANTIC_BACKEND: str = os.getenv("CACHE_SEMANTIC_BACKEND", "jaccard")  # jaccard | embedding
+    CACHE_EMBEDDING_SIMILARITY_THRESHOLD: float = _get_float("CACHE_EMBEDDING_SIMILARITY_THRESHOLD", 0.82)
+    CACHE_LSH_ENABLED: bool = _get_bool("CACHE_LSH_ENABLED", True)  # MinHash buckets on top of the recent window
+    CACHE_LSH_NUM_PERM: int = _get_int("CACHE_LSH_NUM_PERM", 64)
+    CACHE_LSH_BANDS: int = _get_int("CACHE_LSH_BANDS", 16)
+    CACHE_LOCAL_ENABLED: bool = _get_bool("CACHE_LOCAL_ENABLED", True)  # in-process L1 in front of Redis
+    CACHE_LOCAL_MAX_ENTRIES: int = _get_int("CACHE_LOCAL_MAX_ENTRIES", 1024)
+    CACHE_GLOBAL_ENABLED: bool = _get_bool("CACHE_GLOBAL_ENABLED", False)  # share greeting/inquiry replies across users
+    CACHE_GLOBAL_TTL_SEC: int = _get_int("CACHE_GLOBAL_TTL_SEC", 600)
+    CACHE_COALESCE_ENABLED: bool = _get_bool("CACHE_COALESCE_ENABLED", False)  # one LLM call for identical concurrent prompts
+    CACHE_SWR_ENABLED: bool = _get_bool("CACHE_SWR_ENABLED", False)  # serve expired replies, refresh in background
+    CACHE_SWR_STALE_SEC: int = _get_int("CACHE_SWR_STALE_SEC", 600)
+    MENU_CACHE_TTL_SEC: int = _get_int("MENU_CACHE_TTL_SEC", 30)
+    MENU_VERSION_CHECK_SEC: float = _get_float("MENU_VERSION_CHECK_SEC", 1.0)  # Redis version GET at most this often
+
+    # LLM model tiers (small model for simple turns, escalation to the large one)
+    ORDER_MODEL_NAME: str = os.getenv("ORDER_MODEL_NAME", "llama-3.3-70b-versatile")
+    ORDER_SMALL_MODEL_NAME: str = os.getenv("ORDER_SMALL_MODEL_NAME", "llama-3.1-8b-instant")
+    LLM_ROUTING_ENABLED: bool = _get_bool("LLM_ROUTING_ENABLED", False)
+    LLM_ROUTER_MIN_CONFIDENCE: float = _get_float("LLM_ROUTER_MIN_CONFIDENCE", 0.6)
+    LLM_ROUTER_SMALL_MAX_WORDS: int = _get_int("LLM_ROUTER_SMALL_MAX_WORDS", 12)
+    LLM_LARGE_COST_PER_M_INPUT: float = _get_float("LLM_LARGE_COST_PER_M_INPUT", 0.59)  # USD per million tokens
+    LLM_LARGE_COST_PER_M_OUTPUT: float = _get_float("LLM_LARGE_COST_PER_M_OUTPUT", 0.79)
+    LLM_SMALL_COST_PER_M_INPUT: float = _get_float("LLM_SMALL_COST_PER_M_INPUT", 0.05)
+    LLM_SMALL_COST_PER_M_OUTPUT: float = _get_float("LLM_SMALL_COST_PER_M_OUTPUT", 0.08)
+
+    LLM_STREAM_EARLY_REPLY: bool = _get_bool("LLM_STREAM_EARLY_REPLY", False)  # send `message` before the JSON finishes
+    LLM_EXTRACTION_MODE: str = os.getenv("LLM_EXTRACTION_MODE", "json_parser")  # json_parser | structured
+    LLM_STRUCTURED_METHOD: str = os.getenv("LLM_STRUCTURED_METHOD", "function_calling")  # function_calling | json_mode | json_schema
+
+    # One commit before and one after the LLM call instead of one per write
+    UNIT_OF_WORK_ENABLED: bool = _get_bool("UNIT_OF_WORK_ENABLED", True)
+
+    # Order prompt history: last few cleaned messages plus a rolling summary
+    HISTORY_MAX_MESSAGES: int = _get_int("HISTORY_MAX_MESSAGES", 6)
+    HISTORY_MAX_TOKENS: int = _get_int("HISTORY_MAX_TOKENS", 600)
+    HISTORY_SUMMARY_MAX_TOKENS: int = _get_int("HISTORY_SUMMARY_MAX_TOKENS", 150)
+    HISTORY_LOAD_LIMIT: int = _get_int("HISTORY_LOAD_LIMIT", 20)  # rows read per turn (first turn: seeds the summary)
+    HISTORY_CACHE_MAX_CONVERSATIONS: int = _get_int("HISTORY_CACHE_MAX_CONVERSATIONS", 2048)
+
+    # Order prompt budget
+    PROMPT_FEW_SHOT_SET: str = os.getenv("PROMPT_FEW_SHOT_SET", "full")  # full | compact | none
+    PROMPT_FORMAT_INSTRUCTIONS: str = os.getenv("PROMPT_FORMAT_INSTRUCTIONS", "schema")  # schema | compact
+    PROMPT_MENU_FORMAT: str = os.getenv("PROMPT_MENU_FORMAT", "list")  # list | compact
+
+    # Rule-based answers for greetings, menu, prices and plain orders (no LLM call).
+    # Off by default: the canned replies are Pidgin only and don't mirror the customer's language.
+    FAST_PATH_ENABLED: bool = _get_bool("FAST_PATH_ENABLED", False)
+
+    # Inbound work queue (see worker.py)
+    INBOUND_WORKER_COUNT: int = _get_int("INBOUND_WORKER_COUNT", 2)
+    INBOUND_BATCH_SIZE: int = _get_int("INBOUND_BATCH_SIZE", 10)
+    INBOUND_POLL_INTERVAL_MS: int = _get_int("INBOUND_POLL_INTERVAL_MS", 250)
+    INBOUND_MAX_ATTEMPTS: int = _get_int("INBOUND_MAX_ATTEMPTS", 3)
+    INBOUND_LOCK_TIMEOUT_SEC: int = _get_int("INBOUND_LOCK_TIMEOUT_SEC", 120)  # claims are renewed every third of this while the worker lives
+    INBOUND_CONCURRENCY: int = _get_int("INBOUND_CONCURRENCY", 16)  # conversations in flight per worker
+    INBOUND_SHARD_COUNT: int = _get_int("INBOUND_SHARD_COUNT", 64)  # keep stable across deploys
+
+    # Outbound delivery (pooled keep-alive client for Telegram / WhatsApp)
+    DELIVERY_HTTP2: bool = _get_bool("DELIVERY_HTTP2", True)
+    DELIVERY_TIMEOUT_SEC: float = _get_float("DELIVERY_TIMEOUT_SEC", 4.0)
+    DELIVERY_MAX_CONNECTIONS: int = _get_int("DELIVERY_MAX_CONNECTIONS", 20)
+    DELIVERY_KEEPALIVE_EXPIRY_SEC: float = _get_float("DELIVERY_KEEPALIVE_EXPIRY_SEC", 60.0)
+    DELIVERY_TELEGRAM_CONCURRENCY: int = _get_int("DELIVERY_TELEGRAM_CONCURRENCY", 8)
+    DELIVERY_WHATSAPP_CONCURRENCY: int = _get_int("DELIVERY_WHATSAPP_CONCURRENCY", 8)
+
+    # Outbox dispatcher (retries + platform rate limits)
+    OUTBOX_DISPATCHER_ENABLED: bool = _get_bool("OUTBOX_DISPATCHER_ENABLED", True)
+    OUTBOX_BATCH_SIZE: int = _get_int("OUTBOX_BATCH_SIZE", 50)
+    OUTBOX_POLL_INTERVAL_MS: int = _get_int("OUTBOX_POLL_INTERVAL_MS", 250)
+    OUTBOX_MAX_ATTEMPTS: int = _get_int("OUTBOX_MAX_ATTEMPTS", 6)
+    OUTBOX_RETRY_BASE_MS: int = _get_int("OUTBOX_RETRY_BASE_MS", 1000)
+    OUTBOX_RETRY_MAX_MS: int = _get_int("OUTBOX_RETRY_MAX_MS", 300_000)
+    OUTBOX_LOCK_TIMEOUT_SEC: int = _get_int("OUTBOX_LOCK_TIMEOUT_SEC", 60)
+    OUTBOX_MAX_SEND_WAIT_MS: int = _get_int("OUTBOX_MAX_SEND_WAIT_MS", 100)  # longer waits for a send slot are rescheduled
+    OUTBOX_TELEGRAM_RATE_PER_SEC: float = _get_float("OUTBOX_TELEGRAM_RATE_PER_SEC", 25.0)
+    OUTBOX_TELEGRAM_CHAT_INTERVAL_MS: int = _get_int("OUTBOX_TELEGRAM_CHAT_INTERVAL_MS", 1000)
+    OUTBOX_WHATSAPP_RATE_PER_SEC: float = _get_float("OUTBOX_WHATSAPP_RATE_PER_SEC", 70.0)
 
     MENU = {
         "jollof_rice": 500,
@@ -1,8 +1,13 @@
 # app/core/database.py
-from sqlalchemy import create_engine
+import logging
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base # Updated import for newer SQLAlchemy
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
 # --- FIX START: Handle URL format issues ---
@@ -10,8 +15,70 @@ if SQLALCHEMY_DATABASE_URL and SQLALCHEMY_DATABASE_URL.startswith("postgres://")
     SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
 # --- FIX END ---
 
+SQLITE_JOURNAL_MODES = {"WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF"}
+SQLITE_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+
+def engine_options(url: str) -> dict:
+    """create_engine() keyword arguments for the backend's profile (see the DB_* / SQLITE_* settings)."""
+    parsed = make_url(url)
+    pool = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SEC,
+    }
+    if parsed.get_backend_name() == "sqlite":
+        # Sessions are handed to worker threads (asyncio.to_thread); the busy
+        # timeout itself is set by the connect pragmas below.
+        options = {"connect_args": {"check_same_thread": False}, "query_cache_size": settings.DB_QUERY_CACHE_SIZE}
+        if parsed.database not in (None, "", ":memory:"):
+            options.update(pool)  # in-memory databases keep SQLAlchemy's single-connection pool
+        return options
+    return {
+        **pool,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SEC,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "query_cache_size": settings.DB_QUERY_CACHE_SIZE,
+    }
+
+
+def sqlite_pragmas() -> list[str]:
+    journal_mode = settings.SQLITE_JOURNAL_MODE.upper()
+    if journal_mode not in SQLITE_JOURNAL_MODES:
+        logger.warning("Invalid SQLITE_JOURNAL_MODE=%r. Using WAL", settings.SQLITE_JOURNAL_MODE)
+        journal_mode = "WAL"
+    synchronous = settings.SQLITE_SYNCHRONOUS.upper()
+    if synchronous not in SQLITE_SYNCHRONOUS_MODES:
+        logger.warning("Invalid SQLITE_SYNCHRONOUS=%r. Using NORMAL", settings.SQLITE_SYNCHRONOUS)
+        synchronous = "NORMAL"
+    return [
+        # WAL: readers no longer block the writer (and vice versa); one writer at a time.
+        f"PRAGMA journal_mode={journal_mode}",
+        f"PRAGMA synchronous={synchronous}",
+        # Wait for the write lock instead of failing with "database is locked".
+        f"PRAGMA busy_timeout={max(settings.SQLITE_BUSY_TIMEOUT_MS, 0)}",
+        f"PRAGMA mmap_size={max(settings.SQLITE_MMAP_SIZE, 0)}",
+    ]
+
+
+def _apply_sqlite_pragmas(dbapi_connection, _connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in sqlite_pragmas():
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def create_app_engine(url: str):
+    engine = create_engine(url, **engine_options(url))
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+
 # Create the engine with the fixed URL
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_app_engine(SQLALCHEMY_DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -22,4 +89,4 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
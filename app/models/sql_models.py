@@ -1,5 +1,5 @@
 # app/models/sql_models.py
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, BigInteger, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, BigInteger, Text, UniqueConstraint, Index, JSON, text
 from app.core.database import Base
 
 class User(Base):
@@ -10,20 +10,53 @@ class User(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Every turn looks up the sender's open cart; PAID orders never need this index.
+        Index(
+            "ix_orders_pending_user_id",
+            "user_id",
+            postgresql_where=text("status = 'Pending'"),
+            sqlite_where=text("status = 'Pending'"),
+        ),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    items = Column(String)
+    items = Column(String)  # display summary, e.g. "2 x Jollof Rice, 1 x Beef"
+    lines = Column(JSON, nullable=True)  # [{"item_id", "name", "qty", "unit_price"}]
     total_price = Column(Integer)
     status = Column(String, default="Pending")
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_delivery_status_next_attempt", "delivery_status", "next_attempt_at"),
+        # Conversation history, newest first
+        Index("ix_messages_contact_platform_ts", "contact_id", "platform", "timestamp"),
+        # Recent chats across all contacts (/demo/chats)
+        Index("ix_messages_timestamp", "timestamp"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     platform = Column(String) 
     contact_id = Column(String, index=True) 
     direction = Column(String) 
     body = Column(String) 
     timestamp = Column(BigInteger) 
+    # Outbox (outbound rows only): pending -> sending -> sent | failed | skipped
+    delivery_status = Column(String, nullable=True)
+    delivery_attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at = Column(BigInteger, nullable=True)
+    delivered_at = Column(BigInteger, nullable=True)
+    last_delivery_error = Column(String, nullable=True)
+
+class ConversationState(Base):
+    """Where each conversation stands, updated with every reply (one row per contact)."""
+    __tablename__ = "conversation_state"
+
+    platform = Column(String, primary_key=True)
+    contact_id = Column(String, primary_key=True)
+    stage = Column(String, nullable=False, default="chatting", server_default="chatting")
+    pending_order_id = Column(Integer, nullable=True)  # the order the stage refers to
+    last_activity_at = Column(BigInteger, nullable=True)
 
 # --- NEW: Dynamic Menu Table ---
 class MenuItem(Base):
@@ -41,12 +74,26 @@ class ProcessedWebhookEvent(Base):
     __tablename__ = "processed_webhook_events"
     __table_args__ = (
         UniqueConstraint("platform", "external_event_id", name="uq_processed_webhook_event"),
+        Index("ix_processed_webhook_events_status_id", "status", "id"),
+        Index("ix_processed_webhook_events_status_shard_id", "status", "shard", "id"),
+        # Earlier unfinished messages of the same conversation (per-conversation ordering)
+        Index("ix_processed_webhook_events_key_status_id", "conversation_key", "status", "id"),
     )
 
     id = Column(Integer, primary_key=True, index=True)
     platform = Column(String, nullable=False, index=True)
     external_event_id = Column(String, nullable=False)
     claimed_at = Column(BigInteger, nullable=False)
+    # Inbound work queue: pending -> processing -> started -> done | failed
+    status = Column(String, nullable=False, default="done", server_default="done")
+    payload = Column(Text, nullable=True)  # JSON job for the worker pool
+    conversation_key = Column(String, nullable=True)  # "<platform>:<user_id>"
+    shard = Column(Integer, nullable=True)  # crc32(conversation_key) % INBOUND_SHARD_COUNT
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(BigInteger, nullable=True)
+    processed_at = Column(BigInteger, nullable=True)
+    last_error = Column(String, nullable=True)
 
 
 class StockMovement(Base):
@@ -1,31 +1,68 @@
+import asyncio
 import os
-import json
 import logging
-import requests
 import time
 import re
 import httpx
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
 
 # --- NEW IMPORTS FOR LANGCHAIN ---
-from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.exceptions import OutputParserException
-from app.services.llm_engine import ORDER_MODEL_NAME, llm, order_chain, order_parser, order_prompt
+from app.services.llm_engine import (
+    ORDER_FORMAT_INSTRUCTIONS,
+    ORDER_STATIC_PREFIX,
+    TokenUsageCallback,
+    order_chains_for,
+    order_parser,
+)
 from app.services.prompt_cache import (
+    GLOBAL_CACHEABLE_INTENTS,
+    build_global_fingerprint,
     get_exact_cached_reply,
+    get_global_cached_reply,
     get_semantic_cached_reply,
+    is_cacheable_intent,
     is_likely_transactional_text,
+    is_shareable_reply,
     store_cached_reply,
+    store_global_cached_reply,
 )
 
+from app.core.config import settings
 from app.models.sql_models import User, Order, Message, MenuItem, StockMovement
+from app.services.conversation_history import build_chat_history
+from app.services.conversation_state import (
+    STAGE_AWAITING_CONFIRMATION,
+    STAGE_AWAITING_PAYMENT,
+    STAGE_AWAITING_PAYMENT_NAME,
+    STAGE_CHATTING,
+    get_conversation_stage,
+    record_reply_state,
+)
+from app.services.delivery_client import post_json
+from app.services.fast_path import route_fast_path
+from app.services.llm_output import extraction_from_output, record_parse_outcome
+from app.services.model_router import (
+    LARGE_TIER,
+    SMALL_TIER,
+    choose_model_tier,
+    is_valid_extraction,
+    record_escalation,
+    record_llm_call,
+    tier_model_name,
+)
+from app.services.menu_cache import get_menu_snapshot, invalidate_menu_cache
+from app.services.prompt_budget import measure_chain_input
+from app.services.outbox import adispatch_outbound_messages, dispatch_outbound_messages
+from app.services.single_flight import SingleFlight
+from app.services.stream_json import JsonStringFieldExtractor
+from app.services.unit_of_work import commit_count, commit_or_flush, run_after_commit, unit_of_work
 
 # --- CONFIG & SECRETS ---
 META_TOKEN = os.getenv("META_API_TOKEN")
 PHONE_ID = os.getenv("WHATSAPP_PHONE_ID")
-TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
 # OWNER SETTINGS
 OWNER_PLATFORM = (os.getenv("OWNER_PLATFORM") or "telegram").strip().lower()
@@ -35,6 +72,24 @@ OWNER_PHONE_WHATSAPP = os.getenv("OWNER_PHONE")
 logger = logging.getLogger(__name__)
 LLM_INVOCATIONS_TOTAL = 0
 
+# Coalesces identical in-flight LLM calls and background cache refreshes.
+_llm_flights = SingleFlight()
+_background_tasks: set[asyncio.Task] = set()
+_revalidation_executor: ThreadPoolExecutor | None = None
+
+# Owner commands that change menu rows (CONFIRM deducts stock).
+MENU_MUTATING_COMMANDS = {
+    "CONFIRM",
+    "ADD",
+    "OUT",
+    "IN",
+    "STOCK_ADD",
+    "STOCK_USE",
+    "STOCK_SET",
+    "STOCK_WASTE",
+    "STOCK_LEVEL",
+}
+
 OWNER_HELP_TEXT = (
     "👋 *Vendor Commands*\n\n"
     "🛒 *Manage Menu:*\n"
@@ -110,13 +165,8 @@ def send_whatsapp_message(to_number: str, message_text: str) -> bool:
     }
 
     try:
-        # Use httpx for async-friendly HTTP client (if needed later)
-        response = httpx.post(
-            url,
-            json=payload,
-            headers=headers,
-            timeout=30.0,
-        )
+        # Shared keep-alive client: reuses the TLS connection to graph.facebook.com
+        response = post_json("whatsapp", url, payload, headers=headers, timeout=30.0)
         response.raise_for_status()
 
         result = response.json()
@@ -181,17 +231,8 @@ def is_owner_sender(platform: str, user_id: str) -> bool:
         return bool(OWNER_PHONE_WHATSAPP) and str(user_id) == str(OWNER_PHONE_WHATSAPP)
     return False
 
-def get_live_menu_items(db: Session):
-    return db.query(MenuItem).filter(
-        MenuItem.is_available == True,
-        or_(MenuItem.stock_qty.is_(None), MenuItem.stock_qty > 0),
-    ).all()
-
 def get_live_menu_text(db: Session) -> str:
-    items = get_live_menu_items(db)
-    if not items:
-        return "Jollof Rice (N500), Chicken (N1000), Water (N100)"
-    return "\n".join([f"- {item.name}: N{item.price or 0}" for item in items])
+    return get_menu_snapshot(db)["menu_text"]
 
 def parse_naira_amount(raw_amount: str) -> int:
     amount = Decimal(raw_amount)
@@ -231,32 +272,6 @@ def parse_name_qty_reason(arg_text: str) -> tuple[str, str, str] | None:
         return None
     return None
 
-def normalize_text(value: str) -> str:
-    cleaned = "".join(ch.lower() if ch.isalnum() else " " for ch in value)
-    return " ".join(cleaned.split())
-
-def resolve_menu_item(raw_item: str, menu_items: list[MenuItem]) -> MenuItem | None:
-    target = normalize_text(raw_item)
-    if not target:
-        return None
-
-    for item in menu_items:
-        item_name = normalize_text(item.name)
-        if target == item_name or target in item_name or item_name in target:
-            return item
-
-    target_tokens = set(target.split())
-    best_item = None
-    best_score = 0
-    for item in menu_items:
-        item_tokens = set(normalize_text(item.name).split())
-        score = len(target_tokens & item_tokens)
-        if score > best_score:
-            best_score = score
-            best_item = item
-
-    return best_item if best_score > 0 else None
-
 def record_stock_movement(
     db: Session,
     item: MenuItem,
@@ -301,45 +316,64 @@ def parse_order_summary_items(summary: str | None) -> list[tuple[str, int]]:
     return parsed
 
 
-def _parse_llm_json(text: str) -> dict:
-    if not text:
-        return {}
-    try:
-        data = json.loads(text)
-        return data if isinstance(data, dict) else {}
-    except json.JSONDecodeError:
-        pass
-
-    start = text.find("{")
-    end = text.rfind("}")
-    if start == -1 or end == -1 or end <= start:
-        return {}
-    try:
-        data = json.loads(text[start:end + 1])
-        return data if isinstance(data, dict) else {}
-    except json.JSONDecodeError:
-        return {}
-
 def format_line_items(line_items: list[dict]) -> str:
     return ", ".join([f"{item['qty']} x {item['name']}" for item in line_items])
 
 
+def lines_from_summary(summary: str | None, menu_index) -> list[dict]:
+    """Builds cart lines from a legacy "2 x Jollof Rice" summary string."""
+    lines = []
+    for name, qty in parse_order_summary_items(summary):
+        entry = menu_index.resolve(name)
+        if entry:
+            lines.append({"item_id": entry.id, "name": entry.name, "qty": qty, "unit_price": int(entry.price or 0)})
+        else:
+            lines.append({"item_id": None, "name": name, "qty": qty, "unit_price": 0})
+    return lines
+
+
+def get_order_lines(order: Order | None, db: Session) -> list[dict]:
+    if order is None:
+        return []
+    if order.lines is not None:
+        return [dict(line) for line in order.lines]
+    # Orders written before Order.lines existed (and missed by the backfill).
+    return lines_from_summary(order.items, get_menu_snapshot(db)["index"])
+
+
+def _cart_key(line: dict):
+    item_id = line.get("item_id")
+    return item_id if item_id is not None else f"name:{line.get('name')}"
+
+
 # --- NEW FUNCTION: APPLY CART UPDATES ---
 # This replaces `build_order_from_extraction`
-def apply_cart_updates(current_items_str: str, extracted_items: list, db: Session):
+def apply_cart_updates(current_lines: list[dict], extracted_items: list, db: Session):
     """
-    Takes the existing cart string, processes additions and removals based
-    on the AI's extraction, and returns the new cart string and total.
+    Takes the existing cart lines, processes additions and removals based
+    on the AI's extraction, and returns the new lines, their display
+    summary, the total and any unmatched item names.
     """
-    # 1. Parse existing cart into a dictionary
-    current_cart = {}  # Format: { "Jollof Rice": 2 }
-    all_menu_items = db.query(MenuItem).all()
-    live_menu_items = get_live_menu_items(db)
-    if current_items_str:
-        for name, qty in parse_order_summary_items(current_items_str):
-            existing_item = resolve_menu_item(name, all_menu_items)
-            canonical_name = existing_item.name if existing_item else name
-            current_cart[canonical_name] = current_cart.get(canonical_name, 0) + qty
+    menu_snapshot = get_menu_snapshot(db)
+    all_menu_index = menu_snapshot["index"]
+    live_menu_index = menu_snapshot["live_index"]
+
+    # 1. Key the existing cart by menu item id
+    current_cart = {}
+    for line in current_lines:
+        if int(line.get("qty") or 0) <= 0:
+            continue
+        line = dict(line)
+        if line.get("item_id") is None:
+            # Legacy line that never matched the menu; try once more by name.
+            entry = all_menu_index.resolve(line["name"])
+            if entry:
+                line["item_id"] = entry.id
+        key = _cart_key(line)
+        if key in current_cart:
+            current_cart[key]["qty"] += int(line["qty"])
+        else:
+            current_cart[key] = line
 
     unmatched = []
     
@@ -364,37 +398,38 @@ def apply_cart_updates(current_items_str: str, extracted_items: list, db: Sessio
             action = "add"
 
         # Add should use only live menu items; remove should still resolve existing menu items.
-        resolver_pool = live_menu_items if action == "add" else all_menu_items
-        menu_item = resolve_menu_item(raw_name, resolver_pool)
+        resolver = live_menu_index if action == "add" else all_menu_index
+        # The fast path already matched the item; otherwise an exact name beats a looser
+        # match ("Jollof Rice" must not land on "Jollof Rice Special").
+        menu_item = resolver.by_id.get(payload.get("item_id")) or resolver.resolve_exactly(raw_name) or resolver.resolve(raw_name)
         if not menu_item:
             unmatched.append(raw_name)
             continue
-            
-        name = menu_item.name
+
+        line = current_cart.get(menu_item.id)
         if action == "add":
-            current_cart[name] = current_cart.get(name, 0) + qty
-        elif action == "remove":
-            current_cart[name] = current_cart.get(name, 0) - qty
+            if line is None:
+                line = current_cart[menu_item.id] = {"item_id": menu_item.id, "name": menu_item.name, "qty": 0, "unit_price": 0}
+            line["qty"] += qty
+        elif line is not None:
+            line["qty"] -= qty
             # Clean up if they removed everything
-            if current_cart[name] <= 0:
-                del current_cart[name]
+            if line["qty"] <= 0:
+                del current_cart[menu_item.id]
                 
-    # 3. Rebuild summary string and calculate total price deterministically
-    line_items = []
+    # 3. Refresh names/prices from the menu and calculate total price deterministically
+    lines = []
     total = 0
-    for name, qty in current_cart.items():
-        if qty <= 0:
-            continue
-        menu_item = resolve_menu_item(name, all_menu_items)
+    for line in current_cart.values():
+        menu_item = all_menu_index.by_id.get(line["item_id"]) if line.get("item_id") is not None else None
         if menu_item:
-            unit_price = int(menu_item.price or 0)
-            total += unit_price * qty
-            line_items.append({"name": menu_item.name, "qty": qty, "unit_price": unit_price})
-        else:
-            line_items.append({"name": name, "qty": qty, "unit_price": 0})
+            line["name"] = menu_item.name
+            line["unit_price"] = int(menu_item.price or 0)
+        total += int(line.get("unit_price") or 0) * line["qty"]
+        lines.append(line)
 
-    summary = format_line_items(line_items)
-    return summary, total, unmatched
+    summary = format_line_items(lines)
+    return lines, summary, total, unmatched
 
 
 def apply_sale_stock_deduction(
@@ -403,19 +438,40 @@ def apply_sale_stock_deduction(
     actor_platform: str,
     actor_id: str,
 ) -> tuple[bool, str, list[str]]:
-    items_to_deduct = parse_order_summary_items(order.items)
-    if not items_to_deduct:
+    lines = get_order_lines(order, db)
+    if not lines:
         return True, "", []
 
-    menu_items = db.query(MenuItem).all()
     unresolved = []
     insufficient = []
-    resolved = []
+    quantities_by_id = {}
+    names_by_id = {}
+    menu_index = None
+
+    for line in lines:
+        item_id = line.get("item_id")
+        if item_id is None:
+            # Legacy line that never matched the menu; try once more by name.
+            if menu_index is None:
+                menu_index = get_menu_snapshot(db)["index"]
+            entry = menu_index.resolve(line["name"])
+            if not entry:
+                unresolved.append(line["name"])
+                continue
+            item_id = entry.id
+        quantities_by_id[item_id] = quantities_by_id.get(item_id, 0) + int(line["qty"])
+        names_by_id.setdefault(item_id, line["name"])
+
+    # Stock is checked and updated on live rows, never on the cached snapshot.
+    rows_by_id = {}
+    if quantities_by_id:
+        rows_by_id = {row.id: row for row in db.query(MenuItem).filter(MenuItem.id.in_(quantities_by_id)).all()}
 
-    for item_name, qty in items_to_deduct:
-        item = resolve_menu_item(item_name, menu_items)
-        if not item:
-            unresolved.append(item_name)
+    resolved = []
+    for item_id, qty in quantities_by_id.items():
+        item = rows_by_id.get(item_id)
+        if item is None:
+            unresolved.append(names_by_id[item_id])
             continue
         resolved.append((item, qty))
         if item.stock_qty is not None and item.stock_qty < qty:
@@ -472,52 +528,40 @@ def format_stock_snapshot(items: list[MenuItem]) -> str:
     return "Stock Snapshot:\n" + "\n".join(lines)
 
 def awaiting_payment_name_input(db: Session, platform: str, user_id: str) -> bool:
-    last_outbound = (
-        db.query(Message)
-        .filter(
-            Message.platform == platform,
-            Message.contact_id == str(user_id),
-            Message.direction == "outbound",
-        )
-        .order_by(Message.timestamp.desc())
-        .first()
-    )
-    if not last_outbound or not last_outbound.body:
-        return False
-    marker = "type the name on your bank account"
-    return marker in last_outbound.body.lower()
+    return get_conversation_stage(db, platform, user_id) == STAGE_AWAITING_PAYMENT_NAME
 
-def send_reply(platform: str, to_id: str, message_text: str, db: Session):
+def send_reply(
+    platform: str,
+    to_id: str,
+    message_text: str,
+    db: Session,
+    deliveries: list | None = None,
+    stage: str = STAGE_CHATTING,
+    pending_order_id: int | None = None,
+):
     logger.info("sending outbound message platform=%s to=%s", platform, to_id)
 
+    # Outbox: the row is the delivery job; app.services.outbox sends and retries it.
+    now_ms = get_current_time_ms()
     new_msg = Message(
         platform=platform,
         contact_id=str(to_id),
         direction="outbound",
         body=message_text,
-        timestamp=get_current_time_ms(),
+        timestamp=now_ms,
+        delivery_status="pending",
+        next_attempt_at=now_ms,
     )
     db.add(new_msg)
-    db.commit()
+    # Every reply sets the stage the conversation is now in (plain chat unless the caller says otherwise).
+    record_reply_state(db, platform, to_id, stage, pending_order_id, now_ms)
+    commit_or_flush(db)
 
-    try:
-        if platform == "whatsapp":
-            if not META_TOKEN:
-                return
-            url = f"https://graph.facebook.com/v18.0/{PHONE_ID}/messages"
-            headers = {"Authorization": f"Bearer {META_TOKEN}", "Content-Type": "application/json"}
-            payload = {"messaging_product": "whatsapp", "to": to_id, "type": "text", "text": {"body": message_text}}
-            response = requests.post(url, json=payload, headers=headers, timeout=4.0)
-            response.raise_for_status()
-        elif platform == "telegram":
-            if not TELEGRAM_TOKEN:
-                return
-            url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-            payload = {"chat_id": to_id, "text": message_text}
-            response = requests.post(url, json=payload, timeout=4.0)
-            response.raise_for_status()
-    except requests.RequestException:
-        logger.exception("outbound message delivery failed platform=%s to=%s", platform, to_id)
+    # Callers running a full turn collect message ids and dispatch them once the turn is done.
+    if deliveries is not None:
+        deliveries.append(new_msg.id)
+        return
+    dispatch_outbound_messages(db, [new_msg.id])
 
 def parse_owner_command(message_text: str) -> dict | None:
     raw = (message_text or "").strip()
@@ -675,6 +719,21 @@ def process_owner_command(
     db: Session,
     actor_platform: str = "owner",
     actor_id: str = "owner",
+    deliveries: list | None = None,
+):
+    try:
+        return _run_owner_command(command, db, actor_platform, actor_id, deliveries)
+    finally:
+        if command.get("cmd") in MENU_MUTATING_COMMANDS:
+            # Inside a turn the menu rows only land at the final commit.
+            run_after_commit(db, invalidate_menu_cache)
+
+def _run_owner_command(
+    command: dict,
+    db: Session,
+    actor_platform: str,
+    actor_id: str,
+    deliveries: list | None,
 ):
     cmd = command.get("cmd")
 
@@ -690,13 +749,19 @@ def process_owner_command(
                 if not ok:
                     return note
                 order.status = "PAID"
-                db.commit()
+                commit_or_flush(db)
                 target_user = db.query(User).filter(User.id == order.user_id).first()
                 if not target_user:
                     return f"Order #{order.id} marked PAID, but user record is missing."
                 last_msg = db.query(Message).filter(Message.contact_id == target_user.phone_number).order_by(Message.id.desc()).first()
                 platform = last_msg.platform if last_msg else "whatsapp"
-                send_reply(platform, target_user.phone_number, f"Order #{order.id} confirmed. We are packing it now.", db)
+                send_reply(
+                    platform,
+                    target_user.phone_number,
+                    f"Order #{order.id} confirmed. We are packing it now.",
+                    db,
+                    deliveries,
+                )
                 extras = []
                 if note:
                     extras.append(note)
@@ -718,10 +783,16 @@ def process_owner_command(
                 if not ok:
                     return note
                 order.status = "PAID"
-                db.commit()
+                commit_or_flush(db)
                 last_msg = db.query(Message).filter(Message.contact_id == target_user.phone_number).order_by(Message.id.desc()).first()
                 platform = last_msg.platform if last_msg else "whatsapp"
-                send_reply(platform, target_user.phone_number, f"Order #{order.id} confirmed. We are packing it now.", db)
+                send_reply(
+                    platform,
+                    target_user.phone_number,
+                    f"Order #{order.id} confirmed. We are packing it now.",
+                    db,
+                    deliveries,
+                )
                 extras = []
                 if note:
                     extras.append(note)
@@ -765,7 +836,7 @@ def process_owner_command(
                     )
                 )
                 action = "Added"
-            db.commit()
+            commit_or_flush(db)
             details = [f"{action} '{name}' @ N{price}."]
             target_item = db.query(MenuItem).filter(MenuItem.name.ilike(name)).first()
             if target_item and target_item.stock_qty is not None:
@@ -783,7 +854,7 @@ def process_owner_command(
         item = db.query(MenuItem).filter(MenuItem.name.ilike(f"%{name}%")).first()
         if item:
             item.is_available = False
-            db.commit()
+            commit_or_flush(db)
             return f"'{item.name}' is OUT OF STOCK."
         return "Item not found."
 
@@ -794,7 +865,7 @@ def process_owner_command(
         item = db.query(MenuItem).filter(MenuItem.name.ilike(f"%{name}%")).first()
         if item:
             item.is_available = True
-            db.commit()
+            commit_or_flush(db)
             return f"'{item.name}' RESTOCKED."
         return "Item not found."
 
@@ -823,7 +894,7 @@ def process_owner_command(
 
             if cmd == "STOCK_LEVEL":
                 item.reorder_level = qty
-                db.commit()
+                commit_or_flush(db)
                 return f"Reorder level for '{item.name}' set to {qty}."
 
             if item.stock_qty is None:
@@ -848,7 +919,7 @@ def process_owner_command(
                 record_stock_movement(db, item, "set", qty, actor_platform, actor_id)
 
             low_alert = low_stock_message(item)
-            db.commit()
+            commit_or_flush(db)
             msg = f"Stock updated for '{item.name}': {item.stock_qty}"
             if low_alert:
                 msg += f"\nLOW STOCK: {low_alert}"
@@ -879,7 +950,7 @@ def process_owner_command(
                 item.is_available = False
             record_stock_movement(db, item, "waste", qty, actor_platform, actor_id, reason=reason)
             low_alert = low_stock_message(item)
-            db.commit()
+            commit_or_flush(db)
             msg = f"Waste logged for '{item.name}': qty={qty}, reason={reason}. Stock now {item.stock_qty}."
             if low_alert:
                 msg += f"\nLOW STOCK: {low_alert}"
@@ -890,14 +961,20 @@ def process_owner_command(
     return "Unknown command.\n\n" + OWNER_HELP_TEXT
 
 # --- THE UPDATED PROCESS_MESSAGE FLOW ---
-def process_message(
+def begin_message_turn(
     platform: str,
     user_id: str,
     user_name: str,
     message_text: str,
     db: Session,
-    source_timestamp_ms: int | None = None,
-) -> bool:
+    source_timestamp_ms: int | None,
+    deliveries: list,
+) -> dict | None:
+    """
+    Runs the deterministic part of a turn (inbound logging, owner commands,
+    payment flow). Returns None when the turn was fully answered, otherwise
+    the context needed for the LLM step.
+    """
     inbound_message = Message(
         platform=platform,
         contact_id=str(user_id),
@@ -906,35 +983,48 @@ def process_message(
         timestamp=source_timestamp_ms if source_timestamp_ms else get_current_time_ms(),
     )
     db.add(inbound_message)
-    db.commit()
-    db.refresh(inbound_message)
+    commit_or_flush(db)
 
     is_owner = is_owner_sender(platform, user_id)
     words = message_text.split()
     owner_cmd = parse_owner_command(message_text) if is_owner else None
-    
+
     if is_owner and owner_cmd:
-        reply = process_owner_command(owner_cmd, db, actor_platform=platform, actor_id=str(user_id))
-        send_reply(platform, user_id, reply, db)
-        return True
+        reply = process_owner_command(
+            owner_cmd,
+            db,
+            actor_platform=platform,
+            actor_id=str(user_id),
+            deliveries=deliveries,
+        )
+        send_reply(platform, user_id, reply, db, deliveries)
+        return None
     if is_owner and not owner_cmd:
-        send_reply(platform, user_id, "Use /help for vendor commands.", db)
-        return True
+        send_reply(platform, user_id, "Use /help for vendor commands.", db, deliveries)
+        return None
 
     user = db.query(User).filter(User.phone_number == str(user_id)).first()
     if not user:
         user = User(phone_number=str(user_id), name=user_name)
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        commit_or_flush(db)
+
+    pending_order = db.query(Order).filter(Order.user_id == user.id, Order.status == "Pending").first()
 
     if "PAID" in message_text.upper() and len(message_text) < 20:
-        send_reply(platform, user_id, "Okay! Please type the NAME on your bank account.", db)
-        return True
+        send_reply(
+            platform,
+            user_id,
+            "Okay! Please type the NAME on your bank account.",
+            db,
+            deliveries,
+            stage=STAGE_AWAITING_PAYMENT_NAME,
+            pending_order_id=pending_order.id if pending_order else None,
+        )
+        return None
 
-    pending_order = db.query(Order).filter(Order.user_id == user.id, Order.status == "Pending").first()
     waiting_for_account_name = awaiting_payment_name_input(db, platform, user_id)
-    
+
     if (
         not is_owner
         and pending_order
@@ -953,45 +1043,112 @@ def process_message(
         owner_target = owner_destination()
         if owner_target:
             owner_platform, owner_contact = owner_target
-            send_reply(owner_platform, owner_contact, alert, db)
+            send_reply(owner_platform, owner_contact, alert, db, deliveries)
         else:
             logger.warning("owner destination not configured; skipping owner alert")
-        send_reply(platform, user_id, "Seen! Wait for confirmation.", db)
-        return True
+        send_reply(
+            platform,
+            user_id,
+            "Seen! Wait for confirmation.",
+            db,
+            deliveries,
+            stage=STAGE_AWAITING_CONFIRMATION,
+            pending_order_id=pending_order.id,
+        )
+        return None
 
-    # --- NEW LLM INTEGRATION START ---
-    try:
-        live_menu = get_live_menu_text(db)
-        role = "owner" if is_owner else "customer"
+    return {
+        "platform": platform,
+        "user_id": user_id,
+        "message_text": message_text,
+        "role": "owner" if is_owner else "customer",
+        "inbound_message_id": inbound_message.id,
+        "user": user,
+        "pending_order": pending_order,
+    }
 
-        should_bypass_cache_lookup = is_likely_transactional_text(message_text)
-        if should_bypass_cache_lookup:
+def prepare_llm_turn(turn: dict, db: Session, deliveries: list) -> dict | None:
+    """
+    Answers the turn from the fast path or the cache where possible. Returns
+    None when the turn was answered, otherwise the input for the order chain.
+    """
+    platform = turn["platform"]
+    user_id = turn["user_id"]
+    message_text = turn["message_text"]
+    role = turn["role"]
+
+    menu_snapshot = get_menu_snapshot(db)
+    live_menu = menu_snapshot["menu_text"]
+    turn["live_menu"] = live_menu
+
+    if settings.FAST_PATH_ENABLED:
+        started = time.perf_counter()
+        cart_item_ids = {line.get("item_id") for line in get_order_lines(turn["pending_order"], db)}
+        fast_extraction = route_fast_path(message_text, menu_snapshot, cart_item_ids)
+        if fast_extraction is not None:
             logger.info(
-                "cache_bypass_intent reason=likely_transaction_text platform=%s user_id=%s",
+                "fast_path_hit route=%s platform=%s user_id=%s elapsed_ms=%.2f",
+                fast_extraction["route"],
                 platform,
                 user_id,
+                (time.perf_counter() - started) * 1000,
             )
-        else:
-            exact_hit = get_exact_cached_reply(
-                platform=platform,
-                user_id=str(user_id),
+            turn["fast_path"] = True
+            complete_llm_turn(turn, fast_extraction, db, deliveries)
+            return None
+
+    # Replies are cached per routed model, so the tier is picked before any lookup.
+    pending_order = turn["pending_order"]
+    model_tier = choose_model_tier(message_text, has_cart=bool(pending_order and pending_order.items))
+    model_name = tier_model_name(model_tier)
+    turn["model_tier"] = model_tier
+    turn["model_name"] = model_name
+
+    should_bypass_cache_lookup = is_likely_transactional_text(message_text)
+    if should_bypass_cache_lookup:
+        logger.info(
+            "cache_bypass_intent reason=likely_transaction_text platform=%s user_id=%s",
+            platform,
+            user_id,
+        )
+    else:
+        exact_hit = get_exact_cached_reply(
+            platform=platform,
+            user_id=str(user_id),
+            role=role,
+            message_text=message_text,
+            menu_text=live_menu,
+            model_identifier=model_name,
+        )
+        cache_hit = exact_hit if exact_hit and exact_hit.get("reply") else None
+        if cache_hit is None:
+            global_hit = get_global_cached_reply(
                 role=role,
                 message_text=message_text,
                 menu_text=live_menu,
-                model_identifier=ORDER_MODEL_NAME,
+                model_identifier=model_name,
             )
-            if exact_hit and exact_hit.get("reply"):
-                logger.info("cache_exact_hit platform=%s user_id=%s", platform, user_id)
-                send_reply(platform, user_id, str(exact_hit["reply"]), db)
-                return True
-
+            cache_hit = global_hit if global_hit and global_hit.get("reply") else None
+            tier = "global"
+        else:
+            tier = "exact"
+
+        if cache_hit is not None:
+            send_reply(platform, user_id, str(cache_hit["reply"]), db, deliveries)
+            if not cache_hit.get("stale"):
+                logger.info("cache_%s_hit platform=%s user_id=%s", tier, platform, user_id)
+                return None
+            # Stale-while-revalidate: the reply is out, the caller refreshes the entry.
+            logger.info("cache_%s_stale_hit platform=%s user_id=%s", tier, platform, user_id)
+            turn["revalidate"] = True
+        else:
             semantic_hit = get_semantic_cached_reply(
                 platform=platform,
                 user_id=str(user_id),
                 role=role,
                 message_text=message_text,
                 menu_text=live_menu,
-                model_identifier=ORDER_MODEL_NAME,
+                model_identifier=model_name,
             )
             if semantic_hit and semantic_hit.get("reply"):
                 logger.info(
@@ -1000,149 +1157,654 @@ def process_message(
                     user_id,
                     float(semantic_hit.get("similarity_score", 0.0)),
                 )
-                send_reply(platform, user_id, str(semantic_hit["reply"]), db)
-                return True
+                send_reply(platform, user_id, str(semantic_hit["reply"]), db, deliveries)
+                return None
             logger.info("cache_miss platform=%s user_id=%s", platform, user_id)
-        
-        # 1. Fetch History and Convert to LangChain Messages
-        history_msgs = (
-            db.query(Message)
-            .filter(
-                Message.contact_id == str(user_id),
-                Message.id != inbound_message.id,
-            )
-            .order_by(Message.timestamp.desc())
-            .limit(10)
-            .all()
-        )
-        
-        lc_history = []
-        for m in reversed(history_msgs):
-            if m.direction == "inbound":
-                lc_history.append(HumanMessage(content=m.body))
-            else:
-                lc_history.append(AIMessage(content=m.body))
 
-        # 2. Get Format Instructions from Pydantic
-        format_instructions = order_parser.get_format_instructions()
+    # 1. Recent history (cleaned, token-budgeted, older turns summarized)
+    lc_history = build_chat_history(db, platform, user_id, turn["inbound_message_id"])
 
-        # 3. Invoke the LangChain
-        global LLM_INVOCATIONS_TOTAL
-        LLM_INVOCATIONS_TOTAL += 1
-        logger.info(
-            "llm_invocations_total=%s platform=%s user_id=%s",
-            LLM_INVOCATIONS_TOTAL,
+    chain_input = {
+        "menu": menu_snapshot["prompt_menu"],
+        "menu_hash": menu_snapshot["menu_hash"],
+        "format_instructions": ORDER_FORMAT_INSTRUCTIONS,
+        "chat_history": lc_history,
+        "user_input": message_text,
+    }
+    budget = measure_chain_input(chain_input, ORDER_STATIC_PREFIX)
+    logger.info(
+        "prompt_budget static=%s menu=%s history=%s input=%s total=%s platform=%s user_id=%s",
+        budget["static"],
+        budget["menu"],
+        budget["history"],
+        budget["input"],
+        budget["total"],
+        platform,
+        user_id,
+    )
+    return chain_input
+
+def _count_llm_invocation(platform: str, user_id: str) -> None:
+    global LLM_INVOCATIONS_TOTAL
+    LLM_INVOCATIONS_TOTAL += 1
+    logger.info(
+        "llm_invocations_total=%s platform=%s user_id=%s",
+        LLM_INVOCATIONS_TOTAL,
+        platform,
+        user_id,
+    )
+
+def _invoke_timed(tier: str, runnable, chain_input: dict):
+    usage = TokenUsageCallback()
+    started = time.perf_counter()
+    failed = True
+    try:
+        result = runnable.invoke(chain_input, config={"callbacks": [usage]})
+        failed = False
+        return result
+    finally:
+        record_llm_call(tier, (time.perf_counter() - started) * 1000, usage.input_tokens, usage.output_tokens, failed)
+
+async def _ainvoke_timed(tier: str, runnable, chain_input: dict):
+    usage = TokenUsageCallback()
+    started = time.perf_counter()
+    failed = True
+    try:
+        result = await runnable.ainvoke(chain_input, config={"callbacks": [usage]})
+        failed = False
+        return result
+    finally:
+        record_llm_call(tier, (time.perf_counter() - started) * 1000, usage.input_tokens, usage.output_tokens, failed)
+
+def _extraction_from_output(output, mode: str, tier: str, platform: str, user_id: str) -> dict | None:
+    extraction, outcome = extraction_from_output(output)
+    record_parse_outcome(mode, outcome)
+    if outcome != "parsed":
+        logger.warning(
+            "llm_output_parsing_failed mode=%s tier=%s outcome=%s platform=%s user_id=%s",
+            mode,
+            tier,
+            outcome,
             platform,
             user_id,
         )
+    return extraction
+
+def _finish_streamed_extraction(raw_text: str, early_reply: str | None, failed: bool, platform: str, user_id: str) -> dict:
+    extraction = None
+    if not failed:
         try:
-            response = order_chain.invoke({
-                "menu": live_menu,
-                "format_instructions": format_instructions,
-                "chat_history": lc_history,
-                "user_input": message_text
-            })
-            extraction = response if isinstance(response, dict) else {}
-        except OutputParserException:
-            logger.exception("llm_output_parsing_failed platform=%s user_id=%s", platform, user_id)
-            # Fallback: run the prompt without parser, then parse JSON defensively.
-            LLM_INVOCATIONS_TOTAL += 1
-            logger.info(
-                "llm_invocations_total=%s platform=%s user_id=%s fallback=raw_prompt",
-                LLM_INVOCATIONS_TOTAL,
-                platform,
-                user_id,
-            )
-            raw_msg = (order_prompt | llm).invoke({
-                "menu": live_menu,
-                "format_instructions": format_instructions,
-                "chat_history": lc_history,
-                "user_input": message_text
-            })
-            raw_text = raw_msg.content if hasattr(raw_msg, "content") else str(raw_msg)
-            extraction = _parse_llm_json(raw_text)
-        except Exception:
-            logger.exception("llm_invoke_failed platform=%s user_id=%s", platform, user_id)
-            extraction = {}
-
-        # 4. Extract standard variables
-        intent = str(extraction.get("intent", "unknown")).lower().strip()
-        ai_reply = extraction.get("message", "I dey with you.")
-        extracted_items = extraction.get("extracted_items", [])
-
-        # 5. Handle Cart State Dynamically (Additions & Removals)
-        summary = ""
-        total = 0
-        unmatched_text = ""
-
-        if extracted_items:
-            current_summary = pending_order.items if pending_order else ""
-            summary, total, unmatched = apply_cart_updates(current_summary, extracted_items, db)
-            
-            # Save the updated cart state
-            if pending_order:
-                pending_order.items = summary
-                pending_order.total_price = total
-                db.commit()
-            elif summary: # Only create an order row if there are actual items
-                pending_order = Order(user_id=user.id, items=summary, total_price=total, status="Pending")
-                db.add(pending_order)
-                db.commit()
-                db.refresh(pending_order)
-            
-            if unmatched:
-                unmatched_text = f"\n\n(Note: We no get {', '.join(unmatched)})"
-
-        # 6. Route Intents & Use Auntie Chioma's Voice
-        if intent == "checkout":
-            logger.info("cache_bypass_intent intent=checkout platform=%s user_id=%s", platform, user_id)
-            if not pending_order or not pending_order.items:
-                reply = f"{ai_reply}\n\nAh ah, your cart is empty! Wetin you wan buy today?"
-            else:
-                reply = (
-                    f"{ai_reply}\n\n"
-                    f"Your Order (Ref: {pending_order.id}):\n"
-                    f"{pending_order.items}\n\n"
-                    f"Total: N{int(pending_order.total_price or 0)}\n\n"
-                    f"Please pay to Opay: 123456789.\nReply 'PAID' when done."
+            output = order_parser.parse(raw_text)
+        except OutputParserException as exc:
+            output = exc
+        extraction = _extraction_from_output(output, "stream", LARGE_TIER, platform, user_id)
+    if not isinstance(extraction, dict):
+        extraction = {}
+    if early_reply and not extraction.get("message"):
+        extraction["message"] = early_reply
+    return extraction
+
+def _stream_order_chain(chains, chain_input: dict, platform: str, user_id: str, on_message) -> dict:
+    """
+    Streams the large model's raw output and hands `message` to on_message as
+    soon as that field is complete; intent and items are parsed once the
+    object is finished.
+    """
+    usage = TokenUsageCallback()
+    extractor = JsonStringFieldExtractor("message")
+    parts = []
+    started = time.perf_counter()
+    failed = True
+    try:
+        for chunk in chains.large_raw.stream(chain_input, config={"callbacks": [usage]}):
+            parts.append(chunk.content if isinstance(getattr(chunk, "content", None), str) else "")
+            message = extractor.feed(parts[-1])
+            if message and message.strip():
+                logger.info(
+                    "llm_early_reply elapsed_ms=%.1f platform=%s user_id=%s",
+                    (time.perf_counter() - started) * 1000,
+                    platform,
+                    user_id,
                 )
-            send_reply(platform, user_id, reply, db)
-            return True
+                on_message(message)
+        failed = False
+    except Exception:
+        logger.exception("llm_stream_failed platform=%s user_id=%s", platform, user_id)
+    finally:
+        record_llm_call(LARGE_TIER, (time.perf_counter() - started) * 1000, usage.input_tokens, usage.output_tokens, failed)
+    return _finish_streamed_extraction("".join(parts), extractor.value, failed, platform, user_id)
+
+async def _astream_order_chain(chains, chain_input: dict, platform: str, user_id: str, on_message) -> dict:
+    usage = TokenUsageCallback()
+    extractor = JsonStringFieldExtractor("message")
+    parts = []
+    started = time.perf_counter()
+    failed = True
+    try:
+        async for chunk in chains.large_raw.astream(chain_input, config={"callbacks": [usage]}):
+            parts.append(chunk.content if isinstance(getattr(chunk, "content", None), str) else "")
+            message = extractor.feed(parts[-1])
+            if message and message.strip():
+                logger.info(
+                    "llm_early_reply elapsed_ms=%.1f platform=%s user_id=%s",
+                    (time.perf_counter() - started) * 1000,
+                    platform,
+                    user_id,
+                )
+                await on_message(message)
+        failed = False
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        logger.exception("llm_stream_failed platform=%s user_id=%s", platform, user_id)
+    finally:
+        record_llm_call(LARGE_TIER, (time.perf_counter() - started) * 1000, usage.input_tokens, usage.output_tokens, failed)
+    return _finish_streamed_extraction("".join(parts), extractor.value, failed, platform, user_id)
+
+def _accept_small_tier(response, platform: str, user_id: str) -> dict | None:
+    if is_valid_extraction(response):
+        return response
+    record_escalation(SMALL_TIER)
+    logger.info("llm_escalated from_tier=%s platform=%s user_id=%s", SMALL_TIER, platform, user_id)
+    return None
 
-        elif intent == "ordering":
-            logger.info("cache_bypass_intent intent=ordering platform=%s user_id=%s", platform, user_id)
-            # Append current cart state below her natural chat message
-            if pending_order and pending_order.items:
-                current_cart_str = pending_order.items
-                current_total = int(pending_order.total_price or 0)
-            else:
-                current_cart_str = summary if summary else "Cart is empty"
-                current_total = int(total or 0)
-            reply = f"{ai_reply}\n\nCurrent Cart: {current_cart_str} (N{current_total}){unmatched_text}"
-            send_reply(platform, user_id, reply, db)
-            return True
+def _order_chains(chain_input: dict):
+    return order_chains_for(chain_input["menu_hash"], chain_input["menu"], chain_input["format_instructions"])
+
+def invoke_order_chain(
+    chain_input: dict,
+    platform: str,
+    user_id: str,
+    tier: str = LARGE_TIER,
+    on_message=None,
+) -> dict:
+    chains = _order_chains(chain_input)
+    mode = settings.LLM_EXTRACTION_MODE
+    if tier == SMALL_TIER:
+        _count_llm_invocation(platform, user_id)
+        try:
+            output = _invoke_timed(SMALL_TIER, chains.small, chain_input)
+        except OutputParserException as exc:
+            output = exc
+        except Exception:
+            logger.warning("llm_small_tier_failed platform=%s user_id=%s", platform, user_id, exc_info=True)
+            output = None
+        response = _extraction_from_output(output, mode, SMALL_TIER, platform, user_id) if output is not None else None
+        extraction = _accept_small_tier(response, platform, user_id)
+        if extraction is not None:
+            return extraction
+
+    _count_llm_invocation(platform, user_id)
+    if on_message is not None and settings.LLM_STREAM_EARLY_REPLY:
+        return _stream_order_chain(chains, chain_input, platform, user_id, on_message)
+    try:
+        output = _invoke_timed(LARGE_TIER, chains.large, chain_input)
+    except OutputParserException as exc:
+        output = exc
+    except Exception:
+        logger.exception("llm_invoke_failed platform=%s user_id=%s", platform, user_id)
+        return {}
+    return _extraction_from_output(output, mode, LARGE_TIER, platform, user_id) or {}
+
+async def ainvoke_order_chain(
+    chain_input: dict,
+    platform: str,
+    user_id: str,
+    tier: str = LARGE_TIER,
+    on_message=None,
+) -> dict:
+    chains = _order_chains(chain_input)
+    mode = settings.LLM_EXTRACTION_MODE
+    if tier == SMALL_TIER:
+        _count_llm_invocation(platform, user_id)
+        try:
+            output = await _ainvoke_timed(SMALL_TIER, chains.small, chain_input)
+        except OutputParserException as exc:
+            output = exc
+        except Exception:
+            logger.warning("llm_small_tier_failed platform=%s user_id=%s", platform, user_id, exc_info=True)
+            output = None
+        response = _extraction_from_output(output, mode, SMALL_TIER, platform, user_id) if output is not None else None
+        extraction = _accept_small_tier(response, platform, user_id)
+        if extraction is not None:
+            return extraction
+
+    _count_llm_invocation(platform, user_id)
+    if on_message is not None and settings.LLM_STREAM_EARLY_REPLY:
+        return await _astream_order_chain(chains, chain_input, platform, user_id, on_message)
+    try:
+        output = await _ainvoke_timed(LARGE_TIER, chains.large, chain_input)
+    except OutputParserException as exc:
+        output = exc
+    except Exception:
+        logger.exception("llm_invoke_failed platform=%s user_id=%s", platform, user_id)
+        return {}
+    return _extraction_from_output(output, mode, LARGE_TIER, platform, user_id) or {}
+
+def _coalesce_key(turn: dict) -> str | None:
+    """Identical concurrent prompts share one LLM call only when the reply could be shared anyway."""
+    if not settings.CACHE_COALESCE_ENABLED:
+        return None
+    pending_order = turn.get("pending_order")
+    if pending_order is not None and pending_order.items:
+        return None
+    if is_likely_transactional_text(turn["message_text"]):
+        return None
+    return build_global_fingerprint(turn["role"], turn["message_text"], turn["live_menu"], turn["model_name"])
+
+
+def _is_shareable_extraction(extraction: dict, user_name: str | None) -> bool:
+    return (
+        str(extraction.get("intent", "")).lower().strip() in GLOBAL_CACHEABLE_INTENTS
+        and not extraction.get("extracted_items")
+        and is_shareable_reply(str(extraction.get("message", "")), user_name)
+    )
+
+
+def _turn_user_name(turn: dict) -> str | None:
+    user = turn.get("user")
+    return user.name if user is not None else None
 
+
+def run_order_chain(turn: dict, chain_input: dict, on_message=None) -> dict:
+    platform = turn["platform"]
+    user_id = turn["user_id"]
+    key = _coalesce_key(turn)
+    if key is None:
+        return invoke_order_chain(chain_input, platform, user_id, turn["model_tier"], on_message)
+
+    user_name = _turn_user_name(turn)
+
+    def lead():
+        extraction = invoke_order_chain(chain_input, platform, user_id, turn["model_tier"], on_message)
+        return extraction, _is_shareable_extraction(extraction, user_name)
+
+    (extraction, shareable), shared = _llm_flights.do(key, lead)
+    if not shared:
+        return extraction
+    if shareable and _is_shareable_extraction(extraction, user_name):
+        logger.info("llm_coalesced platform=%s user_id=%s", platform, user_id)
+        return dict(extraction)
+    return invoke_order_chain(chain_input, platform, user_id, turn["model_tier"], on_message)
+
+
+async def arun_order_chain(turn: dict, chain_input: dict, on_message=None) -> dict:
+    platform = turn["platform"]
+    user_id = turn["user_id"]
+    key = _coalesce_key(turn)
+    if key is None:
+        return await ainvoke_order_chain(chain_input, platform, user_id, turn["model_tier"], on_message)
+
+    user_name = _turn_user_name(turn)
+
+    async def lead():
+        extraction = await ainvoke_order_chain(chain_input, platform, user_id, turn["model_tier"], on_message)
+        return extraction, _is_shareable_extraction(extraction, user_name)
+
+    try:
+        (extraction, shareable), shared = await _llm_flights.ado(key, lead)
+    except asyncio.CancelledError:
+        if asyncio.current_task().cancelling():
+            raise
+        shared, shareable, extraction = True, False, {}  # the leader was cancelled, not us
+    if not shared:
+        return extraction
+    if shareable and _is_shareable_extraction(extraction, user_name):
+        logger.info("llm_coalesced platform=%s user_id=%s", platform, user_id)
+        return dict(extraction)
+    return await ainvoke_order_chain(chain_input, platform, user_id, turn["model_tier"], on_message)
+
+
+def _revalidation_job(turn: dict) -> dict:
+    """Plain-data copy of what a background refresh needs (no ORM objects or session)."""
+    pending_order = turn.get("pending_order")
+    return {
+        "platform": turn["platform"],
+        "user_id": turn["user_id"],
+        "role": turn["role"],
+        "message_text": turn["message_text"],
+        "live_menu": turn["live_menu"],
+        "model_tier": turn["model_tier"],
+        "model_name": turn["model_name"],
+        "user_name": _turn_user_name(turn),
+        "cart_empty": not (pending_order is not None and pending_order.items),
+    }
+
+
+def _store_revalidated_reply(job: dict, extraction: dict) -> None:
+    intent = str(extraction.get("intent", "unknown")).lower().strip()
+    reply = extraction.get("message")
+    # A refresh that now touches the cart is not a cacheable answer to this prompt.
+    if not reply or extraction.get("extracted_items") or not is_cacheable_intent(intent):
+        logger.info("cache_revalidate_skipped intent=%s platform=%s user_id=%s", intent, job["platform"], job["user_id"])
+        return
+    store_cached_reply(
+        platform=job["platform"],
+        user_id=str(job["user_id"]),
+        role=job["role"],
+        message_text=job["message_text"],
+        menu_text=job["live_menu"],
+        model_identifier=job["model_name"],
+        intent=intent,
+        reply_text=reply,
+    )
+    if job["cart_empty"]:
+        store_global_cached_reply(
+            role=job["role"],
+            message_text=job["message_text"],
+            menu_text=job["live_menu"],
+            model_identifier=job["model_name"],
+            intent=intent,
+            reply_text=reply,
+            user_name=job["user_name"],
+        )
+    logger.info("cache_revalidated intent=%s platform=%s user_id=%s", intent, job["platform"], job["user_id"])
+
+
+def _revalidation_key(job: dict) -> tuple:
+    return (
+        "revalidate",
+        job["platform"],
+        str(job["user_id"]),
+        job["role"],
+        job["message_text"],
+        job["live_menu"],
+        job["model_name"],
+    )
+
+
+def _revalidate_cached_reply(job: dict, chain_input: dict) -> None:
+    try:
+        _llm_flights.do(
+            _revalidation_key(job),
+            lambda: _store_revalidated_reply(
+                job, invoke_order_chain(chain_input, job["platform"], job["user_id"], job["model_tier"])
+            ),
+        )
+    except Exception:
+        logger.exception("cache_revalidate_failed platform=%s user_id=%s", job["platform"], job["user_id"])
+
+
+async def _arevalidate_cached_reply(job: dict, chain_input: dict) -> None:
+    async def refresh():
+        extraction = await ainvoke_order_chain(chain_input, job["platform"], job["user_id"], job["model_tier"])
+        _store_revalidated_reply(job, extraction)
+
+    try:
+        await _llm_flights.ado(_revalidation_key(job), refresh)
+    except Exception:
+        logger.exception("cache_revalidate_failed platform=%s user_id=%s", job["platform"], job["user_id"])
+
+
+def schedule_cache_revalidation(turn: dict, chain_input: dict) -> None:
+    """Refreshes a stale cached reply off the request path (task on a running loop, else a thread)."""
+    global _revalidation_executor
+    job = _revalidation_job(turn)
+    if _llm_flights.in_flight(_revalidation_key(job)):
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if loop is not None:
+        task = loop.create_task(_arevalidate_cached_reply(job, chain_input))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        return
+    if _revalidation_executor is None:
+        _revalidation_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-revalidate")
+    _revalidation_executor.submit(_revalidate_cached_reply, job, chain_input)
+
+
+def _send_turn_reply(
+    turn: dict,
+    reply: str,
+    db: Session,
+    deliveries: list,
+    stage: str = STAGE_CHATTING,
+    pending_order_id: int | None = None,
+) -> None:
+    """Sends the turn's reply, minus the part that was already streamed out early."""
+    early_reply = turn.get("early_reply")
+    if early_reply and reply.startswith(early_reply):
+        reply = reply[len(early_reply):].strip()
+        if not reply:
+            return
+    send_reply(turn["platform"], turn["user_id"], reply, db, deliveries, stage, pending_order_id)
+
+
+def complete_llm_turn(turn: dict, extraction: dict, db: Session, deliveries: list) -> None:
+    platform = turn["platform"]
+    user_id = turn["user_id"]
+    user = turn["user"]
+    pending_order = turn["pending_order"]
+
+    # 4. Extract standard variables
+    intent = str(extraction.get("intent", "unknown")).lower().strip()
+    ai_reply = extraction.get("message", "I dey with you.")
+    extracted_items = extraction.get("extracted_items", [])
+
+    # 5. Handle Cart State Dynamically (Additions & Removals)
+    summary = ""
+    total = 0
+    unmatched_text = ""
+
+    if extracted_items:
+        current_lines = get_order_lines(pending_order, db)
+        lines, summary, total, unmatched = apply_cart_updates(current_lines, extracted_items, db)
+
+        # Save the updated cart state (lines are the source of truth, items is for display)
+        if pending_order:
+            pending_order.lines = lines
+            pending_order.items = summary
+            pending_order.total_price = total
+            commit_or_flush(db)
+        elif summary: # Only create an order row if there are actual items
+            pending_order = Order(user_id=user.id, items=summary, lines=lines, total_price=total, status="Pending")
+            db.add(pending_order)
+            commit_or_flush(db)
+
+        if unmatched:
+            unmatched_text = f"\n\n(Note: We no get {', '.join(unmatched)})"
+
+    # 6. Route Intents & Use Auntie Chioma's Voice
+    if intent == "checkout":
+        logger.info("cache_bypass_intent intent=checkout platform=%s user_id=%s", platform, user_id)
+        if not pending_order or not pending_order.items:
+            reply = f"{ai_reply}\n\nAh ah, your cart is empty! Wetin you wan buy today?"
         else:
-            # Intents: greeting, inquiry, irrelevant
-            final_reply = f"{ai_reply}{unmatched_text}"
-            cache_stored = store_cached_reply(
-                platform=platform,
-                user_id=str(user_id),
-                role=role,
-                message_text=message_text,
-                menu_text=live_menu,
-                model_identifier=ORDER_MODEL_NAME,
-                intent=intent,
-                reply_text=final_reply,
+            reply = (
+                f"{ai_reply}\n\n"
+                f"Your Order (Ref: {pending_order.id}):\n"
+                f"{pending_order.items}\n\n"
+                f"Total: N{int(pending_order.total_price or 0)}\n\n"
+                f"Please pay to Opay: 123456789.\nReply 'PAID' when done."
             )
-            if cache_stored:
-                logger.info("cache_store_ok intent=%s platform=%s user_id=%s", intent, platform, user_id)
-            else:
-                logger.info("cache_bypass_intent intent=%s platform=%s user_id=%s", intent, platform, user_id)
-            send_reply(platform, user_id, final_reply, db)
+            _send_turn_reply(turn, reply, db, deliveries, STAGE_AWAITING_PAYMENT, pending_order.id)
+            return
+        _send_turn_reply(turn, reply, db, deliveries)
+        return
+
+    if intent == "ordering":
+        logger.info("cache_bypass_intent intent=ordering platform=%s user_id=%s", platform, user_id)
+        # Append current cart state below her natural chat message
+        if pending_order and pending_order.items:
+            current_cart_str = pending_order.items
+            current_total = int(pending_order.total_price or 0)
+        else:
+            current_cart_str = summary if summary else "Cart is empty"
+            current_total = int(total or 0)
+        reply = f"{ai_reply}\n\nCurrent Cart: {current_cart_str} (N{current_total}){unmatched_text}"
+        _send_turn_reply(turn, reply, db, deliveries)
+        return
+
+    # Intents: greeting, inquiry, irrelevant
+    final_reply = f"{ai_reply}{unmatched_text}"
+    if turn.get("fast_path"):
+        # Rule-based replies are cheaper to rebuild than to cache.
+        _send_turn_reply(turn, final_reply, db, deliveries)
+        return
+    cache_stored = store_cached_reply(
+        platform=platform,
+        user_id=str(user_id),
+        role=turn["role"],
+        message_text=turn["message_text"],
+        menu_text=turn["live_menu"],
+        model_identifier=turn["model_name"],
+        intent=intent,
+        reply_text=final_reply,
+    )
+    if cache_stored:
+        logger.info("cache_store_ok intent=%s platform=%s user_id=%s", intent, platform, user_id)
+    else:
+        logger.info("cache_bypass_intent intent=%s platform=%s user_id=%s", intent, platform, user_id)
+    # Only replies generated with no cart in context may be shared across users.
+    if not unmatched_text and not (pending_order and pending_order.items):
+        global_stored = store_global_cached_reply(
+            role=turn["role"],
+            message_text=turn["message_text"],
+            menu_text=turn["live_menu"],
+            model_identifier=turn["model_name"],
+            intent=intent,
+            reply_text=final_reply,
+            user_name=user.name if user else None,
+        )
+        if global_stored:
+            logger.info("cache_global_store_ok intent=%s platform=%s user_id=%s", intent, platform, user_id)
+    _send_turn_reply(turn, final_reply, db, deliveries)
+
+def _send_turn_failure(platform: str, user_id: str, db: Session, deliveries: list) -> None:
+    send_reply(platform, user_id, "Network error dey oh. Abeg try again.", db, deliveries)
+
+def start_message_turn(
+    platform: str,
+    user_id: str,
+    user_name: str,
+    message_text: str,
+    db: Session,
+    source_timestamp_ms: int | None,
+    deliveries: list,
+) -> tuple[dict | None, dict | None, bool]:
+    """
+    Everything before the LLM call as one unit of work (a single commit):
+    inbound logging, the deterministic flows, fast path and cache. Returns
+    (turn, chain_input, processed); chain_input is None when the turn is done.
+    """
+    with unit_of_work(db):
+        turn = begin_message_turn(
+            platform, user_id, user_name, message_text, db, source_timestamp_ms, deliveries
+        )
+        if turn is None:
+            return None, None, True
+        try:
+            return turn, prepare_llm_turn(turn, db, deliveries), True
+        except Exception:
+            logger.exception("message processing failed platform=%s user_id=%s", platform, user_id)
+            _send_turn_failure(platform, user_id, db, deliveries)
+            return turn, None, False
+
+def finish_message_turn(turn: dict, extraction: dict | None, db: Session, deliveries: list) -> bool:
+    """Everything after the LLM call as one unit of work; extraction None means the call failed."""
+    with unit_of_work(db):
+        if extraction is None:
+            _send_turn_failure(turn["platform"], turn["user_id"], db, deliveries)
+            return False
+        try:
+            complete_llm_turn(turn, extraction, db, deliveries)
             return True
+        except Exception:
+            logger.exception("message processing failed platform=%s user_id=%s", turn["platform"], turn["user_id"])
+            _send_turn_failure(turn["platform"], turn["user_id"], db, deliveries)
+            return False
+
+def _log_turn_commits(platform: str, user_id: str, db: Session, commits_before: int) -> None:
+    logger.info(
+        "turn_commits=%s platform=%s user_id=%s",
+        commit_count(db) - commits_before,
+        platform,
+        user_id,
+    )
 
-    except Exception as e:
-        logger.exception("message processing failed platform=%s user_id=%s", platform, user_id)
-        send_reply(platform, user_id, "Network error dey oh. Abeg try again.", db)
-        return False
+def process_message(
+    platform: str,
+    user_id: str,
+    user_name: str,
+    message_text: str,
+    db: Session,
+    source_timestamp_ms: int | None = None,
+) -> bool:
+    # No transaction is held open across the LLM call: the turn commits once
+    # before it and once after it, and replies go out after each commit.
+    deliveries = []
+    commits_before = commit_count(db)
+    turn, chain_input, processed = start_message_turn(
+        platform, user_id, user_name, message_text, db, source_timestamp_ms, deliveries
+    )
+
+    def send_early_reply(message: str) -> None:
+        # Delivered right away, ahead of the rest of the turn's replies.
+        turn["early_reply"] = message
+        send_reply(platform, user_id, message, db)
+
+    if chain_input is not None and turn.get("revalidate"):
+        schedule_cache_revalidation(turn, chain_input)
+    elif chain_input is not None:
+        try:
+            extraction = run_order_chain(turn, chain_input, send_early_reply)
+        except Exception:
+            logger.exception("order chain failed platform=%s user_id=%s", platform, user_id)
+            extraction = None
+        processed = finish_message_turn(turn, extraction, db, deliveries)
+
+    if deliveries:
+        dispatch_outbound_messages(db, deliveries)
+    _log_turn_commits(platform, user_id, db, commits_before)
+    return processed
+
+async def process_message_async(
+    platform: str,
+    user_id: str,
+    user_name: str,
+    message_text: str,
+    db: Session,
+    source_timestamp_ms: int | None = None,
+) -> bool:
+    """
+    Event-loop friendly variant of `process_message`. Database phases run in a
+    worker thread (one at a time, so the session is never shared concurrently),
+    the LLM call uses `ainvoke` and replies go out through the async outbox.
+    """
+    deliveries = []
+    commits_before = commit_count(db)
+    turn, chain_input, processed = await asyncio.to_thread(
+        start_message_turn,
+        platform, user_id, user_name, message_text, db, source_timestamp_ms, deliveries,
+    )
+
+    async def send_early_reply(message: str) -> None:
+        turn["early_reply"] = message
+        early_deliveries = []
+        await asyncio.to_thread(send_reply, platform, user_id, message, db, early_deliveries)
+        try:
+            await adispatch_outbound_messages(db, early_deliveries)
+        except Exception:
+            logger.exception("outbox early dispatch failed platform=%s user_id=%s", platform, user_id)
+
+    if chain_input is not None and turn.get("revalidate"):
+        schedule_cache_revalidation(turn, chain_input)
+    elif chain_input is not None:
+        try:
+            extraction = await arun_order_chain(turn, chain_input, send_early_reply)
+        except Exception:
+            logger.exception("order chain failed platform=%s user_id=%s", platform, user_id)
+            extraction = None
+        processed = await asyncio.to_thread(finish_message_turn, turn, extraction, db, deliveries)
+
+    if deliveries:
+        # Best-effort immediate send; anything left pending is retried by the outbox dispatcher.
+        try:
+            await adispatch_outbound_messages(db, deliveries)
+        except Exception:
+            logger.exception("outbox inline dispatch failed platform=%s user_id=%s", platform, user_id)
+    _log_turn_commits(platform, user_id, db, commits_before)
+    return processed
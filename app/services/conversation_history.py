@@ -0,0 +1,196 @@
+import logging
+import re
+from collections import OrderedDict
+from threading import Lock
+from typing import NamedTuple
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.sql_models import Message
+from app.services.prompt_budget import estimate_tokens
+
+
+logger = logging.getLogger(__name__)
+
+# Replies the backend appends to Auntie Chioma's message. They restate state
+# the model does not need per turn: only the newest cart echo is kept, and a
+# checkout block shrinks to its order reference (no bank details).
+CART_ECHO_PATTERN = re.compile(r"\n*Current Cart: [^\n]*")
+CHECKOUT_BLOCK_PATTERN = re.compile(r"\n*Your Order \(Ref: (\d+)\):.*?Reply 'PAID' when done\.", re.DOTALL)
+# Whole messages that carry nothing for the order conversation.
+DROPPED_PREFIXES = (
+    "NEW PAYMENT",  # owner alert
+    "Stock Snapshot:",
+    "Network error dey oh",
+)
+SUMMARY_LINE_MAX_CHARS = 120
+SUMMARY_HEADER = "Earlier in this chat (summary):"
+
+
+class HistoryEntry(NamedTuple):
+    direction: str
+    text: str
+    cart_echo: str | None = None
+
+
+# Per-conversation state kept between turns, keyed by (platform, contact_id):
+# {"last_id", "skipped_id", "window": [HistoryEntry], "summary": [str], "cart_echo"}
+_histories: OrderedDict = OrderedDict()
+_histories_lock = Lock()
+
+
+def clean_history_body(direction: str, body: str | None) -> HistoryEntry | None:
+    """Strips backend boilerplate from one stored message; None drops it."""
+    text = (body or "").strip()
+    if not text or text.startswith(DROPPED_PREFIXES):
+        return None
+    if direction == "inbound":
+        return HistoryEntry(direction, text)
+    cart_echo = None
+    match = CART_ECHO_PATTERN.search(text)
+    if match:
+        cart_echo = match.group(0).strip()
+        text = CART_ECHO_PATTERN.sub("", text)
+    text = CHECKOUT_BLOCK_PATTERN.sub(lambda m: f"\n(Order #{m.group(1)} sent for payment.)", text).strip()
+    if not text and cart_echo is None:
+        return None
+    return HistoryEntry(direction, text, cart_echo)
+
+
+def _summary_line(entry: HistoryEntry) -> str | None:
+    text = " ".join(entry.text.split())
+    if entry.direction != "inbound":
+        # Her replies are long; the first sentence carries what she said.
+        text = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+    if not text:
+        return None
+    if len(text) > SUMMARY_LINE_MAX_CHARS:
+        text = text[: SUMMARY_LINE_MAX_CHARS - 3].rstrip() + "..."
+    return f"{'Customer' if entry.direction == 'inbound' else 'You'}: {text}"
+
+
+def _fold_into_summary(state: dict, entry: HistoryEntry) -> None:
+    summary = state["summary"]
+    line = _summary_line(entry)
+    if line:
+        summary.append(line)
+    while len(summary) > 1 and estimate_tokens("\n".join(summary)) > settings.HISTORY_SUMMARY_MAX_TOKENS:
+        summary.pop(0)
+
+
+def _render(state: dict) -> list:
+    window = state["window"]
+    newest_cart = next((entry.cart_echo for entry in reversed(window) if entry.cart_echo), None)
+    summary = list(state["summary"])
+    if newest_cart is None and state["cart_echo"]:
+        summary.append(f"Last cart shown: {state['cart_echo']}")
+    messages = []
+    if summary:
+        messages.append(SystemMessage(content=SUMMARY_HEADER + "\n" + "\n".join(summary)))
+    for entry in window:
+        if entry.direction == "inbound":
+            messages.append(HumanMessage(content=entry.text))
+            continue
+        text = entry.text
+        if entry.cart_echo and entry.cart_echo == newest_cart:
+            text = f"{text}\n\n{entry.cart_echo}" if text else entry.cart_echo
+            newest_cart = None
+        if text:
+            messages.append(AIMessage(content=text))
+    return messages
+
+
+def _history_tokens(messages: list) -> int:
+    return sum(estimate_tokens(message.content) + 4 for message in messages)
+
+
+def _fetch_new_messages(db: Session, platform: str, contact_id: str, state: dict, exclude_id: int | None):
+    query = db.query(Message).filter(
+        Message.platform == platform,
+        Message.contact_id == contact_id,
+    )
+    if exclude_id is not None:
+        query = query.filter(Message.id != exclude_id)
+    if state["last_id"]:
+        newer = Message.id > state["last_id"]
+        query = query.filter(or_(newer, Message.id == state["skipped_id"]) if state["skipped_id"] else newer)
+    rows = (
+        query.order_by(Message.timestamp.desc(), Message.id.desc())
+        .limit(settings.HISTORY_LOAD_LIMIT)
+        .all()
+    )
+    return list(reversed(rows))
+
+
+def build_chat_history(db: Session, platform: str, contact_id: str, exclude_message_id: int | None = None) -> list:
+    """
+    LangChain messages for the order prompt: a rolling summary of older
+    turns, then the last HISTORY_MAX_MESSAGES cleaned messages of this
+    platform's conversation, trimmed to HISTORY_MAX_TOKENS. State is cached
+    per conversation, so each turn only reads the rows added since the last.
+    """
+    contact_id = str(contact_id)
+    key = (platform, contact_id)
+    with _histories_lock:
+        cached = _histories.get(key)
+        if cached is not None:
+            _histories.move_to_end(key)
+    state = {
+        "last_id": cached["last_id"] if cached else 0,
+        "skipped_id": cached["skipped_id"] if cached else None,
+        "window": list(cached["window"]) if cached else [],
+        "summary": list(cached["summary"]) if cached else [],
+        "cart_echo": cached["cart_echo"] if cached else None,
+    }
+
+    rows = _fetch_new_messages(db, platform, contact_id, state, exclude_message_id)
+    for row in rows:
+        entry = clean_history_body(row.direction, row.body)
+        if entry is not None:
+            state["window"].append(entry)
+            if entry.cart_echo:
+                state["cart_echo"] = entry.cart_echo
+        state["last_id"] = max(state["last_id"], row.id)
+    # The current inbound row is left out now; a later turn reads it as a
+    # newer row, or by id if a concurrent message already moved last_id past it.
+    if exclude_message_id is not None and exclude_message_id < state["last_id"]:
+        state["skipped_id"] = exclude_message_id
+    else:
+        state["skipped_id"] = None
+
+    window = state["window"]
+    while len(window) > settings.HISTORY_MAX_MESSAGES:
+        _fold_into_summary(state, window.pop(0))
+    messages = _render(state)
+    while window and _history_tokens(messages) > settings.HISTORY_MAX_TOKENS:
+        _fold_into_summary(state, window.pop(0))
+        messages = _render(state)
+
+    with _histories_lock:
+        current = _histories.get(key)
+        if current is None or current["last_id"] <= state["last_id"]:
+            _histories[key] = state
+            _histories.move_to_end(key)
+        while len(_histories) > settings.HISTORY_CACHE_MAX_CONVERSATIONS:
+            _histories.popitem(last=False)
+    logger.debug(
+        "chat_history platform=%s contact_id=%s fetched=%s window=%s summary_lines=%s",
+        platform,
+        contact_id,
+        len(rows),
+        len(window),
+        len(state["summary"]),
+    )
+    return messages
+
+
+def invalidate_chat_history(platform: str | None = None, contact_id: str | None = None) -> None:
+    """Forgets cached history for one conversation, or all of them."""
+    with _histories_lock:
+        if platform is None or contact_id is None:
+            _histories.clear()
+        else:
+            _histories.pop((platform, str(contact_id)), None)
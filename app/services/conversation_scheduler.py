@@ -0,0 +1,67 @@
+import asyncio
+import zlib
+from typing import Any, Awaitable, Callable, Hashable
+
+from app.core.config import settings
+
+
+def conversation_key(platform: str, user_id: str) -> str:
+    return f"{platform}:{user_id}"
+
+
+def conversation_shard(platform: str, user_id: str, shard_count: int | None = None) -> int:
+    """Stable shard for a conversation; crc32 so it is identical across processes and restarts."""
+    count = max(shard_count or settings.INBOUND_SHARD_COUNT, 1)
+    return zlib.crc32(conversation_key(platform, user_id).encode("utf-8")) % count
+
+
+def owned_shards(worker_index: int, worker_count: int, shard_count: int | None = None) -> list[int]:
+    count = max(shard_count or settings.INBOUND_SHARD_COUNT, 1)
+    worker_count = max(worker_count, 1)
+    return [shard for shard in range(count) if shard % worker_count == worker_index % worker_count]
+
+
+class KeyedScheduler:
+    """
+    Runs submitted jobs concurrently across keys but strictly in submission
+    order within a key. Each job waits for the previous job of its key before
+    taking one of the `max_concurrency` slots, so a busy conversation never
+    blocks the others.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self._slots = asyncio.Semaphore(max(max_concurrency, 1))
+        self._tails: dict[Hashable, asyncio.Task] = {}
+        self._in_flight: set[asyncio.Task] = set()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def submit(self, key: Hashable, job: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        previous = self._tails.get(key)
+        task = asyncio.create_task(self._run_after(previous, job))
+        self._tails[key] = task
+        self._in_flight.add(task)
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return task
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        self._in_flight.discard(task)
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+    async def _run_after(self, previous: asyncio.Task | None, job: Callable[[], Awaitable[Any]]) -> Any:
+        if previous is not None:
+            # Only ordering matters here; the predecessor's outcome is its own business.
+            await asyncio.wait([previous])
+        async with self._slots:
+            return await job()
+
+    async def wait_for_capacity(self, limit: int) -> None:
+        while self._in_flight and len(self._in_flight) >= limit:
+            await asyncio.wait(set(self._in_flight), return_when=asyncio.FIRST_COMPLETED)
+
+    async def drain(self) -> None:
+        while self._in_flight:
+            await asyncio.wait(set(self._in_flight))
@@ -0,0 +1,56 @@
+import logging
+
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.models.sql_models import ConversationState
+
+
+logger = logging.getLogger(__name__)
+
+# Dialog stages, set by the reply that moves the conversation there.
+STAGE_CHATTING = "chatting"
+STAGE_AWAITING_PAYMENT = "awaiting_payment"  # checkout block with the account details sent
+STAGE_AWAITING_PAYMENT_NAME = "awaiting_payment_name"  # asked for the name on the bank account
+STAGE_AWAITING_CONFIRMATION = "awaiting_confirmation"  # payment reported, owner has to /confirm
+
+_UPSERT_DIALECTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+
+def get_conversation_stage(db: Session, platform: str, contact_id: str) -> str:
+    """Primary-key lookup; conversations without a row are plain chats."""
+    state = db.get(ConversationState, (platform, str(contact_id)))
+    return state.stage if state is not None else STAGE_CHATTING
+
+
+def record_reply_state(
+    db: Session,
+    platform: str,
+    contact_id: str,
+    stage: str,
+    pending_order_id: int | None,
+    timestamp_ms: int,
+) -> None:
+    """
+    Upserts the conversation row in the caller's transaction, so the state
+    and the outbound message that caused it commit together.
+    """
+    values = {
+        "platform": platform,
+        "contact_id": str(contact_id),
+        "stage": stage,
+        "pending_order_id": pending_order_id,
+        "last_activity_at": timestamp_ms,
+    }
+    insert = _UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+    if insert is not None:
+        statement = insert(ConversationState).values(**values)
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=["platform", "contact_id"],
+                set_={key: statement.excluded[key] for key in ("stage", "pending_order_id", "last_activity_at")},
+            )
+        )
+        return
+    db.merge(ConversationState(**values))
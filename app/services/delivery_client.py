@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import weakref
+from threading import BoundedSemaphore, Lock
+
+import httpx
+
+from app.core.config import settings
+
+try:
+    import h2  # noqa: F401  # enables httpx HTTP/2 support
+except Exception:  # pragma: no cover - falls back to HTTP/1.1 keep-alive
+    h2 = None
+
+
+logger = logging.getLogger(__name__)
+
+_client: httpx.Client | None = None
+_client_lock = Lock()
+# Per event loop: {"client": AsyncClient, "semaphores": {platform: Semaphore}, "closer": Task}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+_async_closers: set[asyncio.Task] = set()
+_sync_semaphores: dict[str, BoundedSemaphore] = {}
+
+
+def _http2_enabled() -> bool:
+    return settings.DELIVERY_HTTP2 and h2 is not None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=max(settings.DELIVERY_MAX_CONNECTIONS, 1),
+        max_keepalive_connections=max(settings.DELIVERY_MAX_CONNECTIONS, 1),
+        keepalive_expiry=max(settings.DELIVERY_KEEPALIVE_EXPIRY_SEC, 1),
+    )
+
+
+def _platform_concurrency(platform: str) -> int:
+    if platform == "telegram":
+        return max(settings.DELIVERY_TELEGRAM_CONCURRENCY, 1)
+    if platform == "whatsapp":
+        return max(settings.DELIVERY_WHATSAPP_CONCURRENCY, 1)
+    return 1
+
+
+def get_delivery_client() -> httpx.Client:
+    global _client
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(
+                http2=_http2_enabled(),
+                limits=_limits(),
+                timeout=settings.DELIVERY_TIMEOUT_SEC,
+            )
+    return _client
+
+
+async def _close_when_loop_stops(client: httpx.AsyncClient) -> None:
+    # asyncio.run() (and the worker's shutdown) cancels leftover tasks while
+    # the loop is still open, so the client's sockets are closed on their own loop.
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await client.aclose()
+
+
+def _async_entry() -> dict:
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(loop)
+    if entry is None or entry["client"].is_closed:
+        if entry is not None:
+            entry["closer"].cancel()
+        client = httpx.AsyncClient(
+            http2=_http2_enabled(),
+            limits=_limits(),
+            timeout=settings.DELIVERY_TIMEOUT_SEC,
+        )
+        closer = loop.create_task(_close_when_loop_stops(client))
+        _async_closers.add(closer)
+        closer.add_done_callback(_async_closers.discard)
+        entry = _async_clients[loop] = {"client": client, "semaphores": {}, "closer": closer}
+    return entry
+
+
+def get_async_delivery_client() -> httpx.AsyncClient:
+    """One pooled AsyncClient per event loop (connections cannot cross loops)."""
+    return _async_entry()["client"]
+
+
+def _sync_semaphore(platform: str) -> BoundedSemaphore:
+    semaphore = _sync_semaphores.get(platform)
+    if semaphore is None:
+        with _client_lock:
+            semaphore = _sync_semaphores.setdefault(platform, BoundedSemaphore(_platform_concurrency(platform)))
+    return semaphore
+
+
+def _async_semaphore(platform: str) -> asyncio.Semaphore:
+    semaphores = _async_entry()["semaphores"]
+    semaphore = semaphores.get(platform)
+    if semaphore is None:
+        semaphore = semaphores.setdefault(platform, asyncio.Semaphore(_platform_concurrency(platform)))
+    return semaphore
+
+
+def post_json(platform: str, url: str, payload: dict, headers: dict | None = None, timeout: float | None = None) -> httpx.Response:
+    client = get_delivery_client()
+    with _sync_semaphore(platform):
+        return client.post(
+            url,
+            json=payload,
+            headers=headers or {},
+            timeout=timeout if timeout is not None else settings.DELIVERY_TIMEOUT_SEC,
+        )
+
+
+async def apost_json(
+    platform: str,
+    url: str,
+    payload: dict,
+    headers: dict | None = None,
+    timeout: float | None = None,
+) -> httpx.Response:
+    client = get_async_delivery_client()
+    async with _async_semaphore(platform):
+        return await client.post(
+            url,
+            json=payload,
+            headers=headers or {},
+            timeout=timeout if timeout is not None else settings.DELIVERY_TIMEOUT_SEC,
+        )
+
+
+def close_delivery_clients() -> None:
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+async def aclose_delivery_clients() -> None:
+    entry = _async_clients.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        entry["closer"].cancel()
+        await entry["client"].aclose()
+    close_delivery_clients()
@@ -0,0 +1,188 @@
+import re
+
+from app.services.menu_cache import is_live
+from app.services.prompt_cache import TRANSACTION_KEYWORDS, is_likely_transactional_text, normalize_prompt_text
+
+
+# Politeness and address words that never change what a message asks for.
+FILLER_WORDS = {
+    "abeg", "auntie", "aunty", "biko", "chioma", "jare", "ma", "now",
+    "o", "oo", "ooo", "please", "pls", "plz", "sir", "today",
+}
+GREETING_WORDS = {
+    "afternoon", "evening", "far", "good", "hello", "hey", "hi", "hii",
+    "how", "howdy", "howfa", "morning", "sup", "wassup",
+}
+# "good" and "how" alone are not greetings ("how much", "good food").
+GREETING_CORE_WORDS = GREETING_WORDS - {"good", "how"}
+
+MENU_REQUEST_PATTERN = re.compile(
+    r"^(?:(?:show|send|see|give)(?: me)? )?(?:the |your |una )?menu(?: list)?$"
+    r"|^(?:what|wetin) (?:do you|you|una|una dey|you dey) (?:have|get|sell)$"
+    r"|^wetin dey$"
+)
+PRICE_PATTERNS = [
+    re.compile(
+        r"^(?:how much(?: is| be| for| na)?"
+        r"|(?:what is|what s|wetin be) (?:the )?(?:price|cost) (?:of|for)"
+        r"|(?:price|cost) (?:of|for)) (?P<name>.+)$"
+    ),
+    re.compile(r"^(?P<name>.+?) (?:price|cost|how much|na how much|dey how much)$"),
+]
+ITEM_LEADING_WORDS = {"a", "of", "one", "plate", "portion", "the", "una", "your"}
+
+# Order grammar: "[i want|give me|add] <qty> <item> [and] <qty> <item> ..."
+ORDER_VERBS = {"add", "buy", "order"}
+ORDER_LEAD_WORDS = ORDER_VERBS | {"can", "get", "give", "i", "let", "make", "me", "need", "wan", "want"}
+ORDER_UNIT_WORDS = {"of", "pack", "packs", "piece", "pieces", "plate", "plates", "portion", "portions", "x"}
+ORDER_CONNECTORS = {"and", "plus", "then", "with"}
+# Any of these means the message is more than a plain add; the LLM decides.
+ORDER_STOP_WORDS = (TRANSACTION_KEYWORDS - ORDER_VERBS) | {
+    "another", "change", "dont", "exactly", "extra", "instead", "just", "more",
+    "no", "not", "only", "remain", "said", "without",
+}
+QUANTITY_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+MAX_FAST_PATH_QUANTITY = 50
+
+
+def _meaningful_tokens(message_text: str) -> list[str]:
+    return [token for token in normalize_prompt_text(message_text).split() if token not in FILLER_WORDS]
+
+
+def _strip_item_words(tokens: list[str]) -> str:
+    while tokens and tokens[0] in ITEM_LEADING_WORDS:
+        tokens = tokens[1:]
+    return " ".join(tokens)
+
+
+def _extraction(route: str, intent: str, message: str, extracted_items: list | None = None) -> dict:
+    """Same shape as the order chain's JSON, plus the rule that produced it."""
+    return {
+        "thought": f"fast path: {route}",
+        "message": message,
+        "extracted_items": extracted_items or [],
+        "intent": intent,
+        "route": route,
+    }
+
+
+def match_greeting(tokens: list[str]) -> dict | None:
+    if not tokens or not set(tokens) <= GREETING_WORDS or not set(tokens) & GREETING_CORE_WORDS:
+        return None
+    salutation = "Hello"
+    for part in ("morning", "afternoon", "evening"):
+        if part in tokens:
+            salutation = f"Good {part}"
+    return _extraction(
+        "greeting",
+        "greeting",
+        f"{salutation}, my dear! Welcome to our Bukka. Wetin you wan chop today? Type 'menu' to see wetin we get.",
+    )
+
+
+def match_menu_request(tokens: list[str], snapshot: dict) -> dict | None:
+    if not snapshot["live_items"] or not MENU_REQUEST_PATTERN.match(" ".join(tokens)):
+        return None
+    return _extraction(
+        "menu",
+        "inquiry",
+        f"See wetin we get today:\n{snapshot['menu_text']}\n\nTell me wetin you want and how many.",
+    )
+
+
+def match_price_request(tokens: list[str], snapshot: dict) -> dict | None:
+    text = " ".join(tokens)
+    for pattern in PRICE_PATTERNS:
+        match = pattern.match(text)
+        if match is None:
+            continue
+        item = snapshot["index"].resolve_exactly(_strip_item_words(match.group("name").split()))
+        if item is None:
+            return None
+        if not is_live(item):
+            return _extraction(
+                "price",
+                "inquiry",
+                f"Ah sorry my dear, {item.name} don finish for now. Type 'menu' to see wetin remain.",
+            )
+        return _extraction(
+            "price",
+            "inquiry",
+            f"{item.name} na N{int(item.price or 0)}. You wan make I add am for you?",
+        )
+    return None
+
+
+def _parse_quantity(token: str) -> int | None:
+    if token in QUANTITY_WORDS:
+        return QUANTITY_WORDS[token]
+    match = re.fullmatch(r"(\d+)x?", token)
+    return int(match.group(1)) if match else None
+
+
+def parse_simple_order(tokens: list[str], live_index) -> list[tuple[object, int]] | None:
+    """
+    Parses "2 jollof 1 beef" style adds into (menu item, qty) pairs. Every
+    segment must start with a quantity and name exactly one live item;
+    anything else returns None.
+    """
+    if not tokens or set(tokens) & ORDER_STOP_WORDS:
+        return None
+    position = 0
+    while position < len(tokens) and tokens[position] in ORDER_LEAD_WORDS:
+        position += 1
+
+    segments = []
+    while position < len(tokens):
+        qty = _parse_quantity(tokens[position])
+        if qty is None or not 0 < qty <= MAX_FAST_PATH_QUANTITY:
+            return None
+        position += 1
+        name_tokens = []
+        while position < len(tokens) and _parse_quantity(tokens[position]) is None:
+            name_tokens.append(tokens[position])
+            position += 1
+        while name_tokens and name_tokens[0] in ORDER_UNIT_WORDS:
+            name_tokens = name_tokens[1:]
+        while name_tokens and name_tokens[-1] in ORDER_CONNECTORS:
+            name_tokens = name_tokens[:-1]
+        item = live_index.resolve_exactly(" ".join(name_tokens)) if name_tokens else None
+        if item is None:
+            return None
+        segments.append((item, qty))
+    return segments or None
+
+
+def match_simple_order(tokens: list[str], snapshot: dict, cart_item_ids) -> dict | None:
+    segments = parse_simple_order(tokens, snapshot["live_index"])
+    # "1 coke" with coke already in the cart may be a correction, not an add.
+    if segments is None or any(item.id in cart_item_ids for item, _ in segments):
+        return None
+    return _extraction(
+        "order",
+        "ordering",
+        "Sharp sharp! I don add am for you.",
+        # item_id pins the exact item matched here; the cart would otherwise re-resolve the name.
+        [{"item": item.name, "item_id": item.id, "quantity": qty, "action": "add"} for item, qty in segments],
+    )
+
+
+def route_fast_path(message_text: str, snapshot: dict, cart_item_ids=frozenset()) -> dict | None:
+    """
+    Answers trivial messages (greetings, menu, single-item price, plain
+    "2 jollof 1 beef" adds) from the menu snapshot. Returns an extraction in
+    the order chain's shape, or None when the message needs the LLM.
+    """
+    tokens = _meaningful_tokens(message_text)
+    if not tokens:
+        return None
+    if is_likely_transactional_text(message_text):
+        return match_simple_order(tokens, snapshot, cart_item_ids)
+    return (
+        match_greeting(tokens)
+        or match_menu_request(tokens, snapshot)
+        or match_price_request(tokens, snapshot)
+    )
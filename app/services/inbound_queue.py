@@ -0,0 +1,394 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.sql_models import ProcessedWebhookEvent
+from app.services.conversation_scheduler import (
+    KeyedScheduler,
+    conversation_key,
+    conversation_shard,
+    owned_shards,
+)
+from app.services.webhook_dedupe import claim_webhook_event
+
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = "pending"
+STATUS_PROCESSING = "processing"
+# Set in the same commit as the turn's first write: the job has had side
+# effects (inbound message, replies) and must not be replayed.
+STATUS_STARTED = "started"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+# A conversation's later messages wait while one of these is ahead of them.
+UNFINISHED_STATUSES = (STATUS_PENDING, STATUS_PROCESSING, STATUS_STARTED)
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def enqueue_inbound_message(
+    db: Session,
+    platform: str,
+    external_event_id: str | None,
+    user_id: str,
+    user_name: str,
+    message_text: str,
+    source_timestamp_ms: int | None = None,
+) -> bool:
+    """
+    Stores an inbound message as a pending job. Returns False when the event
+    was already claimed (platform retry / duplicate delivery).
+    """
+    job = {
+        "platform": platform,
+        "user_id": str(user_id),
+        "user_name": user_name,
+        "message_text": message_text,
+        "source_timestamp_ms": source_timestamp_ms,
+    }
+    event_id = external_event_id or f"local:{uuid.uuid4().hex}"
+    return claim_webhook_event(
+        db,
+        platform,
+        event_id,
+        payload=job,
+        conversation_key=conversation_key(platform, str(user_id)),
+        shard=conversation_shard(platform, str(user_id)),
+    )
+
+
+def recover_stale_claims(db: Session) -> int:
+    """
+    Puts jobs held by a crashed worker back in the pending state. Jobs whose
+    turn had already started are failed instead: replaying them would log the
+    message and send its replies a second time.
+    """
+    cutoff = _now_ms() - max(settings.INBOUND_LOCK_TIMEOUT_SEC, 1) * 1000
+    recovered = (
+        db.query(ProcessedWebhookEvent)
+        .filter(
+            ProcessedWebhookEvent.status == STATUS_PROCESSING,
+            ProcessedWebhookEvent.locked_at < cutoff,
+        )
+        .update(
+            {
+                ProcessedWebhookEvent.status: STATUS_PENDING,
+                ProcessedWebhookEvent.locked_by: None,
+                ProcessedWebhookEvent.locked_at: None,
+            },
+            synchronize_session=False,
+        )
+    )
+    interrupted = (
+        db.query(ProcessedWebhookEvent)
+        .filter(
+            ProcessedWebhookEvent.status == STATUS_STARTED,
+            ProcessedWebhookEvent.locked_at < cutoff,
+        )
+        .update(
+            {
+                ProcessedWebhookEvent.status: STATUS_FAILED,
+                ProcessedWebhookEvent.last_error: "worker stopped after the turn started",
+                ProcessedWebhookEvent.locked_by: None,
+                ProcessedWebhookEvent.locked_at: None,
+            },
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    if recovered:
+        logger.warning("inbound_queue recovered stale claims count=%s", recovered)
+    if interrupted:
+        logger.warning("inbound_queue failed interrupted turns count=%s", interrupted)
+    return recovered
+
+
+def renew_claims(db: Session, worker_id: str) -> int:
+    """
+    Restarts the lock clock on every job this worker still holds (queued or
+    running), so a turn slowed down by LLM retries is not taken for one a
+    crashed worker left behind.
+    """
+    renewed = (
+        db.query(ProcessedWebhookEvent)
+        .filter(
+            ProcessedWebhookEvent.locked_by == worker_id,
+            ProcessedWebhookEvent.status.in_((STATUS_PROCESSING, STATUS_STARTED)),
+        )
+        .update({ProcessedWebhookEvent.locked_at: _now_ms()}, synchronize_session=False)
+    )
+    db.commit()
+    return renewed
+
+
+async def _renew_claims_periodically(worker_id: str, session_factory) -> None:
+    interval = max(settings.INBOUND_LOCK_TIMEOUT_SEC, 1) / 3
+    while True:
+        await asyncio.sleep(interval)
+        db = session_factory()
+        try:
+            await asyncio.to_thread(renew_claims, db, worker_id)
+        except Exception:
+            logger.exception("inbound_queue lease renewal failed worker_id=%s", worker_id)
+            db.rollback()
+        finally:
+            db.close()
+
+
+def claim_pending_events(
+    db: Session,
+    worker_id: str,
+    limit: int,
+    shards: list[int] | None = None,
+) -> list[tuple[int, str]]:
+    """
+    Claims up to `limit` pending jobs for this worker, oldest first, returning
+    (id, conversation_key) pairs. Each row is flipped with a conditional UPDATE
+    so two workers can never own the same job. With `shards`, only conversations
+    owned by this worker are claimed, which keeps each conversation on one worker.
+    """
+    query = db.query(ProcessedWebhookEvent.id, ProcessedWebhookEvent.conversation_key).filter(
+        ProcessedWebhookEvent.status == STATUS_PENDING
+    )
+    if shards is not None:
+        shard_filter = ProcessedWebhookEvent.shard.in_(shards)
+        if 0 in shards:
+            # Rows queued before sharding existed are drained by shard 0's owner.
+            shard_filter = or_(shard_filter, ProcessedWebhookEvent.shard.is_(None))
+        query = query.filter(shard_filter)
+    query = query.order_by(ProcessedWebhookEvent.id).limit(max(limit, 1))
+    if db.bind is not None and db.bind.dialect.name == "postgresql":
+        query = query.with_for_update(skip_locked=True)
+    rows = query.all()
+
+    # A conversation whose earlier message is still with another worker waits for it.
+    keys = {row.conversation_key for row in rows if row.conversation_key}
+    busy_before = {}
+    if keys:
+        busy_rows = (
+            db.query(ProcessedWebhookEvent.conversation_key, func.min(ProcessedWebhookEvent.id))
+            .filter(
+                ProcessedWebhookEvent.conversation_key.in_(keys),
+                ProcessedWebhookEvent.status.in_((STATUS_PROCESSING, STATUS_STARTED)),
+                or_(ProcessedWebhookEvent.locked_by.is_(None), ProcessedWebhookEvent.locked_by != worker_id),
+            )
+            .group_by(ProcessedWebhookEvent.conversation_key)
+            .all()
+        )
+        busy_before = {key: first_id for key, first_id in busy_rows}
+    candidates = [
+        (row.id, row.conversation_key or f"event:{row.id}")
+        for row in rows
+        if not (row.conversation_key in busy_before and busy_before[row.conversation_key] < row.id)
+    ]
+
+    claimed = []
+    now_ms = _now_ms()
+    for event_id, key in candidates:
+        updated = (
+            db.query(ProcessedWebhookEvent)
+            .filter(
+                ProcessedWebhookEvent.id == event_id,
+                ProcessedWebhookEvent.status == STATUS_PENDING,
+            )
+            .update(
+                {
+                    ProcessedWebhookEvent.status: STATUS_PROCESSING,
+                    ProcessedWebhookEvent.locked_by: worker_id,
+                    ProcessedWebhookEvent.locked_at: now_ms,
+                },
+                synchronize_session=False,
+            )
+        )
+        if updated:
+            claimed.append((event_id, key))
+    db.commit()
+    return claimed
+
+
+def mark_event_done(db: Session, event: ProcessedWebhookEvent) -> None:
+    event.status = STATUS_DONE
+    event.processed_at = _now_ms()
+    event.locked_by = None
+    event.locked_at = None
+    db.commit()
+
+
+def mark_event_failed(db: Session, event: ProcessedWebhookEvent, error: str, retry: bool = True) -> None:
+    event.attempts = (event.attempts or 0) + 1
+    if retry and event.attempts < settings.INBOUND_MAX_ATTEMPTS:
+        event.status = STATUS_PENDING
+    else:
+        event.status = STATUS_FAILED
+    event.last_error = error[:500]
+    event.locked_by = None
+    event.locked_at = None
+    db.commit()
+
+
+def _has_earlier_unfinished_event(db: Session, event: ProcessedWebhookEvent) -> bool:
+    if not event.conversation_key:
+        return False
+    earlier = (
+        db.query(ProcessedWebhookEvent.id)
+        .filter(
+            ProcessedWebhookEvent.conversation_key == event.conversation_key,
+            ProcessedWebhookEvent.id < event.id,
+            ProcessedWebhookEvent.status.in_(UNFINISHED_STATUSES),
+        )
+        .first()
+    )
+    return earlier is not None
+
+
+def _decode_job(event: ProcessedWebhookEvent) -> dict | None:
+    if not event.payload:
+        return None
+    try:
+        job = json.loads(event.payload)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(job, dict) or not job.get("user_id"):
+        return None
+    return job
+
+
+async def handle_inbound_job(job: dict, db: Session) -> bool:
+    # Imported lazily so the queue can be used without loading the LLM stack.
+    from app.services.chat_manager import process_message_async
+
+    return await process_message_async(
+        platform=job["platform"],
+        user_id=job["user_id"],
+        user_name=job.get("user_name") or "User",
+        message_text=job.get("message_text") or "",
+        db=db,
+        source_timestamp_ms=job.get("source_timestamp_ms"),
+    )
+
+
+async def process_inbound_event(event_id: int, handler=handle_inbound_job, session_factory=SessionLocal) -> bool:
+    db = session_factory()
+    try:
+        event = db.get(ProcessedWebhookEvent, event_id)
+        if event is None:
+            return False
+
+        job = _decode_job(event)
+        if job is None:
+            logger.error("inbound_queue invalid job payload event_id=%s", event.external_event_id)
+            event.status = STATUS_FAILED
+            event.last_error = "invalid payload"
+            event.locked_by = None
+            event.locked_at = None
+            db.commit()
+            return False
+
+        if _has_earlier_unfinished_event(db, event):
+            # An earlier message of this conversation is waiting for a retry (or
+            # is with another worker); this one goes back in line behind it.
+            logger.info("inbound_queue deferred event_id=%s key=%s", event.external_event_id, event.conversation_key)
+            event.status = STATUS_PENDING
+            event.locked_by = None
+            event.locked_at = None
+            db.commit()
+            return False
+
+        # Jobs may wait behind earlier messages of the same conversation; restart the lock clock.
+        event.locked_at = _now_ms()
+        db.commit()
+
+        # Not committed here: the status is persisted by the handler's first
+        # commit, together with the turn's first writes, or rolled back with them.
+        event.status = STATUS_STARTED
+        error = "process_message returned False"
+        try:
+            processed = await handler(job, db)
+        except Exception as exc:
+            logger.exception("inbound_queue job failed event_id=%s", event.external_event_id)
+            processed = False
+            error = repr(exc)
+
+        if processed:
+            mark_event_done(db, event)
+            return True
+
+        db.rollback()
+        # Once the turn has committed anything (the fallback reply included), a
+        # replay would duplicate it; only jobs that left no trace are retried.
+        mark_event_failed(db, event, error, retry=event.status != STATUS_STARTED)
+        return False
+    finally:
+        db.close()
+
+
+async def run_inbound_worker(
+    worker_id: str,
+    worker_index: int = 0,
+    worker_count: int = 1,
+    handler=handle_inbound_job,
+    session_factory=SessionLocal,
+    stop_event: asyncio.Event | None = None,
+) -> None:
+    logger.info(
+        "inbound_queue worker started worker_id=%s index=%s count=%s",
+        worker_id,
+        worker_index,
+        worker_count,
+    )
+    poll_interval = max(settings.INBOUND_POLL_INTERVAL_MS, 10) / 1000
+    concurrency = max(settings.INBOUND_CONCURRENCY, 1)
+    shards = owned_shards(worker_index, worker_count) if worker_count > 1 else None
+    scheduler = KeyedScheduler(concurrency)
+    last_recovery = 0.0
+    # Claims are leases: renewed while this worker is alive, recovered once it stops.
+    renewer = asyncio.create_task(_renew_claims_periodically(worker_id, session_factory))
+
+    try:
+        while stop_event is None or not stop_event.is_set():
+            # Claiming only up to free capacity keeps locked_at meaningful for stale recovery.
+            await scheduler.wait_for_capacity(concurrency)
+            limit = min(settings.INBOUND_BATCH_SIZE, concurrency - scheduler.in_flight)
+
+            db = session_factory()
+            try:
+                if time.monotonic() - last_recovery >= max(settings.INBOUND_LOCK_TIMEOUT_SEC, 1):
+                    recover_stale_claims(db)
+                    last_recovery = time.monotonic()
+                claimed = claim_pending_events(db, worker_id, limit, shards=shards)
+            except Exception:
+                logger.exception("inbound_queue claim failed worker_id=%s", worker_id)
+                db.rollback()
+                claimed = []
+            finally:
+                db.close()
+
+            if not claimed:
+                await asyncio.sleep(poll_interval)
+                continue
+
+            # Claimed in id order, so submission order is arrival order within a conversation.
+            for event_id, key in claimed:
+                scheduler.submit(
+                    key,
+                    lambda event_id=event_id: process_inbound_event(
+                        event_id, handler=handler, session_factory=session_factory
+                    ),
+                )
+    finally:
+        await scheduler.drain()
+        renewer.cancel()
+        try:
+            await renewer
+        except asyncio.CancelledError:
+            pass
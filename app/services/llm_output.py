@@ -0,0 +1,164 @@
+import json
+import logging
+import re
+from collections import Counter
+from threading import Lock
+
+from langchain_core.exceptions import OutputParserException
+
+
+logger = logging.getLogger(__name__)
+
+# How each order-chain output was turned into an extraction, per mode:
+# "parsed" (first try), "repaired" (parser failed, local repair worked),
+# "failed" (nothing usable). Before local repair every non-"parsed" outcome
+# cost a second LLM call.
+PARSE_OUTCOMES = ("parsed", "repaired", "failed")
+
+_outcomes: Counter = Counter()
+_outcomes_lock = Lock()
+
+_FENCE_PATTERN = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+
+
+def _scan(text: str) -> tuple[list[str], bool, int | None, list[int]]:
+    """
+    Walks a JSON prefix: returns the closers still owed, whether it ends
+    inside a string, where the first top-level value ends (if it does) and
+    the positions of commas outside strings.
+    """
+    closers: list[str] = []
+    commas: list[int] = []
+    in_string = False
+    escaped = False
+    for position, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if closers:
+                closers.pop()
+            if not closers:
+                return [], False, position, commas
+        elif char == ",":
+            commas.append(position)
+    return closers, in_string, None, commas
+
+
+def _loads_object(candidate: str) -> dict | None:
+    for text in (candidate, _TRAILING_COMMA_PATTERN.sub(r"\1", candidate)):
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            continue
+        return data if isinstance(data, dict) else None
+    return None
+
+
+def _close_prefix(prefix: str) -> str:
+    closers, in_string, _, _ = _scan(prefix)
+    if in_string:
+        if prefix.endswith("\\"):
+            prefix = prefix[:-1]
+        prefix += '"'
+    return prefix.rstrip().rstrip(",") + "".join(reversed(closers))
+
+
+def repair_json_object(text: str) -> dict | None:
+    """
+    Best-effort recovery of one JSON object from model output: strips code
+    fences and surrounding prose, drops trailing commas and, for truncated
+    output, closes the open string/brackets (backing off to the last complete
+    member when the cut falls inside one). Returns None when nothing parses.
+    """
+    if not text:
+        return None
+    fenced = _FENCE_PATTERN.search(text)
+    if fenced and "{" in fenced.group(1):
+        text = fenced.group(1)
+    start = text.find("{")
+    if start == -1:
+        return None
+    text = text[start:]
+
+    _, _, end, commas = _scan(text)
+    if end is not None:
+        return _loads_object(text[:end + 1])
+
+    # Truncated: try the whole prefix, then back off one member at a time.
+    for cut in [len(text)] + list(reversed(commas)):
+        data = _loads_object(_close_prefix(text[:cut]))
+        if data is not None:
+            return data
+    return None
+
+
+def _raw_structured_text(raw) -> str:
+    """The text to repair when a structured-output call failed validation."""
+    for call in getattr(raw, "invalid_tool_calls", None) or []:
+        if isinstance(call.get("args"), str):
+            return call["args"]
+    content = getattr(raw, "content", "")
+    return content if isinstance(content, str) else ""
+
+
+def extraction_from_output(output) -> tuple[dict | None, str]:
+    """
+    Turns what an order chain produced into (extraction, outcome):
+
+    - a dict from the JSON parser                          -> "parsed"
+    - a structured-output result ({"raw", "parsed", "parsing_error"})
+    - an OutputParserException (its llm_output is the raw text)
+
+    Parser failures are repaired locally instead of re-asking the model.
+    """
+    if isinstance(output, OutputParserException):
+        extraction = repair_json_object(output.llm_output or "")
+        return extraction, "repaired" if extraction is not None else "failed"
+    if isinstance(output, dict) and "parsing_error" in output and "raw" in output:
+        parsed = output.get("parsed")
+        if parsed is not None and output.get("parsing_error") is None:
+            return (parsed.model_dump() if hasattr(parsed, "model_dump") else dict(parsed)), "parsed"
+        raw = output.get("raw")
+        # A schema mismatch (e.g. an unknown intent) still leaves usable tool arguments.
+        for call in getattr(raw, "tool_calls", None) or []:
+            if isinstance(call.get("args"), dict) and call["args"]:
+                return dict(call["args"]), "repaired"
+        extraction = repair_json_object(_raw_structured_text(raw))
+        return extraction, "repaired" if extraction is not None else "failed"
+    if isinstance(output, dict):
+        return output, "parsed"
+    return None, "failed"
+
+
+def record_parse_outcome(mode: str, outcome: str) -> None:
+    with _outcomes_lock:
+        _outcomes[(mode, outcome)] += 1
+        total = _outcomes[(mode, outcome)]
+    if outcome != "parsed":
+        logger.info("llm_parse_fallback mode=%s outcome=%s count=%s", mode, outcome, total)
+
+
+def parse_outcome_stats() -> dict[str, dict[str, int]]:
+    """{mode: {outcome: count}} since process start (or the last reset)."""
+    with _outcomes_lock:
+        items = list(_outcomes.items())
+    stats: dict[str, dict[str, int]] = {}
+    for (mode, outcome), count in items:
+        stats.setdefault(mode, dict.fromkeys(PARSE_OUTCOMES, 0))[outcome] = count
+    return stats
+
+
+def reset_parse_outcome_stats() -> None:
+    with _outcomes_lock:
+        _outcomes.clear()
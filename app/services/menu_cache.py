@@ -0,0 +1,151 @@
+import hashlib
+import logging
+import time
+from threading import Lock
+from typing import NamedTuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis_client import get_redis_client
+from app.models.sql_models import MenuItem
+from app.services.menu_index import MenuIndex
+
+
+logger = logging.getLogger(__name__)
+
+MENU_VERSION_KEY = "bukka:menu:version"
+FALLBACK_MENU_TEXT = "Jollof Rice (N500), Chicken (N1000), Water (N100)"
+
+
+class MenuEntry(NamedTuple):
+    """Read-only copy of a MenuItem row; safe to share across sessions and threads."""
+
+    id: int
+    name: str
+    price: int | None
+    is_available: bool
+    stock_qty: int | None
+    reorder_level: int | None
+
+
+_snapshot: dict | None = None
+_local_version = 0
+_lock = Lock()
+# (shared version, monotonic time it was read); a turn reads the snapshot several times.
+_version_check: tuple[int | None, float] | None = None
+
+
+def is_live(entry: MenuEntry) -> bool:
+    return bool(entry.is_available) and (entry.stock_qty is None or entry.stock_qty > 0)
+
+
+def render_menu_text(items: list[MenuEntry]) -> str:
+    if not items:
+        return FALLBACK_MENU_TEXT
+    return "\n".join([f"- {item.name}: N{item.price or 0}" for item in items])
+
+
+def render_compact_menu_text(items: list[MenuEntry]) -> str:
+    """One-line menu for the LLM prompt ("Jollof Rice N500; Beef N200")."""
+    if not items:
+        return FALLBACK_MENU_TEXT
+    return "; ".join(f"{item.name} N{item.price or 0}" for item in items)
+
+
+def _shared_version() -> int | None:
+    """
+    Version bumped by any process that changes the menu (None without Redis).
+    Read from Redis at most every MENU_VERSION_CHECK_SEC, so another process's
+    menu change is picked up within that window.
+    """
+    global _version_check
+    now = time.monotonic()
+    checked = _version_check
+    if checked is not None and now - checked[1] < settings.MENU_VERSION_CHECK_SEC:
+        return checked[0]
+
+    client = get_redis_client()
+    if client is None:
+        version = None
+    else:
+        try:
+            version = int(client.get(MENU_VERSION_KEY) or 0)
+        except Exception:
+            logger.exception("cache_error menu version lookup failed")
+            version = None
+    _version_check = (version, now)
+    return version
+
+
+def _load_snapshot(db: Session, local_version: int, shared_version: int | None) -> dict:
+    rows = db.query(MenuItem).order_by(MenuItem.id).all()
+    all_items = [
+        MenuEntry(
+            id=row.id,
+            name=row.name,
+            price=row.price,
+            is_available=bool(row.is_available),
+            stock_qty=row.stock_qty,
+            reorder_level=row.reorder_level,
+        )
+        for row in rows
+    ]
+    live_items = [item for item in all_items if is_live(item)]
+    menu_text = render_menu_text(live_items)
+    if settings.PROMPT_MENU_FORMAT == "list":
+        prompt_menu = menu_text
+    else:
+        prompt_menu = render_compact_menu_text(live_items)
+    return {
+        "version": (shared_version, local_version),
+        "loaded_at": time.monotonic(),
+        "all_items": all_items,
+        "live_items": live_items,
+        "index": MenuIndex(all_items),
+        "live_index": MenuIndex(live_items),
+        "menu_text": menu_text,
+        "menu_hash": hashlib.sha256(menu_text.encode("utf-8")).hexdigest(),
+        "prompt_menu": prompt_menu,
+    }
+
+
+def get_menu_snapshot(db: Session) -> dict:
+    """
+    Returns the cached menu: all items, live items, their MenuIndex lookups,
+    rendered text and its hash, and the menu as rendered for the LLM prompt.
+    Reloaded when the menu version changes or after MENU_CACHE_TTL_SEC.
+    """
+    global _snapshot
+    shared_version = _shared_version()
+    local_version = _local_version
+    snapshot = _snapshot
+    if (
+        snapshot is not None
+        and snapshot["version"] == (shared_version, local_version)
+        and time.monotonic() - snapshot["loaded_at"] < settings.MENU_CACHE_TTL_SEC
+    ):
+        return snapshot
+
+    snapshot = _load_snapshot(db, local_version, shared_version)
+    with _lock:
+        # Do not publish a snapshot that an invalidation raced past.
+        if local_version == _local_version:
+            _snapshot = snapshot
+    return snapshot
+
+
+def invalidate_menu_cache() -> None:
+    global _snapshot, _local_version, _version_check
+    with _lock:
+        _local_version += 1
+        _snapshot = None
+        _version_check = None
+
+    client = get_redis_client()
+    if client is None:
+        return
+    try:
+        client.incr(MENU_VERSION_KEY)
+    except Exception:
+        logger.exception("cache_error menu version bump failed")
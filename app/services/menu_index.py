@@ -0,0 +1,117 @@
+from bisect import bisect_right
+from collections import Counter
+
+
+def normalize_text(value: str) -> str:
+    cleaned = "".join(ch.lower() if ch.isalnum() else " " for ch in value)
+    return " ".join(cleaned.split())
+
+
+class MenuIndex:
+    """
+    Precomputed lookup structure for one menu version. `resolve` returns the
+    first item whose name contains the target (or is contained in it), else
+    the one sharing the most words, without re-normalizing every menu name on
+    every call:
+
+    - containment ("jollof" in "jollof rice") is one str.find over a joined
+      haystack of pre-normalized names;
+    - the reverse ("jollof rice" in "2 jollof rice") only probes substrings of
+      the target whose length matches some menu name;
+    - token overlap goes through an inverted token -> positions index.
+    """
+
+    MEMO_LIMIT = 1024
+
+    def __init__(self, menu_items: list):
+        self.items = list(menu_items)
+        self.by_id = {item.id: item for item in self.items}
+        names = [normalize_text(item.name) for item in self.items]
+
+        self._first_position_by_name: dict[str, int] = {}
+        self._postings: dict[str, list[int]] = {}
+        self._first_empty_position: int | None = None
+        for position, name in enumerate(names):
+            if not name and self._first_empty_position is None:
+                self._first_empty_position = position
+            self._first_position_by_name.setdefault(name, position)
+            for token in set(name.split()):
+                self._postings.setdefault(token, []).append(position)
+
+        self._name_lengths = sorted({len(name) for name in names if name})
+        self._haystack = "\n".join(names)
+        self._starts = []
+        offset = 0
+        for name in names:
+            self._starts.append(offset)
+            offset += len(name) + 1
+        self._memo: dict[str, object] = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _first_containment_position(self, target: str) -> int | None:
+        candidates = []
+
+        hit = self._haystack.find(target)
+        if hit != -1:
+            candidates.append(bisect_right(self._starts, hit) - 1)
+
+        target_length = len(target)
+        for length in self._name_lengths:
+            if length > target_length:
+                break
+            for start in range(target_length - length + 1):
+                position = self._first_position_by_name.get(target[start:start + length])
+                if position is not None:
+                    candidates.append(position)
+
+        if self._first_empty_position is not None:
+            candidates.append(self._first_empty_position)
+        return min(candidates) if candidates else None
+
+    def _best_token_overlap_position(self, target: str) -> int | None:
+        scores = Counter()
+        for token in set(target.split()):
+            for position in self._postings.get(token, ()):
+                scores[position] += 1
+        if not scores:
+            return None
+        best_score = max(scores.values())
+        return min(position for position, score in scores.items() if score == best_score)
+
+    def resolve_exactly(self, raw_item: str):
+        """
+        Strict lookup for callers that must not guess: the item whose
+        normalized name equals the target, else the single item whose name
+        contains every target token. None when nothing or several match.
+        """
+        target = normalize_text(raw_item)
+        if not target:
+            return None
+        position = self._first_position_by_name.get(target)
+        if position is not None:
+            return self.items[position]
+        positions = None
+        for token in set(target.split()):
+            matches = set(self._postings.get(token, ()))
+            positions = matches if positions is None else positions & matches
+            if not positions:
+                return None
+        return self.items[positions.pop()] if len(positions) == 1 else None
+
+    def resolve(self, raw_item: str):
+        target = normalize_text(raw_item)
+        if not target:
+            return None
+        if target in self._memo:
+            return self._memo[target]
+
+        position = self._first_containment_position(target)
+        if position is None:
+            position = self._best_token_overlap_position(target)
+        item = self.items[position] if position is not None else None
+
+        if len(self._memo) < self.MEMO_LIMIT:
+            self._memo[target] = item
+        return item
@@ -0,0 +1,48 @@
+import zlib
+
+import numpy as np
+
+from app.core.config import settings
+
+
+# Universal hashing (a * x + b) mod p with 32-bit token hashes; products stay below 2**63.
+_PRIME = (1 << 31) - 1
+_MAX_PERMUTATIONS = 512
+_rng = np.random.RandomState(20240601)  # fixed: signatures must agree across processes
+_A = _rng.randint(1, _PRIME, size=_MAX_PERMUTATIONS, dtype=np.int64).astype(np.uint64)
+_B = _rng.randint(0, _PRIME, size=_MAX_PERMUTATIONS, dtype=np.int64).astype(np.uint64)
+
+
+def lsh_params() -> tuple[int, int]:
+    """(bands, rows per band), derived from CACHE_LSH_NUM_PERM and CACHE_LSH_BANDS."""
+    num_perm = min(max(settings.CACHE_LSH_NUM_PERM, 1), _MAX_PERMUTATIONS)
+    bands = min(max(settings.CACHE_LSH_BANDS, 1), num_perm)
+    return bands, num_perm // bands
+
+
+def minhash_signature(tokens: set[str] | list[str], num_perm: int) -> np.ndarray:
+    token_hashes = np.array(
+        sorted({zlib.crc32(token.encode("utf-8")) for token in tokens}),
+        dtype=np.uint64,
+    )
+    if token_hashes.size == 0:
+        return np.full(num_perm, _PRIME, dtype=np.uint64)
+    permuted = (_A[:num_perm, None] * token_hashes[None, :] + _B[:num_perm, None]) % _PRIME
+    return permuted.min(axis=1)
+
+
+def lsh_band_keys(tokens: set[str] | list[str]) -> list[str]:
+    """
+    One bucket id per band ("<band>:<hash>"). Two token sets with Jaccard
+    similarity s share at least one bucket with probability
+    1 - (1 - s**rows) ** bands.
+    """
+    if not tokens:
+        return []
+    bands, rows = lsh_params()
+    signature = minhash_signature(tokens, bands * rows)
+    keys = []
+    for band in range(bands):
+        chunk = signature[band * rows:(band + 1) * rows].tobytes()
+        keys.append(f"{band}:{zlib.crc32(chunk):08x}")
+    return keys
@@ -0,0 +1,159 @@
+import logging
+from threading import Lock
+
+from app.core.config import settings
+from app.services.fast_path import GREETING_WORDS, QUANTITY_WORDS
+from app.services.prompt_cache import TRANSACTION_KEYWORDS, normalize_prompt_text
+
+
+logger = logging.getLogger(__name__)
+
+SMALL_TIER = "small"
+LARGE_TIER = "large"
+VALID_INTENTS = {"greeting", "inquiry", "ordering", "checkout", "irrelevant"}
+
+INQUIRY_WORDS = {"available", "deliver", "have", "how", "menu", "much", "open", "price", "sell", "what", "wetin"}
+CART_EDIT_WORDS = {"cancel", "comot", "minus", "reduce", "remove"}
+# Corrections and negations: the turn depends on what is already in the cart.
+AMBIGUITY_WORDS = {
+    "actually", "another", "but", "change", "dont", "exactly", "instead", "just",
+    "mistake", "no", "not", "only", "remain", "said", "without", "wrong",
+}
+CONNECTOR_WORDS = {"and", "plus", "with"}
+
+_stats_lock = Lock()
+_tier_stats: dict[str, dict] = {}
+
+
+def tier_model_name(tier: str) -> str:
+    return settings.ORDER_SMALL_MODEL_NAME if tier == SMALL_TIER else settings.ORDER_MODEL_NAME
+
+
+def route_confidence(message_text: str, has_cart: bool = False) -> float:
+    """
+    How sure we are that the small model can handle this turn (0..1).
+    Short greeting/inquiry-shaped input scores high; multi-item orders,
+    cart edits, corrections and long messages pull the score down.
+    """
+    tokens = normalize_prompt_text(message_text).split()
+    if not tokens:
+        return 1.0
+    token_set = set(tokens)
+    quantities = sum(1 for token in tokens if token.isdigit() or token in QUANTITY_WORDS)
+
+    is_long = len(tokens) > settings.LLM_ROUTER_SMALL_MAX_WORDS
+    confidence = 1.0
+    if is_long:
+        confidence -= 0.5
+    if quantities >= 2:
+        confidence -= 0.5
+    elif quantities == 1:
+        confidence -= 0.2
+    if quantities and token_set & CONNECTOR_WORDS:
+        confidence -= 0.2
+    if token_set & TRANSACTION_KEYWORDS:
+        confidence -= 0.2
+    if token_set & CART_EDIT_WORDS:
+        confidence -= 0.4
+    if token_set & AMBIGUITY_WORDS:
+        confidence -= 0.5
+    if has_cart:
+        confidence -= 0.2
+    if not is_long and not quantities and token_set & (GREETING_WORDS | INQUIRY_WORDS):
+        confidence += 0.1
+    return min(max(confidence, 0.0), 1.0)
+
+
+def choose_model_tier(message_text: str, has_cart: bool = False) -> str:
+    if not settings.LLM_ROUTING_ENABLED:
+        return LARGE_TIER
+    if route_confidence(message_text, has_cart) >= settings.LLM_ROUTER_MIN_CONFIDENCE:
+        return SMALL_TIER
+    return LARGE_TIER
+
+
+def is_valid_extraction(extraction: dict) -> bool:
+    """A small-model answer we can act on; anything else is escalated to the large model."""
+    if not isinstance(extraction, dict):
+        return False
+    intent = str(extraction.get("intent", "")).lower().strip()
+    message = extraction.get("message")
+    items = extraction.get("extracted_items", [])
+    if intent not in VALID_INTENTS or not isinstance(message, str) or not message.strip():
+        return False
+    if not isinstance(items, list) or (intent == "ordering" and not items):
+        return False
+    for item in items:
+        if not isinstance(item, dict) or not str(item.get("item", "")).strip():
+            return False
+        if str(item.get("action", "add")).lower().strip() not in {"add", "remove"}:
+            return False
+        try:
+            int(item.get("quantity", 1))
+        except (TypeError, ValueError):
+            return False
+    return True
+
+
+def estimate_cost_usd(tier: str, input_tokens: int, output_tokens: int) -> float:
+    if tier == SMALL_TIER:
+        input_rate, output_rate = settings.LLM_SMALL_COST_PER_M_INPUT, settings.LLM_SMALL_COST_PER_M_OUTPUT
+    else:
+        input_rate, output_rate = settings.LLM_LARGE_COST_PER_M_INPUT, settings.LLM_LARGE_COST_PER_M_OUTPUT
+    return (input_tokens * input_rate + output_tokens * output_rate) / 1_000_000
+
+
+def _stats_for(tier: str) -> dict:
+    stats = _tier_stats.get(tier)
+    if stats is None:
+        stats = _tier_stats[tier] = {
+            "calls": 0,
+            "failures": 0,
+            "escalations": 0,
+            "latency_ms_total": 0.0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cost_usd": 0.0,
+        }
+    return stats
+
+
+def record_llm_call(tier: str, latency_ms: float, input_tokens: int = 0, output_tokens: int = 0, failed: bool = False) -> None:
+    cost = estimate_cost_usd(tier, input_tokens, output_tokens)
+    with _stats_lock:
+        stats = _stats_for(tier)
+        stats["calls"] += 1
+        stats["failures"] += int(failed)
+        stats["latency_ms_total"] += latency_ms
+        stats["input_tokens"] += input_tokens
+        stats["output_tokens"] += output_tokens
+        stats["cost_usd"] += cost
+    logger.info(
+        "llm_call tier=%s model=%s latency_ms=%.1f input_tokens=%s output_tokens=%s cost_usd=%.6f failed=%s",
+        tier,
+        tier_model_name(tier),
+        latency_ms,
+        input_tokens,
+        output_tokens,
+        cost,
+        failed,
+    )
+
+
+def record_escalation(tier: str) -> None:
+    with _stats_lock:
+        _stats_for(tier)["escalations"] += 1
+
+
+def llm_tier_stats() -> dict[str, dict]:
+    """Per-tier counters, with average latency, since process start (or the last reset)."""
+    with _stats_lock:
+        snapshot = {tier: dict(stats) for tier, stats in _tier_stats.items()}
+    for stats in snapshot.values():
+        stats["latency_ms_avg"] = stats["latency_ms_total"] / stats["calls"] if stats["calls"] else 0.0
+    return snapshot
+
+
+def reset_llm_tier_stats() -> None:
+    with _stats_lock:
+        _tier_stats.clear()
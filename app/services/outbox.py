@@ -0,0 +1,353 @@
+import asyncio
+import logging
+import random
+import time
+from threading import Lock
+
+import httpx
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.sql_models import Message
+from app.services.delivery_client import apost_json, post_json
+
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = "pending"
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+STATUS_SKIPPED = "skipped"
+
+# Client errors that will never succeed on retry (bad chat id, blocked bot, bad token).
+PERMANENT_FAILURE_CODES = {400, 401, 403, 404}
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def build_outbound_request(platform: str, to_id: str, message_text: str) -> tuple[str, dict, dict] | None:
+    if platform == "whatsapp":
+        if not settings.META_API_TOKEN:
+            return None
+        url = f"https://graph.facebook.com/v18.0/{settings.WHATSAPP_PHONE_ID}/messages"
+        headers = {"Authorization": f"Bearer {settings.META_API_TOKEN}", "Content-Type": "application/json"}
+        payload = {"messaging_product": "whatsapp", "to": to_id, "type": "text", "text": {"body": message_text}}
+        return url, payload, headers
+    if platform == "telegram":
+        if not settings.TELEGRAM_BOT_TOKEN:
+            return None
+        url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
+        payload = {"chat_id": to_id, "text": message_text}
+        return url, payload, {}
+    return None
+
+
+class RateLimiter:
+    """
+    Token bucket per platform plus a minimum gap between messages to the same
+    chat. `reserve` books a send slot and returns how long to wait for it; a
+    slot further off than `max_wait` is not booked, so the caller can
+    reschedule the message instead of waiting. Limits are per process; size
+    the rates for the number of processes sending.
+    """
+
+    def __init__(self, rate_per_sec: float, chat_interval_ms: int = 0):
+        self.rate = max(rate_per_sec, 0.1)
+        self.burst = max(self.rate, 1.0)
+        self.chat_interval = max(chat_interval_ms, 0) / 1000
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._chat_next_slot: dict[str, float] = {}
+        self._lock = Lock()
+
+    def reserve(self, chat_id: str, max_wait: float | None = None) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+
+            bucket_wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            wait = max(bucket_wait, self._paused_until - now, self._chat_next_slot.get(chat_id, 0.0) - now, 0.0)
+            if max_wait is not None and wait > max_wait:
+                return wait
+
+            self._tokens -= 1
+            if self.chat_interval:
+                self._chat_next_slot[chat_id] = now + wait + self.chat_interval
+                if len(self._chat_next_slot) > 10_000:
+                    self._chat_next_slot = {k: v for k, v in self._chat_next_slot.items() if v > now}
+            return wait
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + max(seconds, 0.0))
+
+
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = Lock()
+
+
+def get_rate_limiter(platform: str) -> RateLimiter:
+    limiter = _limiters.get(platform)
+    if limiter is not None:
+        return limiter
+    with _limiters_lock:
+        if platform not in _limiters:
+            if platform == "telegram":
+                _limiters[platform] = RateLimiter(
+                    settings.OUTBOX_TELEGRAM_RATE_PER_SEC,
+                    settings.OUTBOX_TELEGRAM_CHAT_INTERVAL_MS,
+                )
+            else:
+                _limiters[platform] = RateLimiter(settings.OUTBOX_WHATSAPP_RATE_PER_SEC)
+        return _limiters[platform]
+
+
+def retry_delay_ms(attempts: int) -> int:
+    base = max(settings.OUTBOX_RETRY_BASE_MS, 1)
+    delay = min(base * (2 ** max(attempts - 1, 0)), max(settings.OUTBOX_RETRY_MAX_MS, base))
+    return int(delay + random.uniform(0, base / 2))
+
+
+def _retry_after_seconds(response: httpx.Response) -> float | None:
+    header = response.headers.get("retry-after")
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            pass
+    try:
+        # Telegram: {"ok": false, "parameters": {"retry_after": 5}}
+        return float(response.json().get("parameters", {}).get("retry_after"))
+    except Exception:
+        return None
+
+
+def _classify_response(response: httpx.Response) -> dict:
+    if response.is_success:
+        return {"status": STATUS_SENT}
+    error = f"HTTP {response.status_code}: {response.text[:200]}"
+    if response.status_code == 429:
+        return {"status": STATUS_PENDING, "retry_after": _retry_after_seconds(response) or 1.0, "error": error}
+    if response.status_code in PERMANENT_FAILURE_CODES:
+        return {"status": STATUS_FAILED, "error": error}
+    return {"status": STATUS_PENDING, "error": error}
+
+
+def _prepare_send(message: Message, held_chats: dict) -> tuple[dict | None, tuple | None, float]:
+    """
+    held_chats maps (platform, chat) to the delay of a message already
+    rescheduled in this batch; later messages to that chat wait behind it.
+    """
+    request_parts = build_outbound_request(message.platform, message.contact_id, message.body or "")
+    if request_parts is None:
+        return {"status": STATUS_SKIPPED, "error": "platform credentials not configured"}, None, 0.0
+    chat = (message.platform, message.contact_id)
+    if chat in held_chats:
+        return {"status": STATUS_PENDING, "retry_after": held_chats[chat], "deferred": True}, None, 0.0
+    max_wait = max(settings.OUTBOX_MAX_SEND_WAIT_MS, 0) / 1000
+    wait = get_rate_limiter(message.platform).reserve(message.contact_id, max_wait)
+    if wait > max_wait:
+        # Do not hold a worker for the per-chat gap or a rate-limit pause; the
+        # row goes back to pending and the dispatcher sends it when it is due.
+        held_chats[chat] = wait
+        return {"status": STATUS_PENDING, "retry_after": wait, "deferred": True}, None, 0.0
+    return None, request_parts, wait
+
+
+def _send_sync(message: Message, held_chats: dict) -> dict:
+    result, request_parts, wait = _prepare_send(message, held_chats)
+    if result is not None:
+        return result
+    if wait:
+        time.sleep(wait)
+    url, payload, headers = request_parts
+    try:
+        return _classify_response(post_json(message.platform, url, payload, headers=headers))
+    except httpx.HTTPError as exc:
+        return {"status": STATUS_PENDING, "error": repr(exc)}
+
+
+async def _send_async(message: Message, held_chats: dict) -> dict:
+    result, request_parts, wait = _prepare_send(message, held_chats)
+    if result is not None:
+        return result
+    if wait:
+        await asyncio.sleep(wait)
+    url, payload, headers = request_parts
+    try:
+        return _classify_response(await apost_json(message.platform, url, payload, headers=headers))
+    except httpx.HTTPError as exc:
+        return {"status": STATUS_PENDING, "error": repr(exc)}
+
+
+def _apply_result(message: Message, result: dict) -> None:
+    now_ms = _now_ms()
+    status = result["status"]
+    if result.get("retry_after") and not result.get("deferred"):
+        get_rate_limiter(message.platform).pause(result["retry_after"])
+
+    if status in {STATUS_SENT, STATUS_SKIPPED}:
+        message.delivery_status = status
+        message.delivered_at = now_ms if status == STATUS_SENT else None
+        message.next_attempt_at = None
+        message.last_delivery_error = result.get("error")
+        return
+
+    if result.get("deferred"):
+        message.delivery_status = STATUS_PENDING
+        message.next_attempt_at = now_ms + int(result["retry_after"] * 1000)
+        return
+
+    message.delivery_attempts = (message.delivery_attempts or 0) + 1
+    message.last_delivery_error = (result.get("error") or "")[:500]
+    if status == STATUS_FAILED or message.delivery_attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        message.delivery_status = STATUS_FAILED
+        message.next_attempt_at = None
+        logger.error(
+            "outbox delivery failed permanently platform=%s to=%s message_id=%s error=%s",
+            message.platform,
+            message.contact_id,
+            message.id,
+            message.last_delivery_error,
+        )
+        return
+
+    delay_ms = retry_delay_ms(message.delivery_attempts)
+    if result.get("retry_after"):
+        delay_ms = max(delay_ms, int(result["retry_after"] * 1000))
+    message.delivery_status = STATUS_PENDING
+    message.next_attempt_at = now_ms + delay_ms
+    logger.warning(
+        "outbox delivery retry scheduled platform=%s to=%s message_id=%s attempt=%s delay_ms=%s",
+        message.platform,
+        message.contact_id,
+        message.id,
+        message.delivery_attempts,
+        delay_ms,
+    )
+
+
+def recover_stale_deliveries(db: Session) -> int:
+    # While a row is "sending", next_attempt_at holds its lock expiry.
+    recovered = (
+        db.query(Message)
+        .filter(Message.delivery_status == STATUS_SENDING, Message.next_attempt_at < _now_ms())
+        .update({Message.delivery_status: STATUS_PENDING}, synchronize_session=False)
+    )
+    db.commit()
+    return recovered
+
+
+def claim_outbound_messages(db: Session, limit: int, message_ids: list[int] | None = None) -> list[Message]:
+    """Flips due pending rows to "sending" (conditional UPDATE per row) and returns them in id order."""
+    now_ms = _now_ms()
+    query = db.query(Message.id).filter(Message.delivery_status == STATUS_PENDING)
+    if message_ids is not None:
+        if not message_ids:
+            return []
+        query = query.filter(Message.id.in_(message_ids))
+    else:
+        query = query.filter(Message.next_attempt_at <= now_ms)
+    candidate_ids = [row.id for row in query.order_by(Message.id).limit(max(limit, 1)).all()]
+
+    lock_expiry = now_ms + max(settings.OUTBOX_LOCK_TIMEOUT_SEC, 1) * 1000
+    claimed_ids = []
+    for message_id in candidate_ids:
+        updated = (
+            db.query(Message)
+            .filter(Message.id == message_id, Message.delivery_status == STATUS_PENDING)
+            .update(
+                {Message.delivery_status: STATUS_SENDING, Message.next_attempt_at: lock_expiry},
+                synchronize_session=False,
+            )
+        )
+        if updated:
+            claimed_ids.append(message_id)
+    db.commit()
+    if not claimed_ids:
+        return []
+    return db.query(Message).filter(Message.id.in_(claimed_ids)).order_by(Message.id).all()
+
+
+def _group_by_chat(messages: list[Message]) -> list[list[Message]]:
+    groups: dict[tuple[str, str], list[Message]] = {}
+    for message in messages:
+        groups.setdefault((message.platform, message.contact_id), []).append(message)
+    return list(groups.values())
+
+
+def dispatch_outbound_messages(db: Session, message_ids: list[int] | None = None, limit: int | None = None) -> int:
+    """Synchronously delivers a batch. Returns the number of messages sent."""
+    messages = claim_outbound_messages(db, limit or settings.OUTBOX_BATCH_SIZE, message_ids)
+    sent = 0
+    held_chats = {}
+    for message in messages:
+        result = _send_sync(message, held_chats)
+        _apply_result(message, result)
+        sent += result["status"] == STATUS_SENT
+    if messages:
+        db.commit()
+    return sent
+
+
+async def adispatch_outbound_messages(
+    db: Session,
+    message_ids: list[int] | None = None,
+    limit: int | None = None,
+) -> int:
+    """
+    Async batch delivery. Chats are sent to concurrently, messages to the same
+    chat in order; all results are written back in one commit.
+    """
+    messages = await asyncio.to_thread(
+        claim_outbound_messages, db, limit or settings.OUTBOX_BATCH_SIZE, message_ids
+    )
+    if not messages:
+        return 0
+
+    held_chats = {}
+
+    async def send_group(group: list[Message]) -> list[tuple[Message, dict]]:
+        return [(message, await _send_async(message, held_chats)) for message in group]
+
+    grouped_results = await asyncio.gather(*(send_group(group) for group in _group_by_chat(messages)))
+
+    def write_results() -> int:
+        sent = 0
+        for results in grouped_results:
+            for message, result in results:
+                _apply_result(message, result)
+                sent += result["status"] == STATUS_SENT
+        db.commit()
+        return sent
+
+    return await asyncio.to_thread(write_results)
+
+
+async def run_outbox_dispatcher(session_factory=SessionLocal, stop_event: asyncio.Event | None = None) -> None:
+    logger.info("outbox dispatcher started")
+    poll_interval = max(settings.OUTBOX_POLL_INTERVAL_MS, 10) / 1000
+    last_recovery = 0.0
+
+    while stop_event is None or not stop_event.is_set():
+        db = session_factory()
+        try:
+            if time.monotonic() - last_recovery >= max(settings.OUTBOX_LOCK_TIMEOUT_SEC, 1):
+                await asyncio.to_thread(recover_stale_deliveries, db)
+                last_recovery = time.monotonic()
+            handled = await adispatch_outbound_messages(db)
+        except Exception:
+            logger.exception("outbox dispatch batch failed")
+            db.rollback()
+            handled = 0
+        finally:
+            db.close()
+
+        if not handled:
+            await asyncio.sleep(poll_interval)
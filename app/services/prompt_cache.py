@@ -3,15 +3,33 @@ import json
 import logging
 import re
 import time
+from collections import OrderedDict
+from threading import Lock
 
 from app.core.config import settings
 from app.core.redis_client import get_redis_client
+from app.services.minhash_lsh import lsh_band_keys
+from app.services.semantic_backends import get_semantic_backend, jaccard_similarity  # noqa: F401
 
 
 logger = logging.getLogger(__name__)
 
 CACHE_PREFIX = "bukka:prompt_cache:v1"
 CACHEABLE_INTENTS = {"greeting", "inquiry", "irrelevant"}
+GLOBAL_CACHEABLE_INTENTS = {"greeting", "inquiry"}
+# Replies mentioning any of these may carry one customer's cart or payment state.
+PERSONAL_REPLY_MARKERS = {
+    "cart",
+    "checkout",
+    "confirmed",
+    "opay",
+    "order",
+    "orders",
+    "paid",
+    "pay",
+    "ref",
+    "total",
+}
 STOPWORDS = {
     "a",
     "an",
@@ -45,6 +63,44 @@ TRANSACTION_KEYWORDS = {
     "remove",
 }
 
+# Prune, rank and fetch semantic candidates in one round trip: the most recent
+# signatures plus whatever shares an LSH bucket with the incoming prompt.
+# Entry keys are built inside the script, which assumes a single Redis node
+# (not Cluster).
+SEMANTIC_LOOKUP_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, ARGV[1])
+local signatures = redis.call('ZREVRANGE', KEYS[1], 0, tonumber(ARGV[2]) - 1)
+local seen = {}
+local entry_keys = {}
+for _, signature in ipairs(signatures) do
+    seen[signature] = true
+    entry_keys[#entry_keys + 1] = ARGV[3] .. signature
+end
+if #ARGV > 3 then
+    local bucket_hits = redis.call('HMGET', KEYS[2], unpack(ARGV, 4))
+    for i = 1, #bucket_hits do
+        local signature = bucket_hits[i]
+        if signature and not seen[signature] then
+            seen[signature] = true
+            entry_keys[#entry_keys + 1] = ARGV[3] .. signature
+        end
+    end
+end
+if #entry_keys == 0 then
+    return {}
+end
+return redis.call('MGET', unpack(entry_keys))
+"""
+_lookup_script = None  # (client, registered script)
+
+# L1: fingerprint -> (expires_at, payload), least recently used first.
+_local_exact: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+_local_lock = Lock()
+# Semantic tier used when Redis is unavailable: scope (index key) ->
+# {"entries": OrderedDict[signature -> (expires_at, payload, band keys)], "buckets": {band key -> signature}}
+_local_semantic: OrderedDict[str, dict] = OrderedDict()
+LOCAL_SEMANTIC_MAX_PER_SCOPE = 500
+
 
 def _sha256(value: str) -> str:
     return hashlib.sha256(value.encode("utf-8")).hexdigest()
@@ -60,17 +116,6 @@ def tokenise_prompt(normalized_text: str) -> set[str]:
     return tokens
 
 
-def jaccard_similarity(a: set[str], b: set[str]) -> float:
-    if not a and not b:
-        return 1.0
-    if not a or not b:
-        return 0.0
-    union = a | b
-    if not union:
-        return 0.0
-    return len(a & b) / len(union)
-
-
 def is_likely_transactional_text(message_text: str) -> bool:
     normalized = normalize_prompt_text(message_text)
     tokens = set(normalized.split())
@@ -125,10 +170,40 @@ def _build_context_parts(
     }
 
 
+def build_global_fingerprint(role: str, message_text: str, menu_text: str, model_identifier: str) -> str | None:
+    """
+    User-independent key: the prompt's token set (order and stopwords ignored),
+    the menu and the model. None when the prompt has no content tokens.
+    """
+    tokens = sorted(tokenise_prompt(normalize_prompt_text(message_text)))
+    if not tokens:
+        return None
+    payload = {
+        "scope": "global",
+        "role": str(role),
+        "prompt_hash": _sha256(" ".join(tokens)),
+        "menu_hash": _sha256(menu_text or ""),
+        "model": str(model_identifier or "unknown"),
+    }
+    return _sha256(json.dumps(payload, sort_keys=True))
+
+
+def is_shareable_reply(reply_text: str, user_name: str | None = None) -> bool:
+    tokens = set(normalize_prompt_text(reply_text).split())
+    if not tokens or tokens & PERSONAL_REPLY_MARKERS:
+        return False
+    name_tokens = {token for token in normalize_prompt_text(user_name or "").split() if len(token) >= 3}
+    return not (tokens & name_tokens)
+
+
 def _exact_key(fingerprint: str) -> str:
     return f"{CACHE_PREFIX}:exact:{fingerprint}"
 
 
+def _global_key(fingerprint: str) -> str:
+    return f"{CACHE_PREFIX}:global:{fingerprint}"
+
+
 def _semantic_index_key(platform: str, user_id: str, role: str) -> str:
     return f"{CACHE_PREFIX}:semantic:index:{platform}:{user_id}:{role}"
 
@@ -137,6 +212,147 @@ def _semantic_entry_key(platform: str, user_id: str, role: str, signature: str)
     return f"{CACHE_PREFIX}:semantic:entry:{platform}:{user_id}:{role}:{signature}"
 
 
+def _semantic_lsh_key(platform: str, user_id: str, role: str) -> str:
+    return f"{CACHE_PREFIX}:semantic:lsh:{platform}:{user_id}:{role}"
+
+
+def _band_keys(tokens: set[str] | list[str]) -> list[str]:
+    return lsh_band_keys(tokens) if settings.CACHE_LSH_ENABLED else []
+
+
+def _semantic_lookup_script(client):
+    global _lookup_script
+    cached = _lookup_script
+    if cached is not None and cached[0] is client:
+        return cached[1]
+    script = client.register_script(SEMANTIC_LOOKUP_SCRIPT)
+    _lookup_script = (client, script)
+    return script
+
+
+def _fetch_semantic_candidates(client, parts: dict, min_ts: int, band_keys: list[str]) -> list:
+    index_key = _semantic_index_key(parts["platform"], parts["user_id"], parts["role"])
+    lsh_key = _semantic_lsh_key(parts["platform"], parts["user_id"], parts["role"])
+    entry_prefix = _semantic_entry_key(parts["platform"], parts["user_id"], parts["role"], "")
+    max_candidates = max(settings.CACHE_MAX_CANDIDATES, 1)
+    if getattr(client, "register_script", None) is not None:
+        script = _semantic_lookup_script(client)
+        return script(keys=[index_key, lsh_key], args=[min_ts, max_candidates, entry_prefix, *band_keys]) or []
+
+    # Clients without scripting support: one pipelined round trip plus an MGET.
+    pipe = client.pipeline(transaction=False)
+    pipe.zremrangebyscore(index_key, 0, min_ts)
+    pipe.zrevrange(index_key, 0, max_candidates - 1)
+    if band_keys:
+        pipe.hmget(lsh_key, band_keys)
+    results = pipe.execute()
+    signatures = list(dict.fromkeys(results[1] + [sig for sig in (results[2] if band_keys else []) if sig]))
+    if not signatures:
+        return []
+    return client.mget([entry_prefix + signature for signature in signatures])
+
+
+def _drop_local_semantic_entry(store: dict, signature: str) -> None:
+    _, _, band_keys = store["entries"].pop(signature)
+    for band_key in band_keys:
+        if store["buckets"].get(band_key) == signature:
+            del store["buckets"][band_key]
+
+
+def _local_semantic_add(scope: str, signature: str, payload: dict, band_keys: list[str], ttl_sec: int) -> None:
+    if not _local_enabled():
+        return
+    with _local_lock:
+        store = _local_semantic.get(scope)
+        if store is None:
+            store = _local_semantic[scope] = {"entries": OrderedDict(), "buckets": {}}
+        _local_semantic.move_to_end(scope)
+        if signature in store["entries"]:
+            _drop_local_semantic_entry(store, signature)
+        store["entries"][signature] = (time.time() + ttl_sec, payload, band_keys)
+        for band_key in band_keys:
+            store["buckets"][band_key] = signature
+        while len(store["entries"]) > LOCAL_SEMANTIC_MAX_PER_SCOPE:
+            _drop_local_semantic_entry(store, next(iter(store["entries"])))
+        while len(_local_semantic) > settings.CACHE_LOCAL_MAX_ENTRIES:
+            _local_semantic.popitem(last=False)
+
+
+def _local_semantic_candidates(scope: str, band_keys: list[str]) -> list[dict]:
+    with _local_lock:
+        store = _local_semantic.get(scope)
+        if store is None:
+            return []
+        now = time.time()
+        for signature in [sig for sig, (expires_at, _, _) in store["entries"].items() if expires_at <= now]:
+            _drop_local_semantic_entry(store, signature)
+
+        recent = list(reversed(store["entries"]))[:max(settings.CACHE_MAX_CANDIDATES, 1)]
+        bucket_hits = [store["buckets"][key] for key in band_keys if key in store["buckets"]]
+        return [dict(store["entries"][sig][1]) for sig in dict.fromkeys(recent + bucket_hits)]
+
+
+def _local_enabled() -> bool:
+    return settings.CACHE_LOCAL_ENABLED and settings.CACHE_LOCAL_MAX_ENTRIES > 0
+
+
+def _local_get(fingerprint: str) -> dict | None:
+    if not _local_enabled():
+        return None
+    with _local_lock:
+        item = _local_exact.get(fingerprint)
+        if item is None:
+            return None
+        expires_at, payload = item
+        if expires_at <= time.time():
+            del _local_exact[fingerprint]
+            return None
+        _local_exact.move_to_end(fingerprint)
+        return dict(payload)
+
+
+def _stale_window_sec() -> int:
+    return max(settings.CACHE_SWR_STALE_SEC, 0) if settings.CACHE_SWR_ENABLED else 0
+
+
+def _with_freshness(payload: dict | None, ttl_sec: int) -> dict | None:
+    """
+    Entries younger than `ttl_sec` are returned as-is. Older ones are returned
+    with stale=True while inside the stale-while-revalidate window, else dropped.
+    """
+    if not payload:
+        return None
+    age_sec = time.time() - int(payload.get("ts_ms") or 0) / 1000
+    if age_sec < ttl_sec:
+        return payload
+    if age_sec < ttl_sec + _stale_window_sec():
+        payload["stale"] = True
+        return payload
+    return None
+
+
+def _local_set(fingerprint: str, payload: dict, ttl_sec: int | None = None) -> None:
+    if not _local_enabled():
+        return
+    if ttl_sec is None:
+        ttl_sec = settings.CACHE_EXACT_TTL_SEC
+    # Expire with the Redis copy: both count from when the reply was generated.
+    expires_at = int(payload.get("ts_ms") or time.time() * 1000) / 1000 + ttl_sec + _stale_window_sec()
+    if expires_at <= time.time():
+        return
+    with _local_lock:
+        _local_exact[fingerprint] = (expires_at, dict(payload))
+        _local_exact.move_to_end(fingerprint)
+        while len(_local_exact) > settings.CACHE_LOCAL_MAX_ENTRIES:
+            _local_exact.popitem(last=False)
+
+
+def clear_local_cache() -> None:
+    with _local_lock:
+        _local_exact.clear()
+        _local_semantic.clear()
+
+
 def _safe_json_loads(raw: str | None) -> dict | None:
     if not raw:
         return None
@@ -158,10 +374,6 @@ def get_exact_cached_reply(
     if not settings.CACHE_ENABLED:
         return None
 
-    client = get_redis_client()
-    if client is None:
-        return None
-
     fingerprint = build_context_fingerprint(
         platform=platform,
         user_id=user_id,
@@ -170,6 +382,14 @@ def get_exact_cached_reply(
         menu_text=menu_text,
         model_identifier=model_identifier,
     )
+    cached = _with_freshness(_local_get(fingerprint), settings.CACHE_EXACT_TTL_SEC)
+    if cached and is_cacheable_intent(cached.get("intent")):
+        return cached
+
+    client = get_redis_client()
+    if client is None:
+        return None
+
     key = _exact_key(fingerprint)
 
     try:
@@ -178,7 +398,8 @@ def get_exact_cached_reply(
             return None
         if not is_cacheable_intent(cached.get("intent")):
             return None
-        return cached
+        _local_set(fingerprint, cached)
+        return _with_freshness(cached, settings.CACHE_EXACT_TTL_SEC)
     except Exception:
         logger.exception("cache_error exact lookup failed")
         return None
@@ -195,10 +416,6 @@ def get_semantic_cached_reply(
     if not settings.CACHE_ENABLED or settings.CACHE_SEMANTIC_TTL_SEC <= 0:
         return None
 
-    client = get_redis_client()
-    if client is None:
-        return None
-
     parts = _build_context_parts(
         platform=platform,
         user_id=user_id,
@@ -210,29 +427,28 @@ def get_semantic_cached_reply(
     incoming_tokens = tokenise_prompt(parts["normalized_prompt"])
     if not incoming_tokens:
         return None
+    band_keys = _band_keys(incoming_tokens)
 
-    index_key = _semantic_index_key(parts["platform"], parts["user_id"], parts["role"])
-    now_ms = int(time.time() * 1000)
-    min_ts = now_ms - max(settings.CACHE_SEMANTIC_TTL_SEC, settings.CACHE_COOLDOWN_SEC) * 1000
-
-    try:
-        # Keep the candidate set small and fresh.
-        client.zremrangebyscore(index_key, 0, min_ts)
-        signatures = client.zrevrange(index_key, 0, max(settings.CACHE_MAX_CANDIDATES - 1, 0))
-    except Exception:
-        logger.exception("cache_error semantic index lookup failed")
-        return None
-
-    best_match = None
-    best_score = 0.0
-
-    for signature in signatures:
-        entry_key = _semantic_entry_key(parts["platform"], parts["user_id"], parts["role"], signature)
+    client = get_redis_client()
+    if client is None:
+        if not _local_enabled():
+            return None
+        raw_entries = _local_semantic_candidates(
+            _semantic_index_key(parts["platform"], parts["user_id"], parts["role"]), band_keys
+        )
+    else:
+        now_ms = int(time.time() * 1000)
+        min_ts = now_ms - max(settings.CACHE_SEMANTIC_TTL_SEC, settings.CACHE_COOLDOWN_SEC) * 1000
         try:
-            entry = _safe_json_loads(client.get(entry_key))
+            # Recent signatures plus LSH near-duplicates, in one round trip.
+            raw_entries = _fetch_semantic_candidates(client, parts, min_ts, band_keys)
         except Exception:
-            logger.exception("cache_error semantic entry lookup failed")
+            logger.exception("cache_error semantic lookup failed")
             return None
+
+    candidates = []
+    for raw_entry in raw_entries:
+        entry = raw_entry if isinstance(raw_entry, dict) else _safe_json_loads(raw_entry)
         if not entry:
             continue
         if not is_cacheable_intent(entry.get("intent")):
@@ -241,13 +457,11 @@ def get_semantic_cached_reply(
             continue
         if entry.get("model") != parts["model"]:
             continue
+        candidates.append(entry)
 
-        candidate_tokens = set(entry.get("tokens") or [])
-        score = jaccard_similarity(incoming_tokens, candidate_tokens)
-        if score >= settings.CACHE_SIMILARITY_THRESHOLD and score > best_score:
-            best_match = entry
-            best_score = score
-
+    best_match, best_score = get_semantic_backend().best_match(
+        parts["normalized_prompt"], incoming_tokens, candidates
+    )
     if not best_match:
         return None
 
@@ -255,7 +469,8 @@ def get_semantic_cached_reply(
     return best_match
 
 
-def record_recent_prompt_signature(
+def _queue_prompt_signature(
+    pipe,
     platform: str,
     user_id: str,
     role: str,
@@ -264,15 +479,15 @@ def record_recent_prompt_signature(
     model_identifier: str,
     reply_text: str,
     intent: str,
-) -> None:
+) -> bool:
+    """
+    Adds the semantic entry writes to `pipe` (or to the in-process store when
+    `pipe` is None); returns False when there is nothing to record.
+    """
     if not settings.CACHE_ENABLED or settings.CACHE_SEMANTIC_TTL_SEC <= 0:
-        return
+        return False
     if not is_cacheable_intent(intent):
-        return
-
-    client = get_redis_client()
-    if client is None:
-        return
+        return False
 
     parts = _build_context_parts(
         platform=platform,
@@ -284,7 +499,7 @@ def record_recent_prompt_signature(
     )
     tokens = sorted(tokenise_prompt(parts["normalized_prompt"]))
     if not tokens:
-        return
+        return False
 
     now_ms = int(time.time() * 1000)
     signature = _sha256(
@@ -300,12 +515,49 @@ def record_recent_prompt_signature(
         "model": parts["model"],
         "ts_ms": now_ms,
     }
+    payload.update(get_semantic_backend().features(parts["normalized_prompt"]))
+    band_keys = _band_keys(tokens)
 
+    ttl = max(settings.CACHE_SEMANTIC_TTL_SEC, settings.CACHE_COOLDOWN_SEC, 1)
+    if pipe is None:
+        _local_semantic_add(index_key, signature, payload, band_keys, ttl)
+        return True
+    pipe.set(entry_key, json.dumps(payload), ex=ttl)
+    pipe.zadd(index_key, {signature: now_ms})
+    pipe.expire(index_key, ttl)
+    if band_keys:
+        lsh_key = _semantic_lsh_key(parts["platform"], parts["user_id"], parts["role"])
+        pipe.hset(lsh_key, mapping={band_key: signature for band_key in band_keys})
+        pipe.expire(lsh_key, ttl)
+    return True
+
+
+def record_recent_prompt_signature(
+    platform: str,
+    user_id: str,
+    role: str,
+    message_text: str,
+    menu_text: str,
+    model_identifier: str,
+    reply_text: str,
+    intent: str,
+) -> None:
+    client = get_redis_client()
     try:
-        ttl = max(settings.CACHE_SEMANTIC_TTL_SEC, settings.CACHE_COOLDOWN_SEC)
-        client.set(entry_key, json.dumps(payload), ex=max(ttl, 1))
-        client.zadd(index_key, {signature: now_ms})
-        client.expire(index_key, max(ttl, 1))
+        pipe = client.pipeline(transaction=False) if client is not None else None
+        queued = _queue_prompt_signature(
+            pipe,
+            platform=platform,
+            user_id=user_id,
+            role=role,
+            message_text=message_text,
+            menu_text=menu_text,
+            model_identifier=model_identifier,
+            reply_text=reply_text,
+            intent=intent,
+        )
+        if queued and pipe is not None:
+            pipe.execute()
     except Exception:
         logger.exception("cache_error semantic signature update failed")
 
@@ -325,10 +577,6 @@ def store_cached_reply(
     if not is_cacheable_intent(intent):
         return False
 
-    client = get_redis_client()
-    if client is None:
-        return False
-
     parts = _build_context_parts(
         platform=platform,
         user_id=user_id,
@@ -353,10 +601,33 @@ def store_cached_reply(
         "model": parts["model"],
         "ts_ms": int(time.time() * 1000),
     }
+    _local_set(fingerprint, payload)
+
+    client = get_redis_client()
+    if client is None:
+        _queue_prompt_signature(
+            None,
+            platform=platform,
+            user_id=user_id,
+            role=role,
+            message_text=message_text,
+            menu_text=menu_text,
+            model_identifier=model_identifier,
+            reply_text=reply_text,
+            intent=intent,
+        )
+        return _local_enabled()
 
     try:
-        client.set(_exact_key(fingerprint), json.dumps(payload), ex=max(settings.CACHE_EXACT_TTL_SEC, 1))
-        record_recent_prompt_signature(
+        # Exact entry and semantic signature go out in one round trip.
+        pipe = client.pipeline(transaction=False)
+        pipe.set(
+            _exact_key(fingerprint),
+            json.dumps(payload),
+            ex=max(settings.CACHE_EXACT_TTL_SEC + _stale_window_sec(), 1),
+        )
+        _queue_prompt_signature(
+            pipe,
             platform=platform,
             user_id=user_id,
             role=role,
@@ -366,7 +637,90 @@ def store_cached_reply(
             reply_text=reply_text,
             intent=intent,
         )
+        pipe.execute()
         return True
     except Exception:
         logger.exception("cache_error exact store failed")
         return False
+
+
+def get_global_cached_reply(
+    role: str,
+    message_text: str,
+    menu_text: str,
+    model_identifier: str,
+) -> dict | None:
+    if not settings.CACHE_ENABLED or not settings.CACHE_GLOBAL_ENABLED:
+        return None
+
+    fingerprint = build_global_fingerprint(role, message_text, menu_text, model_identifier)
+    if fingerprint is None:
+        return None
+    cached = _with_freshness(_local_get(fingerprint), settings.CACHE_GLOBAL_TTL_SEC)
+    if cached:
+        return cached
+
+    client = get_redis_client()
+    if client is None:
+        return None
+
+    try:
+        cached = _safe_json_loads(client.get(_global_key(fingerprint)))
+    except Exception:
+        logger.exception("cache_error global lookup failed")
+        return None
+    if not cached or str(cached.get("intent")) not in GLOBAL_CACHEABLE_INTENTS:
+        return None
+    _local_set(fingerprint, cached, settings.CACHE_GLOBAL_TTL_SEC)
+    return _with_freshness(cached, settings.CACHE_GLOBAL_TTL_SEC)
+
+
+def store_global_cached_reply(
+    role: str,
+    message_text: str,
+    menu_text: str,
+    model_identifier: str,
+    intent: str,
+    reply_text: str,
+    user_name: str | None = None,
+) -> bool:
+    """
+    Shares a reply with every user asking the same thing against the same menu.
+    Callers must only pass replies generated without cart state in context;
+    the marker and name checks here are a second line of defence.
+    """
+    if not settings.CACHE_ENABLED or not settings.CACHE_GLOBAL_ENABLED or settings.CACHE_GLOBAL_TTL_SEC <= 0:
+        return False
+    intent = str(intent or "").strip().lower()
+    if intent not in GLOBAL_CACHEABLE_INTENTS:
+        return False
+    if is_likely_transactional_text(message_text) or not is_shareable_reply(reply_text, user_name):
+        return False
+
+    fingerprint = build_global_fingerprint(role, message_text, menu_text, model_identifier)
+    if fingerprint is None:
+        return False
+    payload = {
+        "reply": reply_text,
+        "intent": intent,
+        "fingerprint": fingerprint,
+        "menu_hash": _sha256(menu_text or ""),
+        "model": str(model_identifier or "unknown"),
+        "ts_ms": int(time.time() * 1000),
+    }
+    _local_set(fingerprint, payload, settings.CACHE_GLOBAL_TTL_SEC)
+
+    client = get_redis_client()
+    if client is None:
+        return _local_enabled()
+
+    try:
+        client.set(
+            _global_key(fingerprint),
+            json.dumps(payload),
+            ex=settings.CACHE_GLOBAL_TTL_SEC + _stale_window_sec(),
+        )
+        return True
+    except Exception:
+        logger.exception("cache_error global store failed")
+        return False
@@ -0,0 +1,151 @@
+import base64
+import zlib
+
+import numpy as np
+
+from app.core.config import settings
+
+
+EMBEDDING_DIM = 512
+
+# Pidgin / shorthand canonicalisation applied before embedding, so that
+# "wetin una get" and "what do you have" land on the same features.
+PHRASE_CANONICAL = [
+    ("wetin una dey sell", "menu"),
+    ("wetin una get", "menu"),
+    ("what do you have", "menu"),
+    ("what do you sell", "menu"),
+    ("what you have", "menu"),
+    ("how much", "cost"),
+    ("price of", "cost"),
+]
+WORD_CANONICAL = {
+    "abeg": "please",
+    "chop": "food",
+    "fit": "can",
+    "get": "have",
+    "hello": "hi",
+    "hey": "hi",
+    "howfa": "hi",
+    "price": "cost",
+    "una": "you",
+    "wan": "want",
+    "wetin": "what",
+}
+EMBEDDING_STOPWORDS = {
+    "a", "an", "and", "are", "at", "be", "dey", "do", "for", "i", "is", "me", "my",
+    "na", "o", "of", "on", "please", "the", "to", "we", "you", "your",
+}
+
+
+def _canonical_tokens(normalized_text: str) -> list[str]:
+    text = f" {normalized_text} "
+    for phrase, replacement in PHRASE_CANONICAL:
+        text = text.replace(f" {phrase} ", f" {replacement} ")
+    tokens = [WORD_CANONICAL.get(token, token) for token in text.split()]
+    return [token for token in tokens if token not in EMBEDDING_STOPWORDS]
+
+
+def embed_text(normalized_text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """
+    Unit-length hashed bag of words (weight 2) and character trigrams
+    (weight 1). Deterministic across processes: crc32, not hash().
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in _canonical_tokens(normalized_text):
+        features = [(f"w:{token}", 2.0)]
+        padded = f"<{token}>"
+        features.extend((f"c:{padded[i:i + 3]}", 1.0) for i in range(len(padded) - 2))
+        for feature, weight in features:
+            digest = zlib.crc32(feature.encode("utf-8"))
+            vector[digest % dim] += weight if digest & 0x80000000 == 0 else -weight
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def encode_vector(vector: np.ndarray) -> str:
+    return base64.b64encode(vector.astype(np.float16).tobytes()).decode("ascii")
+
+
+def cosine_top_k(matrix: np.ndarray, vector: np.ndarray, k: int) -> list[tuple[int, float]]:
+    """Rows of `matrix` (unit vectors) most similar to `vector`, best first; ties keep row order."""
+    if matrix.size == 0 or k <= 0:
+        return []
+    scores = matrix @ vector
+    k = min(k, len(scores))
+    if k < len(scores):
+        rows = np.argpartition(-scores, k - 1)[:k]
+    else:
+        rows = np.arange(len(scores))
+    rows = rows[np.lexsort((rows, -scores[rows]))]
+    return [(int(row), float(scores[row])) for row in rows]
+
+
+def jaccard_similarity(a: set[str], b: set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    union = a | b
+    if not union:
+        return 0.0
+    return len(a & b) / len(union)
+
+
+class JaccardBackend:
+    """Token-set overlap against each candidate, as the cache has always done."""
+
+    name = "jaccard"
+
+    def features(self, normalized_prompt: str) -> dict:
+        return {}
+
+    def best_match(self, normalized_prompt: str, tokens: set[str], entries: list[dict]) -> tuple[dict | None, float]:
+        best_entry = None
+        best_score = 0.0
+        for entry in entries:
+            score = jaccard_similarity(tokens, set(entry.get("tokens") or []))
+            if score >= settings.CACHE_SIMILARITY_THRESHOLD and score > best_score:
+                best_entry = entry
+                best_score = score
+        return best_entry, best_score
+
+
+class EmbeddingBackend:
+    """Cosine similarity of hashed n-gram embeddings, scored in one matrix product."""
+
+    name = "embedding"
+
+    def features(self, normalized_prompt: str) -> dict:
+        return {"embedding": encode_vector(embed_text(normalized_prompt))}
+
+    def best_match(self, normalized_prompt: str, tokens: set[str], entries: list[dict]) -> tuple[dict | None, float]:
+        raw_vectors = []
+        candidates = []
+        expected_size = EMBEDDING_DIM * 2  # float16
+        for entry in entries:
+            try:
+                raw = base64.b64decode(entry.get("embedding") or "")
+            except Exception:
+                continue
+            if len(raw) == expected_size:
+                raw_vectors.append(raw)
+                candidates.append(entry)
+        if not candidates:
+            return None, 0.0
+        # One buffer, one conversion, one matrix product for all candidates.
+        matrix = np.frombuffer(b"".join(raw_vectors), dtype=np.float16).reshape(len(candidates), EMBEDDING_DIM)
+        row, score = cosine_top_k(matrix.astype(np.float32), embed_text(normalized_prompt), 1)[0]
+        if score < settings.CACHE_EMBEDDING_SIMILARITY_THRESHOLD:
+            return None, 0.0
+        return candidates[row], score
+
+
+BACKENDS = {
+    JaccardBackend.name: JaccardBackend(),
+    EmbeddingBackend.name: EmbeddingBackend(),
+}
+
+
+def get_semantic_backend(name: str | None = None):
+    return BACKENDS.get((name or settings.CACHE_SEMANTIC_BACKEND or "").strip().lower(), BACKENDS["jaccard"])
@@ -0,0 +1,77 @@
+import asyncio
+from threading import Event, Lock
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into one execution. `do` is for
+    threads, `ado` for coroutines (keyed per event loop). Both return
+    (result, shared): shared is True for callers that waited on someone else.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._calls: dict = {}
+        self._futures: dict = {}
+
+    def in_flight(self, key) -> bool:
+        with self._lock:
+            return key in self._calls or any(slot[1] == key for slot in self._futures)
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    async def ado(self, key, coroutine_factory):
+        loop = asyncio.get_running_loop()
+        slot = (id(loop), key)
+        future = self._futures.get(slot)
+        if future is not None:
+            return await asyncio.shield(future), True
+
+        future = loop.create_future()
+        # Nobody may be waiting; never warn about an unretrieved exception.
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._futures[slot] = future
+        try:
+            result = await coroutine_factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            self._futures.pop(slot, None)
+        return result, False
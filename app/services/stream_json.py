@@ -0,0 +1,55 @@
+import json
+import re
+
+
+class JsonStringFieldExtractor:
+    """
+    Watches a JSON object arrive in chunks and returns the value of one
+    string field as soon as its closing quote has been streamed, long before
+    the object (and the fields after it) is complete.
+
+    Only the first occurrence of `"<field>": "` is used. Quotes inside other
+    string values are escaped in valid JSON, so text like `\\"message\\": \\"`
+    inside a preceding "thought" does not match.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self.value: str | None = None
+        self._pattern = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buffer = ""
+        self._value_start: int | None = None
+        self._scan = 0
+
+    @property
+    def done(self) -> bool:
+        return self.value is not None
+
+    def feed(self, chunk: str) -> str | None:
+        """Adds a chunk; returns the decoded value once, when it completes."""
+        if self.value is not None or not chunk:
+            return None
+        self._buffer += chunk
+        if self._value_start is None:
+            match = self._pattern.search(self._buffer)
+            if match is None:
+                return None
+            self._value_start = self._scan = match.end()
+
+        buffer = self._buffer
+        position = self._scan
+        while position < len(buffer):
+            char = buffer[position]
+            if char == "\\":
+                position += 2  # may step past the end; the escaped char arrives with the next chunk
+                continue
+            if char == '"':
+                raw = buffer[self._value_start:position]
+                try:
+                    self.value = json.loads(f'"{raw}"')
+                except json.JSONDecodeError:
+                    self.value = raw
+                return self.value
+            position += 1
+        self._scan = position
+        return None
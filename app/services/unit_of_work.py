@@ -0,0 +1,94 @@
+import logging
+from contextlib import contextmanager
+from threading import Lock
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Session.info keys
+UOW_ACTIVE_KEY = "unit_of_work"
+UOW_AFTER_COMMIT_KEY = "unit_of_work_after_commit"
+COMMIT_COUNT_KEY = "commit_count"
+
+_stats = {"units": 0, "commits": 0}
+_stats_lock = Lock()
+
+
+@event.listens_for(Session, "after_commit")
+def _count_commit(session: Session) -> None:
+    session.info[COMMIT_COUNT_KEY] = session.info.get(COMMIT_COUNT_KEY, 0) + 1
+    with _stats_lock:
+        _stats["commits"] += 1
+
+
+def commit_count(db: Session) -> int:
+    """Commits made through this session so far (see turn_commits in the logs)."""
+    return db.info.get(COMMIT_COUNT_KEY, 0)
+
+
+def commit_or_flush(db: Session) -> None:
+    """
+    db.commit() for code that runs inside a turn: inside a unit of work the
+    writes are only flushed (ids are assigned, constraints checked) and the
+    unit commits once at the end.
+    """
+    if db.info.get(UOW_ACTIVE_KEY):
+        db.flush()
+    else:
+        db.commit()
+
+
+def run_after_commit(db: Session, callback) -> None:
+    """Runs callback once the current unit of work has committed (immediately outside one)."""
+    if db.info.get(UOW_ACTIVE_KEY):
+        db.info.setdefault(UOW_AFTER_COMMIT_KEY, []).append(callback)
+    else:
+        callback()
+
+
+@contextmanager
+def unit_of_work(db: Session):
+    """
+    Collapses the commit_or_flush() calls made inside the block into a
+    single commit on exit; an exception rolls everything back. Nested
+    blocks join the outer one. Disabled by UNIT_OF_WORK_ENABLED=false.
+    """
+    if not settings.UNIT_OF_WORK_ENABLED or db.info.get(UOW_ACTIVE_KEY):
+        yield
+        return
+
+    db.info[UOW_ACTIVE_KEY] = True
+    callbacks = db.info.setdefault(UOW_AFTER_COMMIT_KEY, [])
+    try:
+        yield
+        db.info.pop(UOW_ACTIVE_KEY, None)
+        db.commit()
+    except BaseException:
+        db.info.pop(UOW_ACTIVE_KEY, None)
+        db.rollback()
+        callbacks.clear()
+        raise
+    finally:
+        db.info.pop(UOW_AFTER_COMMIT_KEY, None)
+    with _stats_lock:
+        _stats["units"] += 1
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception:
+            logger.exception("unit_of_work after-commit callback failed")
+
+
+def unit_of_work_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_unit_of_work_stats() -> None:
+    with _stats_lock:
+        _stats.update(units=0, commits=0)
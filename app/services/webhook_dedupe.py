@@ -1,3 +1,4 @@
+import json
 import time
 
 from sqlalchemy.exc import IntegrityError
@@ -6,7 +7,14 @@ from sqlalchemy.orm import Session
 from app.models.sql_models import ProcessedWebhookEvent
 
 
-def claim_webhook_event(db: Session, platform: str, external_event_id: str | None) -> bool:
+def claim_webhook_event(
+    db: Session,
+    platform: str,
+    external_event_id: str | None,
+    payload: dict | None = None,
+    conversation_key: str | None = None,
+    shard: int | None = None,
+) -> bool:
     if not external_event_id:
         return True
 
@@ -15,6 +23,12 @@ def claim_webhook_event(db: Session, platform: str, external_event_id: str | Non
         external_event_id=external_event_id,
         claimed_at=int(time.time() * 1000),
     )
+    if payload is not None:
+        # Claimed with a job attached: the row doubles as a queue entry for the worker pool.
+        event.status = "pending"
+        event.payload = json.dumps(payload)
+        event.conversation_key = conversation_key
+        event.shard = shard
     db.add(event)
     try:
         db.commit()
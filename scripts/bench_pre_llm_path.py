@@ -0,0 +1,115 @@
+"""
+Microbenchmark of the per-turn Python work done before the LLM request.
+
+    python scripts/bench_pre_llm_path.py [--rounds 2000] [--history 10]
+
+Compares the pieces the order path used to rebuild on every turn (schema
+format instructions, the full prompt template render, the raw streaming
+chain) with their memoized versions, then times `prepare_llm_turn` end to
+end against an in-memory SQLite database. No LLM or network call is made;
+the Groq key only has to be set for the client objects to build.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GROQ_API_KEY", "unused-by-benchmark")
+os.environ.setdefault("SERPAPI_API_KEY", "unused-by-benchmark")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from app.core.database import Base  # noqa: E402
+from app.models.sql_models import MenuItem, Message, User  # noqa: E402
+from app.services import chat_manager  # noqa: E402
+from app.services.llm_engine import (  # noqa: E402
+    ORDER_FORMAT_INSTRUCTIONS,
+    llm,
+    order_chains_for,
+    order_parser,
+    order_prompt,
+)
+
+
+def _per_call_us(fn, rounds: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def _seed_session(history: int):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    db.add_all(
+        MenuItem(name=name, price=price, is_available=True)
+        for name, price in [("Jollof Rice", 500), ("Fried Rice", 500), ("Chicken", 1000), ("Beef", 200), ("Water", 100)]
+    )
+    user = User(phone_number="bench", name="Bench")
+    db.add(user)
+    for i in range(history):
+        db.add(Message(platform="telegram", contact_id="bench", direction="inbound" if i % 2 == 0 else "outbound",
+                       body=f"message number {i} about jollof", timestamp=1_000 + i))
+    inbound = Message(platform="telegram", contact_id="bench", direction="inbound",
+                      body="do you deliver to the hostel", timestamp=10_000)
+    db.add(inbound)
+    db.commit()
+    turn = {
+        "platform": "telegram",
+        "user_id": "bench",
+        "message_text": inbound.body,
+        "role": "customer",
+        "inbound_message_id": inbound.id,
+        "user": user,
+        "pending_order": None,
+    }
+    return db, turn
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--history", type=int, default=10)
+    args = parser.parse_args()
+
+    chat_manager.settings.CACHE_ENABLED = False  # time our own work, not Redis round trips
+    chat_manager.settings.FAST_PATH_ENABLED = False
+    db, turn = _seed_session(args.history)
+    chain_input = chat_manager.prepare_llm_turn(dict(turn), db, [])
+    chains = order_chains_for(chain_input["menu_hash"], chain_input["menu"], chain_input["format_instructions"])
+
+    rows = [
+        (
+            "format instructions",
+            lambda: order_parser.get_format_instructions(),
+            lambda: ORDER_FORMAT_INSTRUCTIONS,
+        ),
+        (
+            "prompt render",
+            lambda: order_prompt.invoke(chain_input),
+            lambda: order_chains_for(
+                chain_input["menu_hash"], chain_input["menu"], chain_input["format_instructions"]
+            ).large.first.invoke(chain_input),
+        ),
+        (
+            "raw chain",
+            lambda: order_prompt | llm,
+            lambda: chains.large_raw,
+        ),
+    ]
+    print(f"{'step':<22} {'per-turn us':>12} {'memoized us':>12}")
+    for name, rebuilt, memoized in rows:
+        print(f"{name:<22} {_per_call_us(rebuilt, args.rounds):12.1f} {_per_call_us(memoized, args.rounds):12.1f}")
+
+    prepare_us = _per_call_us(lambda: chat_manager.prepare_llm_turn(dict(turn), db, []), max(args.rounds // 10, 1))
+    print(f"\nprepare_llm_turn (history={args.history}, cache off): {prepare_us:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
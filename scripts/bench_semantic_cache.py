@@ -0,0 +1,99 @@
+"""
+Compares the semantic cache backends on hit rate and lookup latency.
+
+    python scripts/bench_semantic_cache.py [--candidates 20,200,2000]
+
+Hit rate uses a small labelled set of (cached prompt, incoming prompt,
+should_hit) pairs in the register customers actually write. Latency times
+`best_match` over N candidates, as fetched for one lookup.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.prompt_cache import normalize_prompt_text, tokenise_prompt  # noqa: E402
+from app.services.semantic_backends import get_semantic_backend  # noqa: E402
+
+
+LABELLED_PAIRS = [
+    ("what do you have", "wetin una get", True),
+    ("what do you have", "what una dey sell", False),
+    ("what do you sell", "wetin una dey sell", True),
+    ("how much is jollof rice", "price of jollof rice", True),
+    ("how much is jollof rice", "jollof rice price", True),
+    ("how much is jollof", "how much jollof", True),
+    ("how much is chicken", "chicken price abeg", True),
+    ("hello", "hi", True),
+    ("good morning", "morning o", True),
+    ("do you have chicken", "una get chicken", True),
+    ("is plantain available", "plantain dey", False),
+    ("how much is jollof rice", "how much is fried rice", False),
+    ("how much is jollof", "how much is chicken", False),
+    ("what do you have", "hello", False),
+    ("do you deliver", "where una dey", False),
+    ("how much is water", "how much is soda", False),
+]
+
+FILLER_WORDS = ["jollof", "fried", "rice", "chicken", "beef", "plantain", "water", "soda", "moi", "beans", "egg", "yam"]
+
+
+def _entry(text: str, backend) -> dict:
+    normalized = normalize_prompt_text(text)
+    entry = {"reply": text, "tokens": sorted(tokenise_prompt(normalized))}
+    entry.update(backend.features(normalized))
+    return entry
+
+
+def hit_rate(backend) -> tuple[float, float]:
+    hits = false_hits = expected_hits = expected_misses = 0
+    for cached, incoming, should_hit in LABELLED_PAIRS:
+        normalized = normalize_prompt_text(incoming)
+        match, _ = backend.best_match(normalized, tokenise_prompt(normalized), [_entry(cached, backend)])
+        if should_hit:
+            expected_hits += 1
+            hits += match is not None
+        else:
+            expected_misses += 1
+            false_hits += match is not None
+    return hits / expected_hits, false_hits / expected_misses
+
+
+def _random_prompt(rng: random.Random) -> str:
+    return "how much is " + " ".join(rng.sample(FILLER_WORDS, 3))
+
+
+def lookup_latency_us(backend, candidate_count: int, rounds: int = 200) -> float:
+    rng = random.Random(candidate_count)
+    entries = [_entry(_random_prompt(rng), backend) for _ in range(candidate_count)]
+    queries = [normalize_prompt_text(_random_prompt(rng)) for _ in range(rounds)]
+    started = time.perf_counter()
+    for query in queries:
+        backend.best_match(query, tokenise_prompt(query), entries)
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--candidates", default="20,200,2000")
+    args = parser.parse_args()
+
+    backends = [get_semantic_backend("jaccard"), get_semantic_backend("embedding")]
+    print("backend     hit_rate  false_hit_rate")
+    for backend in backends:
+        rate, false_rate = hit_rate(backend)
+        print(f"{backend.name:<10}  {rate:8.0%}  {false_rate:14.0%}")
+
+    print("\nbest_match latency (us per lookup)")
+    counts = [int(x) for x in args.candidates.split(",") if x.strip()]
+    print("candidates  " + "  ".join(f"{backend.name:>10}" for backend in backends))
+    for count in counts:
+        row = "  ".join(f"{lookup_latency_us(backend, count):10.1f}" for backend in backends)
+        print(f"{count:<10}  {row}")
+
+
+if __name__ == "__main__":
+    main()
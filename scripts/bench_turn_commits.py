@@ -0,0 +1,114 @@
+"""
+Commits per turn and turn latency with and without the unit of work.
+
+    python scripts/bench_turn_commits.py [--conversations 50] [--database-url URL]
+
+Each conversation runs a greeting, an order, a checkout and the PAID /
+account-name exchange through `process_message`. The LLM is replaced by a
+canned extraction and delivery by a no-op, so the timings are the database
+work. Without --database-url a SQLite file with synchronous=FULL is used, so
+every commit pays for an fsync as it would on Postgres.
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GROQ_API_KEY", "unused-by-benchmark")
+os.environ.setdefault("SERPAPI_API_KEY", "unused-by-benchmark")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, event  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.core.database import Base  # noqa: E402
+from app.models.sql_models import MenuItem  # noqa: E402
+from app.services import chat_manager  # noqa: E402
+from app.services.llm_engine import OrderChains  # noqa: E402
+from app.services.unit_of_work import commit_count  # noqa: E402
+
+
+SCRIPT = ["hello", "2 jollof and 1 beef", "I want to pay", "PAID", "Ada Obi"]
+
+
+class CannedChain:
+    def invoke(self, chain_input, config=None):
+        text = chain_input["user_input"].lower()
+        if "jollof" in text:
+            return {
+                "message": "I don add am",
+                "intent": "ordering",
+                "extracted_items": [
+                    {"item": "Jollof Rice", "quantity": 2, "action": "add"},
+                    {"item": "Beef", "quantity": 1, "action": "add"},
+                ],
+            }
+        if "pay" in text:
+            return {"message": "Oya pay", "intent": "checkout", "extracted_items": []}
+        return {"message": "Hello dear", "intent": "greeting", "extracted_items": []}
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run(url: str, conversations: int, unit_of_work: bool) -> dict:
+    engine = create_engine(url)
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def _full_sync(dbapi_connection, _record):
+            dbapi_connection.execute("PRAGMA synchronous=FULL")
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    db.add_all([MenuItem(name="Jollof Rice", price=500, is_available=True), MenuItem(name="Beef", price=200, is_available=True)])
+    db.commit()
+
+    chat_manager.settings.UNIT_OF_WORK_ENABLED = unit_of_work
+    latencies, commits = [], []
+    for conversation in range(conversations):
+        user_id = f"bench-{conversation}"
+        for text in SCRIPT:
+            before = commit_count(db)
+            started = time.perf_counter()
+            chat_manager.process_message("telegram", user_id, "Bench", text, db)
+            latencies.append((time.perf_counter() - started) * 1000)
+            commits.append(commit_count(db) - before)
+    db.close()
+    engine.dispose()
+    return {
+        "turns": len(latencies),
+        "commits_per_turn": statistics.mean(commits),
+        "p50_ms": _percentile(latencies, 0.50),
+        "p99_ms": _percentile(latencies, 0.99),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)  # "owner destination not configured" on every PAID turn
+    url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    chat_manager.settings.CACHE_ENABLED = False
+    chat_manager.order_chains_for = lambda *a: OrderChains(CannedChain(), CannedChain(), CannedChain())
+    chat_manager.dispatch_outbound_messages = lambda db, ids=None, limit=None: 0
+
+    print(f"{'mode':<16} {'turns':>6} {'commits/turn':>13} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, enabled in (("per-write", False), ("unit of work", True)):
+        result = run(url, args.conversations, enabled)
+        print(
+            f"{label:<16} {result['turns']:>6} {result['commits_per_turn']:>13.2f} "
+            f"{result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Seeds a messages/orders dataset and prints the query plan and timing of
+each hot-path query, to check that the planner uses the access-path indexes.
+
+    python scripts/explain_message_queries.py [--rows 1000000] [--contacts 20000]
+    python scripts/explain_message_queries.py --database-url postgresql://... --rows 1000000
+
+Without --database-url a throwaway SQLite file is used. Against Postgres the
+tables must be empty (the script does not truncate anything it did not create).
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, text  # noqa: E402
+
+from app.core.database import Base  # noqa: E402
+from app.models.sql_models import Message, Order, User  # noqa: E402
+
+
+HOT_PATH_QUERIES = {
+    "conversation_history": (
+        "SELECT id, direction, body FROM messages "
+        "WHERE platform = :platform AND contact_id = :contact_id AND id != :exclude_id "
+        "ORDER BY timestamp DESC, id DESC LIMIT 20"
+    ),
+    "confirm_last_platform": (
+        "SELECT id, platform FROM messages WHERE contact_id = :contact_id ORDER BY id DESC LIMIT 1"
+    ),
+    "demo_chats": "SELECT id, contact_id, body FROM messages ORDER BY timestamp DESC LIMIT 50",
+    "pending_order": "SELECT id FROM orders WHERE user_id = :user_id AND status = 'Pending' LIMIT 1",
+}
+
+
+def seed(engine, rows: int, contacts: int, batch: int = 20_000) -> None:
+    """`rows` messages spread over `contacts` telegram/whatsapp contacts, one order per user."""
+    Base.metadata.create_all(engine)
+    rng = random.Random(7)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": i + 1, "phone_number": f"c{i}", "name": f"User {i}"} for i in range(contacts)])
+        conn.execute(
+            insert(Order),
+            [
+                {"user_id": i + 1, "items": "1 x Jollof Rice", "total_price": 500,
+                 "status": "Pending" if i % 10 == 0 else "PAID"}
+                for i in range(contacts)
+            ],
+        )
+        for start in range(0, rows, batch):
+            conn.execute(
+                insert(Message),
+                [
+                    {
+                        "platform": "telegram" if n % 3 else "whatsapp",
+                        "contact_id": f"c{rng.randrange(contacts)}",
+                        "direction": "inbound" if n % 2 == 0 else "outbound",
+                        "body": f"message {n}",
+                        "timestamp": 1_700_000_000_000 + n * 1000,
+                        "delivery_status": None if n % 2 == 0 else "sent",
+                    }
+                    for n in range(start, min(start + batch, rows))
+                ],
+            )
+        conn.execute(text("ANALYZE"))
+
+
+def explain(conn, sql: str, params: dict) -> list[str]:
+    if conn.dialect.name == "sqlite":
+        return [row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql), params)]
+    return [row[0] for row in conn.execute(text("EXPLAIN " + sql), params)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--contacts", type=int, default=20_000)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'explain.db')}"
+    engine = create_engine(url)
+    started = time.perf_counter()
+    seed(engine, args.rows, args.contacts)
+    print(f"seeded {args.rows} messages in {time.perf_counter() - started:.1f}s ({url})\n")
+
+    params = {"platform": "telegram", "contact_id": "c42", "exclude_id": 0, "user_id": 43}
+    with engine.connect() as conn:
+        for name, sql in HOT_PATH_QUERIES.items():
+            plan = explain(conn, sql, params)
+            started = time.perf_counter()
+            for _ in range(100):
+                conn.execute(text(sql), params).fetchall()
+            per_query_us = (time.perf_counter() - started) / 100 * 1e6
+            print(f"{name}: {per_query_us:.0f} us")
+            for line in plan:
+                print(f"    {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Concurrent writers against the SQLite fallback: the old bare engine versus
+the tuned profile from app/core/database.py.
+
+    python scripts/load_test_sqlite_writers.py [--writers 8] [--readers 4] [--seconds 10]
+
+Writers run turn-shaped transactions (read the conversation, log the inbound
+message, write the reply and the conversation state, commit); readers keep
+scanning recent chats like /demo/chats. Reported per profile: committed
+turns, "database is locked" errors and turn latency.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.core.database import Base, create_app_engine  # noqa: E402
+from app.models.sql_models import Message  # noqa: E402
+from app.services.conversation_state import record_reply_state  # noqa: E402
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _writer(Session, worker: int, deadline: float, stats: dict, lock: threading.Lock) -> None:
+    turn = 0
+    while time.perf_counter() < deadline:
+        contact_id = f"w{worker}-{turn % 20}"
+        started = time.perf_counter()
+        db = Session()
+        try:
+            db.query(Message).filter(Message.platform == "telegram", Message.contact_id == contact_id).order_by(
+                Message.timestamp.desc()
+            ).limit(10).all()
+            now = int(time.time() * 1000)
+            db.add(Message(platform="telegram", contact_id=contact_id, direction="inbound", body="2 jollof", timestamp=now))
+            db.flush()
+            db.add(Message(platform="telegram", contact_id=contact_id, direction="outbound", body="I don add am",
+                           timestamp=now, delivery_status="pending", next_attempt_at=now))
+            record_reply_state(db, "telegram", contact_id, "chatting", None, now)
+            db.commit()
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                stats["turns"] += 1
+                stats["latencies"].append(elapsed)
+        except OperationalError as exc:
+            db.rollback()
+            with lock:
+                stats["locked" if "locked" in str(exc.orig) else "errors"] += 1
+        finally:
+            db.close()
+        turn += 1
+
+
+def _reader(Session, deadline: float, stats: dict, lock: threading.Lock) -> None:
+    while time.perf_counter() < deadline:
+        db = Session()
+        try:
+            db.query(Message).order_by(Message.timestamp.desc()).limit(200).all()
+            with lock:
+                stats["reads"] += 1
+        except OperationalError as exc:
+            with lock:
+                stats["locked" if "locked" in str(exc.orig) else "errors"] += 1
+        finally:
+            db.close()
+
+
+def run(engine, writers: int, readers: int, seconds: float) -> dict:
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(Message),
+            [{"platform": "telegram", "contact_id": f"seed{n % 500}", "direction": "inbound", "body": f"m{n}",
+              "timestamp": n, "delivery_attempts": 0} for n in range(20_000)],
+        )
+    Session = sessionmaker(bind=engine, autoflush=False)
+    stats = {"turns": 0, "reads": 0, "locked": 0, "errors": 0, "latencies": []}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=_writer, args=(Session, i, deadline, stats, lock)) for i in range(writers)]
+    threads += [threading.Thread(target=_reader, args=(Session, deadline, stats, lock)) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    profiles = {
+        # What app/core/database.py used to build: default pool, rollback journal, 5 s busy wait.
+        "bare": lambda url: create_engine(url, connect_args={"check_same_thread": False}),
+        "tuned": create_app_engine,
+    }
+    print(f"{'profile':<8} {'turns/s':>8} {'reads/s':>8} {'locked':>7} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, build in profiles.items():
+        url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'load.db')}"
+        stats = run(build(url), args.writers, args.readers, args.seconds)
+        print(
+            f"{name:<8} {stats['turns'] / args.seconds:>8.0f} {stats['reads'] / args.seconds:>8.0f} "
+            f"{stats['locked']:>7} {stats['errors']:>7} "
+            f"{_percentile(stats['latencies'], 0.5):>8.1f} {_percentile(stats['latencies'], 0.99):>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Prints the estimated token budget of the order prompt per component for
+each few-shot set / format-instruction style / menu rendering.
+
+    python scripts/prompt_budget_report.py [--menu-items 12] [--history 10]
+
+"static" is the cacheable prefix (identical on every call), "menu" and
+"history" change between calls. Token counts are exact (cl100k) when
+tiktoken is installed, otherwise estimated.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.menu_cache import MenuEntry, render_compact_menu_text, render_menu_text  # noqa: E402
+from app.services.prompt_budget import (  # noqa: E402
+    FEW_SHOT_SETS,
+    FORMAT_INSTRUCTION_STYLES,
+    build_order_system_prompt,
+    estimate_tokens,
+    measure_chain_input,
+    order_format_instructions,
+    static_prompt_prefix,
+    tiktoken,
+)
+
+
+SAMPLE_ITEMS = [
+    "Jollof Rice", "Fried Rice", "White Rice & Stew", "Chicken", "Beef", "Fish", "Plantain",
+    "Moi Moi", "Beans", "Egg", "Coca-Cola (50cl)", "Water", "Malt", "Pounded Yam", "Egusi Soup",
+]
+SAMPLE_HISTORY = [
+    "Good afternoon auntie",
+    "Good afternoon my dear! Wetin you wan chop today?",
+    "how much is jollof",
+    "Jollof Rice na N500. You wan make I add am for you?",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--menu-items", type=int, default=12)
+    parser.add_argument("--history", type=int, default=10)
+    args = parser.parse_args()
+
+    items = [
+        MenuEntry(id=i, name=name, price=100 * (i + 1), is_available=True, stock_qty=None, reorder_level=None)
+        for i, name in enumerate(SAMPLE_ITEMS[: args.menu_items])
+    ]
+    history = [SAMPLE_HISTORY[i % len(SAMPLE_HISTORY)] for i in range(args.history)]
+    menus = {"list": render_menu_text(items), "compact": render_compact_menu_text(items)}
+    print(f"token counts: {'tiktoken cl100k' if tiktoken is not None else 'estimated'}\n")
+
+    print(f"{'few-shot':<9} {'format':<8} {'menu':<8} {'static':>7} {'menu':>6} {'history':>8} {'total':>7}")
+    for few_shot_set in FEW_SHOT_SETS:
+        template = build_order_system_prompt(few_shot_set)
+        for style in FORMAT_INSTRUCTION_STYLES:
+            instructions = order_format_instructions(style)
+            prefix = static_prompt_prefix(template, instructions)
+            for menu_format, menu_text in menus.items():
+                budget = measure_chain_input(
+                    {"menu": menu_text, "chat_history": history, "user_input": "2 jollof 1 beef"}, prefix
+                )
+                print(
+                    f"{few_shot_set:<9} {style:<8} {menu_format:<8} {budget['static']:>7} "
+                    f"{budget['menu']:>6} {budget['history']:>8} {budget['total']:>7}"
+                )
+
+    template = build_order_system_prompt()
+    instructions = order_format_instructions()
+    prefix = static_prompt_prefix(template, instructions)
+    before = template.format(menu=menus["compact"], format_instructions=instructions)
+    after = template.format(menu=render_compact_menu_text(items[:-1]), format_instructions=instructions)
+    shared = len(os.path.commonprefix([before, after]))
+    print(f"\nconfigured static prefix: {estimate_tokens(prefix)} tokens")
+    print(f"prefix unchanged by a menu edit: {before.startswith(prefix) and after.startswith(prefix) and shared >= len(prefix)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """
+    A fresh in-memory SQLite schema per test: `self.engine`, `self.Session`
+    and an open `self.db`. StaticPool shares the one connection, so sessions
+    made from `self.Session` (or handed to worker threads) see the same data.
+    """
+
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine, autoflush=False)
+        self.db = self.Session()
+
+    def tearDown(self):
+        self.db.close()
+        self.engine.dispose()
@@ -0,0 +1,220 @@
+import asyncio
+import json
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("SERPAPI_API_KEY", "test")
+
+from langchain_core.messages import AIMessageChunk
+
+from app.models.sql_models import ConversationState, MenuItem, Message, Order
+from app.services import chat_manager, conversation_history, menu_cache
+from app.services.conversation_state import (
+    STAGE_AWAITING_CONFIRMATION,
+    STAGE_AWAITING_PAYMENT,
+    STAGE_AWAITING_PAYMENT_NAME,
+    STAGE_CHATTING,
+)
+from app.services.llm_engine import OrderChains
+from app.services.unit_of_work import commit_count
+
+from db_testcase import DatabaseTestCase
+
+
+ORDER_REPLY = "I don add am"
+CART_LINE = "Current Cart: 2 x Jollof Rice, 1 x Beef (N1200)"
+
+
+class CannedChain:
+    """Stands in for the order chain: a fixed extraction per kind of message."""
+
+    def __init__(self):
+        self.inputs = []
+
+    def invoke(self, chain_input, config=None):
+        self.inputs.append(chain_input["user_input"])
+        text = chain_input["user_input"].lower()
+        if "jollof" in text:
+            return {
+                "message": ORDER_REPLY,
+                "intent": "ordering",
+                "extracted_items": [
+                    {"item": "Jollof Rice", "quantity": 2, "action": "add"},
+                    {"item": "Beef", "quantity": 1, "action": "add"},
+                ],
+            }
+        if "pay" in text:
+            return {"message": "Oya pay", "intent": "checkout", "extracted_items": []}
+        return {"message": "Hello dear", "intent": "greeting", "extracted_items": []}
+
+    async def ainvoke(self, chain_input, config=None):
+        return self.invoke(chain_input, config)
+
+    def _chunks(self, chain_input):
+        raw = json.dumps(self.invoke(chain_input))
+        return [AIMessageChunk(content=raw[start:start + 8]) for start in range(0, len(raw), 8)]
+
+    def stream(self, chain_input, config=None):
+        yield from self._chunks(chain_input)
+
+    async def astream(self, chain_input, config=None):
+        for chunk in self._chunks(chain_input):
+            yield chunk
+
+
+class ChatManagerTurnTests(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chain = CannedChain()
+        self.dispatched = []
+
+        def dispatch(db, message_ids=None, limit=None):
+            self.dispatched.extend(message_ids or [])
+            return 0
+
+        async def adispatch(db, message_ids=None, limit=None):
+            return dispatch(db, message_ids, limit)
+
+        patches = [
+            mock.patch.object(chat_manager, "order_chains_for", lambda *a: OrderChains(self.chain, self.chain, self.chain)),
+            mock.patch.object(chat_manager, "dispatch_outbound_messages", dispatch),
+            mock.patch.object(chat_manager, "adispatch_outbound_messages", adispatch),
+            mock.patch.object(chat_manager, "OWNER_PLATFORM", "telegram"),
+            mock.patch.object(chat_manager, "OWNER_ID", "owner-1"),
+            mock.patch.object(menu_cache, "get_redis_client", lambda: None),
+            mock.patch.multiple(
+                chat_manager.settings,
+                CACHE_ENABLED=False,
+                FAST_PATH_ENABLED=False,
+                LLM_ROUTING_ENABLED=False,
+                LLM_STREAM_EARLY_REPLY=False,
+                UNIT_OF_WORK_ENABLED=True,
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        menu_cache.invalidate_menu_cache()
+        self.addCleanup(menu_cache.invalidate_menu_cache)
+        conversation_history.invalidate_chat_history()
+        self.addCleanup(conversation_history.invalidate_chat_history)
+
+        self.db.add_all([MenuItem(name="Jollof Rice", price=500, is_available=True), MenuItem(name="Beef", price=200, is_available=True)])
+        self.db.commit()
+
+    def turn(self, text, user_id="cust-1"):
+        """Runs one message through process_message; returns (processed, commits, new outbound bodies)."""
+        seen = self.db.query(Message).filter(Message.direction == "outbound").count()
+        before = commit_count(self.db)
+        processed = chat_manager.process_message("telegram", user_id, "Ada", text, self.db)
+        return processed, commit_count(self.db) - before, self.outbound()[seen:]
+
+    def outbound(self):
+        rows = self.db.query(Message).filter(Message.direction == "outbound").order_by(Message.id).all()
+        return [(row.contact_id, row.body) for row in rows]
+
+    def state(self, user_id="cust-1"):
+        self.db.expire_all()
+        row = self.db.get(ConversationState, ("telegram", user_id))
+        return row.stage, row.pending_order_id
+
+    def test_order_checkout_and_payment_flow(self):
+        processed, commits, replies = self.turn("hello")
+        self.assertTrue(processed)
+        self.assertEqual(commits, 2)
+        self.assertEqual(replies, [("cust-1", "Hello dear")])
+        self.assertEqual(self.state(), (STAGE_CHATTING, None))
+
+        processed, commits, replies = self.turn("2 jollof and 1 beef")
+        self.assertEqual(commits, 2)
+        self.assertEqual(replies, [("cust-1", f"{ORDER_REPLY}\n\n{CART_LINE}")])
+        order = self.db.query(Order).one()
+        self.assertEqual((order.items, order.total_price, order.status), ("2 x Jollof Rice, 1 x Beef", 1200, "Pending"))
+        self.assertEqual([(line["name"], line["qty"]) for line in order.lines], [("Jollof Rice", 2), ("Beef", 1)])
+
+        processed, commits, replies = self.turn("I want to pay")
+        self.assertEqual(commits, 2)
+        self.assertEqual(len(replies), 1)
+        self.assertIn(f"Your Order (Ref: {order.id}):\n2 x Jollof Rice, 1 x Beef\n\nTotal: N1200", replies[0][1])
+        self.assertEqual(self.state(), (STAGE_AWAITING_PAYMENT, order.id))
+
+        # The payment exchange is answered without the model, in one commit per turn.
+        processed, commits, replies = self.turn("PAID")
+        self.assertTrue(processed)
+        self.assertEqual(commits, 1)
+        self.assertEqual(replies, [("cust-1", "Okay! Please type the NAME on your bank account.")])
+        self.assertEqual(self.state(), (STAGE_AWAITING_PAYMENT_NAME, order.id))
+
+        processed, commits, replies = self.turn("Ada Obi")
+        self.assertEqual(commits, 1)
+        self.assertEqual([contact for contact, _ in replies], ["owner-1", "cust-1"])
+        self.assertTrue(replies[0][1].startswith("NEW PAYMENT\nUser: Ada\nAcct: Ada Obi\n"))
+        self.assertIn(f"Use /confirm {order.id}", replies[0][1])
+        self.assertEqual(replies[1][1], "Seen! Wait for confirmation.")
+        self.assertEqual(self.state(), (STAGE_AWAITING_CONFIRMATION, order.id))
+
+        self.assertEqual(self.chain.inputs, ["hello", "2 jollof and 1 beef", "I want to pay"])
+        outbound_ids = [row.id for row in self.db.query(Message).filter(Message.direction == "outbound").order_by(Message.id)]
+        self.assertEqual(self.dispatched, outbound_ids)
+
+    def test_account_name_is_not_taken_outside_the_payment_stage(self):
+        self.turn("2 jollof and 1 beef")
+        self.turn("Ada Obi")
+        self.assertEqual(self.chain.inputs, ["2 jollof and 1 beef", "Ada Obi"])
+        self.assertNotIn("owner-1", [contact for contact, _ in self.outbound()])
+
+    def test_each_write_commits_without_the_unit_of_work(self):
+        chat_manager.settings.UNIT_OF_WORK_ENABLED = False
+        _, commits, _ = self.turn("2 jollof and 1 beef")
+        self.assertGreater(commits, 2)
+
+    def test_failed_model_call_sends_the_error_reply(self):
+        def broken_chains(*args):
+            raise RuntimeError("model unavailable")
+
+        with mock.patch.object(chat_manager, "order_chains_for", broken_chains):
+            processed, commits, replies = self.turn("2 jollof and 1 beef")
+        self.assertFalse(processed)
+        self.assertEqual(commits, 2)
+        self.assertEqual(replies, [("cust-1", "Network error dey oh. Abeg try again.")])
+        self.assertEqual(self.db.query(Order).count(), 0)
+
+    def test_streamed_message_goes_out_before_the_cart(self):
+        chat_manager.settings.LLM_STREAM_EARLY_REPLY = True
+        processed, commits, replies = self.turn("2 jollof and 1 beef")
+        self.assertTrue(processed)
+        self.assertEqual(replies, [("cust-1", ORDER_REPLY), ("cust-1", CART_LINE)])
+        # The early reply is committed and sent on its own, ahead of the turn's second unit.
+        self.assertEqual(commits, 3)
+        self.assertEqual(len(self.dispatched), 2)
+
+    def test_async_turns_match_the_sync_ones(self):
+        async def conversation():
+            results = []
+            for text in ("2 jollof and 1 beef", "I want to pay", "PAID"):
+                before = commit_count(self.db)
+                processed = await chat_manager.process_message_async("telegram", "cust-1", "Ada", text, self.db)
+                results.append((processed, commit_count(self.db) - before))
+            return results
+
+        self.assertEqual(asyncio.run(conversation()), [(True, 2), (True, 2), (True, 1)])
+        bodies = [body for _, body in self.outbound()]
+        self.assertEqual(bodies[0], f"{ORDER_REPLY}\n\n{CART_LINE}")
+        self.assertTrue(bodies[1].startswith("Oya pay\n\nYour Order"))
+        self.assertEqual(bodies[2], "Okay! Please type the NAME on your bank account.")
+        order = self.db.query(Order).one()
+        self.assertEqual(self.state(), (STAGE_AWAITING_PAYMENT_NAME, order.id))
+        self.assertEqual(len(self.dispatched), 3)
+
+    def test_async_streamed_message_is_not_sent_twice(self):
+        chat_manager.settings.LLM_STREAM_EARLY_REPLY = True
+        processed = asyncio.run(chat_manager.process_message_async("telegram", "cust-1", "Ada", "2 jollof and 1 beef", self.db))
+        self.assertTrue(processed)
+        self.assertEqual(self.outbound(), [("cust-1", ORDER_REPLY), ("cust-1", CART_LINE)])
+        self.assertEqual(len(self.dispatched), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+from unittest import mock
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from sqlalchemy import event
+
+from app.models.sql_models import Message
+from app.services import conversation_history
+from app.services.conversation_history import (
+    SUMMARY_HEADER,
+    build_chat_history,
+    clean_history_body,
+    invalidate_chat_history,
+)
+
+from db_testcase import DatabaseTestCase
+
+
+CHECKOUT_REPLY = (
+    "Alright my dear!\n\n"
+    "Your Order (Ref: 7):\n2 x Jollof Rice\n\n"
+    "Total: N1000\n\n"
+    "Please pay to Opay: 123456789.\nReply 'PAID' when done."
+)
+
+
+class CleanHistoryBodyTests(unittest.TestCase):
+    def test_checkout_block_keeps_only_the_order_reference(self):
+        entry = clean_history_body("outbound", CHECKOUT_REPLY)
+        self.assertEqual(entry.text, "Alright my dear!\n(Order #7 sent for payment.)")
+        self.assertNotIn("Opay", entry.text)
+
+    def test_cart_echo_is_split_from_the_reply(self):
+        entry = clean_history_body("outbound", "I don add am.\n\nCurrent Cart: 2 x Jollof Rice (N1000)\n\n(Note: We no get Pizza)")
+        self.assertEqual(entry.text, "I don add am.\n\n(Note: We no get Pizza)")
+        self.assertEqual(entry.cart_echo, "Current Cart: 2 x Jollof Rice (N1000)")
+
+    def test_owner_alerts_and_empty_bodies_are_dropped(self):
+        self.assertIsNone(clean_history_body("outbound", "NEW PAYMENT\nUser: Ada\nAcct: Ada Obi"))
+        self.assertIsNone(clean_history_body("inbound", "   "))
+        self.assertEqual(clean_history_body("inbound", "Current Cart: typed by user").text, "Current Cart: typed by user")
+
+
+class BuildChatHistoryTests(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.clock = 1_000
+        invalidate_chat_history()
+        self.addCleanup(invalidate_chat_history)
+
+        self.selects = []
+
+        def record_message_selects(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT") and "messages" in statement:
+                self.selects.append(parameters)
+
+        event.listen(self.engine, "before_cursor_execute", record_message_selects)
+
+    def _add(self, direction: str, body: str, platform: str = "telegram", contact_id: str = "u1") -> Message:
+        self.clock += 1
+        message = Message(platform=platform, contact_id=contact_id, direction=direction, body=body, timestamp=self.clock)
+        self.db.add(message)
+        self.db.commit()
+        return message
+
+    def _turn(self, text: str) -> list:
+        inbound = self._add("inbound", text)
+        return build_chat_history(self.db, "telegram", "u1", inbound.id)
+
+    def test_history_is_filtered_by_platform_and_excludes_the_current_message(self):
+        self._add("inbound", "hello")
+        self._add("outbound", "Hello dear")
+        self._add("inbound", "whatsapp message", platform="whatsapp")
+        history = self._turn("how much is jollof")
+        self.assertEqual(history, [HumanMessage(content="hello"), AIMessage(content="Hello dear")])
+
+    def test_only_the_newest_cart_echo_is_sent(self):
+        self._add("inbound", "2 jollof")
+        self._add("outbound", "I don add am.\n\nCurrent Cart: 2 x Jollof Rice (N1000)")
+        self._add("inbound", "1 beef")
+        self._add("outbound", "Beef don enter.\n\nCurrent Cart: 2 x Jollof Rice, 1 x Beef (N1200)")
+        history = self._turn("that's all")
+        self.assertEqual(history[1].content, "I don add am.")
+        self.assertEqual(history[3].content, "Beef don enter.\n\nCurrent Cart: 2 x Jollof Rice, 1 x Beef (N1200)")
+
+    def test_old_turns_roll_into_a_summary(self):
+        with mock.patch.object(conversation_history.settings, "HISTORY_MAX_MESSAGES", 2):
+            self._add("inbound", "2 jollof")
+            self._add("outbound", "I don add am. You want drink?\n\nCurrent Cart: 2 x Jollof Rice (N1000)")
+            self._add("inbound", "no drink")
+            self._add("outbound", "No wahala.")
+            history = self._turn("I want to pay")
+
+        self.assertIsInstance(history[0], SystemMessage)
+        self.assertEqual(
+            history[0].content,
+            f"{SUMMARY_HEADER}\nCustomer: 2 jollof\nYou: I don add am.\n"
+            "Last cart shown: Current Cart: 2 x Jollof Rice (N1000)",
+        )
+        self.assertEqual(history[1:], [HumanMessage(content="no drink"), AIMessage(content="No wahala.")])
+
+    def test_token_budget_trims_the_window(self):
+        long_reply = "Na so e be. " * 200
+        self._add("inbound", "tell me a story")
+        self._add("outbound", long_reply)
+        self._add("inbound", "ok")
+        self._add("outbound", "Sharp.")
+        with mock.patch.object(conversation_history.settings, "HISTORY_MAX_TOKENS", 120):
+            history = self._turn("2 jollof")
+        self.assertNotIn(long_reply.strip(), [message.content for message in history])
+        self.assertEqual(history[-2:], [HumanMessage(content="ok"), AIMessage(content="Sharp.")])
+        self.assertTrue(history[0].content.startswith(SUMMARY_HEADER))
+
+    def test_later_turns_only_read_new_rows(self):
+        self._add("inbound", "hello")
+        self._add("outbound", "Hello dear")
+        self._turn("how much is jollof")
+        self._add("outbound", "Jollof na N500.")
+
+        inbound_id = self._add("inbound", "2 jollof").id
+        self.selects.clear()
+        history = build_chat_history(self.db, "telegram", "u1", inbound_id)
+        self.assertEqual(
+            [message.content for message in history],
+            ["hello", "Hello dear", "how much is jollof", "Jollof na N500."],
+        )
+        self.assertEqual(len(self.selects), 1)
+
+    def test_message_skipped_while_a_newer_row_exists_is_picked_up_later(self):
+        first = self._add("inbound", "2 jollof")
+        self._add("inbound", "and 1 beef")  # arrived while the first turn was still running
+        build_chat_history(self.db, "telegram", "u1", first.id)
+        history = self._turn("done")
+        self.assertEqual([message.content for message in history], ["and 1 beef", "2 jollof"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import asyncio
+import os
+import random
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models.sql_models import ProcessedWebhookEvent
+from app.services import inbound_queue
+from app.services.conversation_scheduler import KeyedScheduler, conversation_shard, owned_shards
+
+
+class KeyedSchedulerTests(unittest.TestCase):
+    def test_orders_within_key_and_parallelises_across_keys(self):
+        users = [f"user{index}" for index in range(60)]
+        messages_per_user = 15
+        log = {user: [] for user in users}
+        running = {user: 0 for user in users}
+        stats = {"active": 0, "peak": 0}
+
+        async def job(user, seq):
+            running[user] += 1
+            self.assertEqual(running[user], 1, f"{user} ran two messages at once")
+            stats["active"] += 1
+            stats["peak"] = max(stats["peak"], stats["active"])
+            await asyncio.sleep(random.uniform(0, 0.003))
+            log[user].append(seq)
+            stats["active"] -= 1
+            running[user] -= 1
+
+        async def main():
+            scheduler = KeyedScheduler(max_concurrency=32)
+            interleaved = [(user, seq) for seq in range(messages_per_user) for user in users]
+            random.Random(7).shuffle(interleaved)
+            # Keep per-user arrival order while interleaving users arbitrarily.
+            next_seq = {user: 0 for user in users}
+            for user, _ in interleaved:
+                seq = next_seq[user]
+                next_seq[user] += 1
+                scheduler.submit(user, lambda user=user, seq=seq: job(user, seq))
+            await scheduler.drain()
+
+        asyncio.run(main())
+
+        for user in users:
+            self.assertEqual(log[user], list(range(messages_per_user)))
+        self.assertGreater(stats["peak"], 1)
+        self.assertLessEqual(stats["peak"], 32)
+
+    def test_failed_job_does_not_block_its_conversation(self):
+        seen = []
+
+        async def boom():
+            raise RuntimeError("llm down")
+
+        async def ok():
+            seen.append("ok")
+
+        async def main():
+            scheduler = KeyedScheduler(max_concurrency=2)
+            first = scheduler.submit("u1", boom)
+            scheduler.submit("u1", ok)
+            await scheduler.drain()
+            return first
+
+        first = asyncio.run(main())
+        self.assertIsInstance(first.exception(), RuntimeError)
+        self.assertEqual(seen, ["ok"])
+
+    def test_shards_are_stable_and_partitioned(self):
+        self.assertEqual(conversation_shard("telegram", "42", 64), conversation_shard("telegram", "42", 64))
+        owned = [set(owned_shards(index, 3, 64)) for index in range(3)]
+        self.assertEqual(set().union(*owned), set(range(64)))
+        self.assertEqual(sum(len(shards) for shards in owned), 64)
+
+
+class ShardedWorkerStressTests(unittest.TestCase):
+    def setUp(self):
+        handle, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.engine = create_engine(f"sqlite:///{self.db_path}", connect_args={"timeout": 30})
+        Base.metadata.create_all(self.engine)
+        self.session_factory = sessionmaker(bind=self.engine, autoflush=False)
+        self.original = {
+            "INBOUND_POLL_INTERVAL_MS": inbound_queue.settings.INBOUND_POLL_INTERVAL_MS,
+            "INBOUND_CONCURRENCY": inbound_queue.settings.INBOUND_CONCURRENCY,
+        }
+        inbound_queue.settings.INBOUND_POLL_INTERVAL_MS = 10
+        inbound_queue.settings.INBOUND_CONCURRENCY = 8
+
+    def tearDown(self):
+        for key, value in self.original.items():
+            setattr(inbound_queue.settings, key, value)
+        self.engine.dispose()
+        os.remove(self.db_path)
+
+    def test_interleaved_messages_processed_in_order_per_user(self):
+        users = [str(1000 + index) for index in range(40)]
+        messages_per_user = 6
+        db = self.session_factory()
+        for seq in range(messages_per_user):
+            for user in users:
+                inbound_queue.enqueue_inbound_message(
+                    db, "telegram", f"{user}:{seq}", user_id=user, user_name="U", message_text=str(seq)
+                )
+        db.close()
+
+        log = {user: [] for user in users}
+        handled_by = {}
+        total = len(users) * messages_per_user
+
+        def make_handler(worker_name):
+            async def handler(job, session):
+                await asyncio.sleep(random.uniform(0, 0.002))
+                log[job["user_id"]].append(int(job["message_text"]))
+                handled_by.setdefault(job["user_id"], set()).add(worker_name)
+                return True
+            return handler
+
+        async def main():
+            stop = asyncio.Event()
+            workers = [
+                asyncio.create_task(
+                    inbound_queue.run_inbound_worker(
+                        f"w{index}",
+                        worker_index=index,
+                        worker_count=2,
+                        handler=make_handler(f"w{index}"),
+                        session_factory=self.session_factory,
+                        stop_event=stop,
+                    )
+                )
+                for index in range(2)
+            ]
+            for _ in range(1000):
+                if sum(len(seqs) for seqs in log.values()) >= total:
+                    break
+                await asyncio.sleep(0.01)
+            stop.set()
+            await asyncio.gather(*workers)
+
+        asyncio.run(main())
+
+        for user in users:
+            self.assertEqual(log[user], list(range(messages_per_user)))
+            self.assertEqual(len(handled_by[user]), 1)
+        db = self.session_factory()
+        statuses = {event.status for event in db.query(ProcessedWebhookEvent).all()}
+        db.close()
+        self.assertEqual(statuses, {inbound_queue.STATUS_DONE})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+from sqlalchemy import event
+
+from app.models.sql_models import ConversationState
+from app.services.conversation_state import (
+    STAGE_AWAITING_PAYMENT_NAME,
+    STAGE_CHATTING,
+    get_conversation_stage,
+    record_reply_state,
+)
+
+from db_testcase import DatabaseTestCase
+
+
+class ConversationStateTests(DatabaseTestCase):
+    def test_unknown_conversation_is_a_plain_chat(self):
+        self.assertEqual(get_conversation_stage(self.db, "telegram", "u1"), STAGE_CHATTING)
+
+    def test_reply_state_is_upserted_per_platform_and_contact(self):
+        record_reply_state(self.db, "telegram", "u1", STAGE_AWAITING_PAYMENT_NAME, 7, 1_000)
+        self.db.commit()
+        record_reply_state(self.db, "telegram", "u1", STAGE_AWAITING_PAYMENT_NAME, 7, 2_000)
+        record_reply_state(self.db, "whatsapp", "u1", STAGE_CHATTING, None, 2_500)
+        self.db.commit()
+
+        self.assertEqual(get_conversation_stage(self.db, "telegram", "u1"), STAGE_AWAITING_PAYMENT_NAME)
+        self.assertEqual(get_conversation_stage(self.db, "whatsapp", "u1"), STAGE_CHATTING)
+        state = self.db.get(ConversationState, ("telegram", "u1"))
+        self.assertEqual((state.pending_order_id, state.last_activity_at), (7, 2_000))
+        self.assertEqual(self.db.query(ConversationState).count(), 2)
+
+        record_reply_state(self.db, "telegram", "u1", STAGE_CHATTING, None, 3_000)
+        self.db.commit()
+        self.assertEqual(get_conversation_stage(self.db, "telegram", "u1"), STAGE_CHATTING)
+        self.assertIsNone(self.db.get(ConversationState, ("telegram", "u1")).pending_order_id)
+
+    def test_stage_lookup_is_one_primary_key_query(self):
+        record_reply_state(self.db, "telegram", "u1", STAGE_AWAITING_PAYMENT_NAME, None, 1_000)
+        self.db.commit()
+        db = self.Session()
+        statements = []
+        event.listen(self.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+        self.assertEqual(get_conversation_stage(db, "telegram", "u1"), STAGE_AWAITING_PAYMENT_NAME)
+        self.assertEqual(len(statements), 1)
+        self.assertIn("conversation_state.platform = ?", statements[0])
+        self.assertNotIn("messages", statements[0])
+        db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
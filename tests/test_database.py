@@ -0,0 +1,48 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from sqlalchemy import text
+
+from app.core import database
+from app.core.database import create_app_engine, engine_options, sqlite_pragmas
+
+
+class EngineProfileTests(unittest.TestCase):
+    def test_postgres_profile_sizes_and_checks_the_pool(self):
+        options = engine_options("postgresql://user:pw@db.example/bukka")
+        self.assertTrue(options["pool_pre_ping"])
+        self.assertEqual(options["pool_size"], database.settings.DB_POOL_SIZE)
+        self.assertEqual(options["max_overflow"], database.settings.DB_MAX_OVERFLOW)
+        self.assertEqual(options["pool_recycle"], database.settings.DB_POOL_RECYCLE_SEC)
+        self.assertIn("query_cache_size", options)
+
+    def test_in_memory_sqlite_keeps_the_default_pool(self):
+        options = engine_options("sqlite://")
+        self.assertNotIn("pool_size", options)
+        self.assertFalse(options["connect_args"]["check_same_thread"])
+        self.assertIn("pool_size", engine_options("sqlite:///./local_test.db"))
+
+    def test_sqlite_file_engine_applies_the_pragmas(self):
+        path = os.path.join(tempfile.mkdtemp(), "profile.db")
+        with mock.patch.multiple(database.settings, SQLITE_BUSY_TIMEOUT_MS=1234, SQLITE_MMAP_SIZE=1 << 20):
+            engine = create_app_engine(f"sqlite:///{path}")
+            try:
+                with engine.connect() as conn:
+                    self.assertEqual(conn.execute(text("PRAGMA journal_mode")).scalar(), "wal")
+                    self.assertEqual(conn.execute(text("PRAGMA synchronous")).scalar(), 1)  # NORMAL
+                    self.assertEqual(conn.execute(text("PRAGMA busy_timeout")).scalar(), 1234)
+                    self.assertEqual(conn.execute(text("PRAGMA mmap_size")).scalar(), 1 << 20)
+            finally:
+                engine.dispose()
+
+    def test_invalid_pragma_values_fall_back(self):
+        with mock.patch.multiple(database.settings, SQLITE_JOURNAL_MODE="wal; DROP TABLE users", SQLITE_SYNCHRONOUS="x"):
+            pragmas = sqlite_pragmas()
+        self.assertIn("PRAGMA journal_mode=WAL", pragmas)
+        self.assertIn("PRAGMA synchronous=NORMAL", pragmas)
+
+
+if __name__ == "__main__":
+    unittest.main()
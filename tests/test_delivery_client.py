@@ -0,0 +1,76 @@
+import asyncio
+import unittest
+
+import httpx
+
+from app.services import delivery_client
+
+
+class DeliveryClientTests(unittest.TestCase):
+    def setUp(self):
+        self.original_limit = delivery_client.settings.DELIVERY_TELEGRAM_CONCURRENCY
+        delivery_client.settings.DELIVERY_TELEGRAM_CONCURRENCY = 2
+
+    def tearDown(self):
+        delivery_client.settings.DELIVERY_TELEGRAM_CONCURRENCY = self.original_limit
+        delivery_client.close_delivery_clients()
+
+    def test_sync_client_is_shared(self):
+        self.assertIs(delivery_client.get_delivery_client(), delivery_client.get_delivery_client())
+
+    def test_async_posts_share_one_client_and_respect_platform_limit(self):
+        stats = {"active": 0, "peak": 0, "calls": 0}
+
+        async def handler(request):
+            stats["active"] += 1
+            stats["calls"] += 1
+            stats["peak"] = max(stats["peak"], stats["active"])
+            await asyncio.sleep(0.01)
+            stats["active"] -= 1
+            return httpx.Response(200, json={"ok": True})
+
+        async def main():
+            client = delivery_client.get_async_delivery_client()
+            self.assertIs(client, delivery_client.get_async_delivery_client())
+            # Swap in a mock transport on the pooled client.
+            delivery_client._async_entry()["client"] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            await client.aclose()
+            responses = await asyncio.gather(
+                *[
+                    delivery_client.apost_json("telegram", "https://api.telegram.org/botX/sendMessage", {"n": n})
+                    for n in range(8)
+                ]
+            )
+            await delivery_client.aclose_delivery_clients()
+            return responses
+
+        responses = asyncio.run(main())
+        self.assertTrue(all(response.status_code == 200 for response in responses))
+        self.assertEqual(stats["calls"], 8)
+        self.assertEqual(stats["peak"], 2)
+
+    def test_async_client_is_per_loop_and_closed_with_its_loop(self):
+        async def get_client():
+            return delivery_client.get_async_delivery_client()
+
+        first = asyncio.run(get_client())
+        second = asyncio.run(get_client())
+        self.assertIsNot(first, second)
+        self.assertTrue(first.is_closed)
+        self.assertTrue(second.is_closed)
+
+    def test_aclose_replaces_the_client_on_the_next_call(self):
+        async def main():
+            client = delivery_client.get_async_delivery_client()
+            await delivery_client.aclose_delivery_clients()
+            self.assertTrue(client.is_closed)
+            replacement = delivery_client.get_async_delivery_client()
+            self.assertIsNot(replacement, client)
+            self.assertFalse(replacement.is_closed)
+            return replacement
+
+        self.assertTrue(asyncio.run(main()).is_closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
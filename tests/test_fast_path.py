@@ -0,0 +1,122 @@
+import time
+import unittest
+
+from app.services.fast_path import parse_simple_order, route_fast_path
+from app.services.menu_cache import MenuEntry, is_live, render_menu_text
+from app.services.menu_index import MenuIndex
+
+
+def _entry(item_id: int, name: str, price: int, is_available: bool = True, stock_qty: int | None = None) -> MenuEntry:
+    return MenuEntry(
+        id=item_id, name=name, price=price, is_available=is_available, stock_qty=stock_qty, reorder_level=None
+    )
+
+
+MENU = [
+    _entry(1, "Jollof Rice", 500),
+    _entry(2, "Fried Rice", 500),
+    _entry(3, "Chicken", 1000),
+    _entry(4, "Beef", 200),
+    _entry(5, "Plantain", 100, stock_qty=0),
+    _entry(6, "Coca-Cola", 250),
+]
+
+
+def _snapshot(items=MENU) -> dict:
+    live_items = [item for item in items if is_live(item)]
+    return {
+        "all_items": items,
+        "live_items": live_items,
+        "index": MenuIndex(items),
+        "live_index": MenuIndex(live_items),
+        "menu_text": render_menu_text(live_items),
+    }
+
+
+class FastPathTests(unittest.TestCase):
+    def setUp(self):
+        self.snapshot = _snapshot()
+
+    def route(self, text: str, cart_item_ids=frozenset()):
+        return route_fast_path(text, self.snapshot, cart_item_ids)
+
+    def test_greetings(self):
+        for text in ["hi", "Hello!!", "good morning auntie", "How far", "hey o"]:
+            extraction = self.route(text)
+            self.assertIsNotNone(extraction, text)
+            self.assertEqual(extraction["intent"], "greeting")
+            self.assertEqual(extraction["extracted_items"], [])
+        self.assertIn("Good morning", self.route("good morning")["message"])
+        for text in ["good", "how", "hi, do you deliver to hall 3?", "hello I want jollof"]:
+            self.assertIsNone(self.route(text), text)
+
+    def test_menu_requests_list_live_items(self):
+        for text in ["menu", "Abeg send menu", "show me the menu", "what do you have?", "wetin una get"]:
+            extraction = self.route(text)
+            self.assertIsNotNone(extraction, text)
+            self.assertEqual(extraction["intent"], "inquiry")
+            self.assertIn("- Jollof Rice: N500", extraction["message"])
+            self.assertNotIn("Plantain", extraction["message"])
+        self.assertIsNone(self.route("do you have pizza"))
+
+    def test_single_item_price(self):
+        extraction = self.route("how much is jollof?")
+        self.assertEqual(extraction["intent"], "inquiry")
+        self.assertIn("Jollof Rice na N500", extraction["message"])
+        self.assertIn("Chicken na N1000", self.route("chicken price abeg")["message"])
+        self.assertIn("Coca-Cola na N250", self.route("price of coca cola")["message"])
+        self.assertIn("don finish", self.route("how much is plantain")["message"])
+        # Ambiguous, off-menu or compound questions go to the LLM.
+        for text in ["how much is rice", "how much is pizza", "how much is jollof and beef"]:
+            self.assertIsNone(self.route(text), text)
+
+    def test_plain_orders_are_parsed(self):
+        extraction = self.route("2 jollof 1 beef")
+        self.assertEqual(extraction["intent"], "ordering")
+        self.assertEqual(
+            extraction["extracted_items"],
+            [
+                {"item": "Jollof Rice", "item_id": 1, "quantity": 2, "action": "add"},
+                {"item": "Beef", "item_id": 4, "quantity": 1, "action": "add"},
+            ],
+        )
+        extraction = self.route("Abeg I want 2 plates of fried rice and two chicken")
+        self.assertEqual(
+            [(line["item"], line["quantity"]) for line in extraction["extracted_items"]],
+            [("Fried Rice", 2), ("Chicken", 2)],
+        )
+        self.assertEqual(self.route("add 3x coca cola")["extracted_items"][0]["quantity"], 3)
+
+    def test_orders_needing_judgement_go_to_the_llm(self):
+        for text in [
+            "2 jollof and beef",  # second item has no quantity
+            "2 rice",  # ambiguous item
+            "2 plantain",  # sold out
+            "2 pizza",
+            "remove 1 beef",
+            "just 1 jollof",
+            "2 jollof then I pay",
+            "0 jollof",
+            "500 jollof",
+        ]:
+            self.assertIsNone(self.route(text), text)
+        # Repeating an item already in the cart may be a confirmation, not an add.
+        self.assertIsNone(self.route("1 jollof", cart_item_ids={1}))
+        self.assertIsNotNone(self.route("1 beef", cart_item_ids={1}))
+
+    def test_parse_simple_order_requires_a_quantity_first(self):
+        index = self.snapshot["live_index"]
+        self.assertIsNone(parse_simple_order(["jollof", "2"], index))
+        self.assertEqual(parse_simple_order(["1", "beef"], index), [(MENU[3], 1)])
+
+    def test_routing_is_fast(self):
+        messages = ["hi", "menu", "how much is jollof", "2 jollof 1 beef", "can you deliver to my hostel"] * 200
+        started = time.perf_counter()
+        for text in messages:
+            self.route(text)
+        per_message_ms = (time.perf_counter() - started) * 1000 / len(messages)
+        self.assertLess(per_message_ms, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,207 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from app.models.sql_models import Message, ProcessedWebhookEvent
+from app.services import inbound_queue
+
+from db_testcase import DatabaseTestCase
+
+
+class InboundQueueTests(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.original_max_attempts = inbound_queue.settings.INBOUND_MAX_ATTEMPTS
+        inbound_queue.settings.INBOUND_MAX_ATTEMPTS = 2
+
+    def tearDown(self):
+        inbound_queue.settings.INBOUND_MAX_ATTEMPTS = self.original_max_attempts
+        super().tearDown()
+
+    def _enqueue(self, event_id, user_id="u1", text="hello"):
+        return inbound_queue.enqueue_inbound_message(
+            self.db, "telegram", event_id, user_id=user_id, user_name="Ada", message_text=text
+        )
+
+    def test_enqueue_deduplicates_by_event_id(self):
+        self.assertTrue(self._enqueue("e1"))
+        self.assertFalse(self._enqueue("e1"))
+        rows = self.db.query(ProcessedWebhookEvent).all()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0].status, inbound_queue.STATUS_PENDING)
+
+    def test_claim_is_exclusive_and_ordered(self):
+        for index in range(3):
+            self._enqueue(f"e{index}", user_id=f"u{index}")
+        first = [event_id for event_id, _ in inbound_queue.claim_pending_events(self.db, "w1", limit=2)]
+        second = [event_id for event_id, _ in inbound_queue.claim_pending_events(self.db, "w2", limit=5)]
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertTrue(set(first).isdisjoint(second))
+        self.assertEqual(first, sorted(first))
+
+    def test_successful_job_marked_done(self):
+        self._enqueue("e1", text="menu")
+        seen = []
+
+        async def handler(job, db):
+            seen.append(job["message_text"])
+            return True
+
+        [(event_id, _)] = inbound_queue.claim_pending_events(self.db, "w1", limit=10)
+        ok = asyncio.run(
+            inbound_queue.process_inbound_event(event_id, handler=handler, session_factory=self.Session)
+        )
+        self.assertTrue(ok)
+        self.assertEqual(seen, ["menu"])
+        self.db.expire_all()
+        event = self.db.get(ProcessedWebhookEvent, event_id)
+        self.assertEqual(event.status, inbound_queue.STATUS_DONE)
+        self.assertIsNotNone(event.processed_at)
+
+    def test_failed_job_retried_then_marked_failed(self):
+        self._enqueue("e1")
+
+        async def handler(job, db):
+            raise RuntimeError("groq down")
+
+        for expected_status in (inbound_queue.STATUS_PENDING, inbound_queue.STATUS_FAILED):
+            [(event_id, _)] = inbound_queue.claim_pending_events(self.db, "w1", limit=10)
+            ok = asyncio.run(
+                inbound_queue.process_inbound_event(event_id, handler=handler, session_factory=self.Session)
+            )
+            self.assertFalse(ok)
+            self.db.expire_all()
+            self.assertEqual(self.db.get(ProcessedWebhookEvent, event_id).status, expected_status)
+
+        self.assertEqual(inbound_queue.claim_pending_events(self.db, "w1", limit=10), [])
+
+    def test_stale_claims_recovered(self):
+        self._enqueue("e1")
+        [(event_id, _)] = inbound_queue.claim_pending_events(self.db, "w1", limit=10)
+        event = self.db.get(ProcessedWebhookEvent, event_id)
+        event.locked_at = 0
+        self.db.commit()
+
+        self.assertEqual(inbound_queue.recover_stale_claims(self.db), 1)
+        self.assertEqual(
+            inbound_queue.claim_pending_events(self.db, "w2", limit=10),
+            [(event_id, "telegram:u1")],
+        )
+
+    def _process(self, event_id, handler):
+        return asyncio.run(inbound_queue.process_inbound_event(event_id, handler=handler, session_factory=self.Session))
+
+    def _status(self, event_id):
+        self.db.expire_all()
+        return self.db.get(ProcessedWebhookEvent, event_id).status
+
+    def test_failure_after_the_turn_committed_is_not_replayed(self):
+        self._enqueue("e1")
+
+        async def handler(job, db):
+            # The turn logs the message and commits a fallback reply, then reports failure.
+            db.add(Message(platform="telegram", contact_id=job["user_id"], direction="inbound", body="hi", timestamp=1))
+            db.add(Message(platform="telegram", contact_id=job["user_id"], direction="outbound", body="Network error", timestamp=2))
+            db.commit()
+            raise RuntimeError("groq down")
+
+        [(event_id, _)] = inbound_queue.claim_pending_events(self.db, "w1", limit=10)
+        self.assertFalse(self._process(event_id, handler))
+        self.assertEqual(self._status(event_id), inbound_queue.STATUS_FAILED)
+        self.assertEqual(inbound_queue.claim_pending_events(self.db, "w1", limit=10), [])
+        self.assertEqual(self.db.query(Message).count(), 2)
+
+    def test_retried_message_keeps_its_place_in_the_conversation(self):
+        self._enqueue("e1", text="first")
+        self._enqueue("e2", text="second")
+        self._enqueue("e3", user_id="u2", text="other chat")
+        seen = []
+        fail_once = {"first"}
+
+        async def handler(job, db):
+            if job["message_text"] in fail_once:
+                fail_once.discard(job["message_text"])
+                raise RuntimeError("db hiccup")
+            seen.append(job["message_text"])
+            return True
+
+        claimed = inbound_queue.claim_pending_events(self.db, "w1", limit=10)
+        for event_id, _ in claimed:
+            self._process(event_id, handler)
+        # "second" waited behind the failed "first"; the other conversation went ahead.
+        self.assertEqual(seen, ["other chat"])
+        self.assertEqual([self._status(event_id) for event_id, _ in claimed], ["pending", "pending", "done"])
+
+        for event_id, _ in inbound_queue.claim_pending_events(self.db, "w1", limit=10):
+            self._process(event_id, handler)
+        self.assertEqual(seen, ["other chat", "first", "second"])
+
+    def test_claim_skips_conversations_busy_on_another_worker(self):
+        self._enqueue("e1")
+        [(first_id, _)] = inbound_queue.claim_pending_events(self.db, "w1", limit=10)
+        self._enqueue("e2")
+        self._enqueue("e3", user_id="u2")
+
+        claimed = inbound_queue.claim_pending_events(self.db, "w2", limit=10)
+        self.assertEqual([key for _, key in claimed], ["telegram:u2"])
+
+    def test_stale_started_turn_is_failed_not_replayed(self):
+        self._enqueue("e1")
+        [(event_id, _)] = inbound_queue.claim_pending_events(self.db, "w1", limit=10)
+        event = self.db.get(ProcessedWebhookEvent, event_id)
+        event.status = inbound_queue.STATUS_STARTED
+        event.locked_at = 0
+        self.db.commit()
+
+        self.assertEqual(inbound_queue.recover_stale_claims(self.db), 0)
+        self.assertEqual(self._status(event_id), inbound_queue.STATUS_FAILED)
+        self.assertEqual(inbound_queue.claim_pending_events(self.db, "w2", limit=10), [])
+
+    def test_renewed_claims_are_not_recovered(self):
+        self._enqueue("e1")
+        self._enqueue("e2", user_id="u2")
+        self._enqueue("e3", user_id="u3")
+        mine = inbound_queue.claim_pending_events(self.db, "w1", limit=2)
+        [(theirs, _)] = inbound_queue.claim_pending_events(self.db, "w2", limit=10)
+        self.db.get(ProcessedWebhookEvent, mine[1][0]).status = inbound_queue.STATUS_STARTED
+        for event in self.db.query(ProcessedWebhookEvent):
+            event.locked_at = 0
+        self.db.commit()
+
+        self.assertEqual(inbound_queue.renew_claims(self.db, "w1"), 2)
+        self.assertEqual(inbound_queue.recover_stale_claims(self.db), 1)
+        self.assertEqual(
+            [self._status(event_id) for event_id, _ in mine] + [self._status(theirs)],
+            [inbound_queue.STATUS_PROCESSING, inbound_queue.STATUS_STARTED, inbound_queue.STATUS_PENDING],
+        )
+
+    def test_worker_renews_the_lease_of_a_slow_turn(self):
+        self._enqueue("e1")
+        locks = []
+
+        async def slow_handler(job, db):
+            # Pretend the claim is already old, then run longer than the renewal interval.
+            with self.Session() as other:
+                other.query(ProcessedWebhookEvent).update({ProcessedWebhookEvent.locked_at: 0})
+                other.commit()
+            await asyncio.sleep(0.6)
+            with self.Session() as other:
+                locks.append(other.query(ProcessedWebhookEvent).one().locked_at)
+            stop.set()
+            return True
+
+        async def main():
+            await inbound_queue.run_inbound_worker(
+                "w1", handler=slow_handler, session_factory=self.Session, stop_event=stop
+            )
+
+        stop = asyncio.Event()
+        with mock.patch.object(inbound_queue.settings, "INBOUND_LOCK_TIMEOUT_SEC", 1):
+            asyncio.run(main())
+        self.assertGreater(locks[0], 0)
+        self.assertEqual(self._status(self.db.query(ProcessedWebhookEvent).one().id), inbound_queue.STATUS_DONE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import json
+import unittest
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import AIMessage
+
+from app.models.schemas import OrderExtractionResponse
+from app.services.llm_output import (
+    extraction_from_output,
+    parse_outcome_stats,
+    record_parse_outcome,
+    repair_json_object,
+    reset_parse_outcome_stats,
+)
+
+
+EXTRACTION = {
+    "thought": "Pidgin, adding items {not json}, \"quoted\"",
+    "message": "I don add am, my dear.",
+    "extracted_items": [{"item": "Jollof Rice", "quantity": 2, "action": "add"}],
+    "intent": "ordering",
+}
+
+
+class RepairJsonObjectTests(unittest.TestCase):
+    def test_plain_object_round_trips(self):
+        self.assertEqual(repair_json_object(json.dumps(EXTRACTION)), EXTRACTION)
+
+    def test_surrounding_prose_and_fences_are_stripped(self):
+        text = json.dumps(EXTRACTION)
+        self.assertEqual(repair_json_object(f"Sure! Here you go:\n{text}\nHope this helps {{x}}"), EXTRACTION)
+        self.assertEqual(repair_json_object(f"```json\n{text}\n```"), EXTRACTION)
+
+    def test_trailing_commas_are_dropped(self):
+        self.assertEqual(repair_json_object('{"intent": "greeting", "extracted_items": [],}'),
+                         {"intent": "greeting", "extracted_items": []})
+
+    def test_truncated_output_keeps_the_complete_members(self):
+        text = json.dumps(EXTRACTION)
+        cut = text[: text.index('"intent"') + len('"intent": "ord')]
+        repaired = repair_json_object(cut)
+        self.assertEqual(repaired["message"], EXTRACTION["message"])
+        self.assertEqual(repaired["extracted_items"], EXTRACTION["extracted_items"])
+
+        cut = text[: text.index('"intent"') + len('"intent":')]
+        repaired = repair_json_object(cut)
+        self.assertEqual(repaired["extracted_items"], EXTRACTION["extracted_items"])
+        self.assertNotIn("intent", repaired)
+
+    def test_every_prefix_repairs_or_returns_none(self):
+        text = json.dumps(EXTRACTION)
+        for end in range(len(text) + 1):
+            repaired = repair_json_object(text[:end])
+            self.assertTrue(repaired is None or isinstance(repaired, dict), text[:end])
+        self.assertIn("thought", repair_json_object(text[: text.index('"message"')]))
+
+    def test_non_objects_return_none(self):
+        self.assertIsNone(repair_json_object(""))
+        self.assertIsNone(repair_json_object("I no understand"))
+        self.assertIsNone(repair_json_object('["not", "an", "object"]'))
+
+
+class ExtractionFromOutputTests(unittest.TestCase):
+    def test_parser_output_is_used_as_is(self):
+        self.assertEqual(extraction_from_output(EXTRACTION), (EXTRACTION, "parsed"))
+
+    def test_parser_exception_is_repaired_from_its_raw_text(self):
+        exc = OutputParserException("bad", llm_output=f"Sure! {json.dumps(EXTRACTION)} enjoy")
+        self.assertEqual(extraction_from_output(exc), (EXTRACTION, "repaired"))
+        self.assertEqual(extraction_from_output(OutputParserException("bad", llm_output="no json")), (None, "failed"))
+
+    def test_structured_result_is_dumped(self):
+        parsed = OrderExtractionResponse(**EXTRACTION)
+        extraction, outcome = extraction_from_output({"raw": AIMessage(content=""), "parsed": parsed, "parsing_error": None})
+        self.assertEqual(outcome, "parsed")
+        self.assertEqual(extraction["intent"], "ordering")
+        self.assertEqual(extraction["extracted_items"][0]["item"], "Jollof Rice")
+
+    def test_structured_validation_failure_falls_back_to_raw_output(self):
+        args = dict(EXTRACTION, intent="chit-chat")
+        raw = AIMessage(content="", tool_calls=[{"name": "OrderExtractionResponse", "args": args, "id": "1"}])
+        result = {"raw": raw, "parsed": None, "parsing_error": ValueError("intent")}
+        self.assertEqual(extraction_from_output(result), (args, "repaired"))
+
+        raw = AIMessage(content=f"```json\n{json.dumps(EXTRACTION)}\n```")
+        result = {"raw": raw, "parsed": None, "parsing_error": ValueError("no tool call")}
+        self.assertEqual(extraction_from_output(result), (EXTRACTION, "repaired"))
+
+
+class ParseOutcomeStatsTests(unittest.TestCase):
+    def setUp(self):
+        reset_parse_outcome_stats()
+
+    def tearDown(self):
+        reset_parse_outcome_stats()
+
+    def test_outcomes_are_counted_per_mode(self):
+        record_parse_outcome("json_parser", "parsed")
+        record_parse_outcome("json_parser", "parsed")
+        record_parse_outcome("json_parser", "repaired")
+        record_parse_outcome("structured", "failed")
+        self.assertEqual(
+            parse_outcome_stats(),
+            {
+                "json_parser": {"parsed": 2, "repaired": 1, "failed": 0},
+                "structured": {"parsed": 0, "repaired": 0, "failed": 1},
+            },
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+
+from sqlalchemy import event
+
+from app.models.sql_models import MenuItem
+from app.services import menu_cache
+
+from db_testcase import DatabaseTestCase
+
+
+class FakeRedis:
+    def __init__(self):
+        self.kv = {}
+        self.gets = 0
+
+    def get(self, key):
+        self.gets += 1
+        return self.kv.get(key)
+
+    def incr(self, key):
+        self.kv[key] = int(self.kv.get(key, 0)) + 1
+        return self.kv[key]
+
+
+class MenuCacheTests(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db.add_all(
+            [
+                MenuItem(name="Jollof Rice", price=500, is_available=True, stock_qty=3),
+                MenuItem(name="Beef", price=200, is_available=True),
+                MenuItem(name="Plantain", price=100, is_available=True, stock_qty=0),
+            ]
+        )
+        self.db.commit()
+
+        self.menu_queries = 0
+
+        def count_menu_queries(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT") and "menu_items" in statement:
+                self.menu_queries += 1
+
+        event.listen(self.engine, "before_cursor_execute", count_menu_queries)
+
+        self.fake_redis = None
+        self.original_get_redis = menu_cache.get_redis_client
+        menu_cache.get_redis_client = lambda: self.fake_redis
+        self.original_ttl = menu_cache.settings.MENU_CACHE_TTL_SEC
+        self.original_version_check = menu_cache.settings.MENU_VERSION_CHECK_SEC
+        menu_cache.settings.MENU_CACHE_TTL_SEC = 60
+        menu_cache.settings.MENU_VERSION_CHECK_SEC = 60
+        menu_cache.invalidate_menu_cache()
+
+    def tearDown(self):
+        menu_cache.get_redis_client = self.original_get_redis
+        menu_cache.settings.MENU_CACHE_TTL_SEC = self.original_ttl
+        menu_cache.settings.MENU_VERSION_CHECK_SEC = self.original_version_check
+        menu_cache.invalidate_menu_cache()
+        super().tearDown()
+
+    def test_snapshot_holds_live_items_text_and_hash(self):
+        snapshot = menu_cache.get_menu_snapshot(self.db)
+        self.assertEqual([item.name for item in snapshot["all_items"]], ["Jollof Rice", "Beef", "Plantain"])
+        self.assertEqual([item.name for item in snapshot["live_items"]], ["Jollof Rice", "Beef"])
+        self.assertEqual(snapshot["menu_text"], "- Jollof Rice: N500\n- Beef: N200")
+        self.assertEqual(len(snapshot["menu_hash"]), 64)
+
+    def test_snapshot_is_reused_until_invalidated(self):
+        for _ in range(3):
+            menu_cache.get_menu_snapshot(self.db)
+        self.assertEqual(self.menu_queries, 1)
+
+        item = self.db.query(MenuItem).filter(MenuItem.name == "Beef").one()
+        item.is_available = False
+        self.db.commit()
+        menu_cache.invalidate_menu_cache()
+        self.menu_queries = 0
+
+        snapshot = menu_cache.get_menu_snapshot(self.db)
+        self.assertEqual(self.menu_queries, 1)
+        self.assertEqual([item.name for item in snapshot["live_items"]], ["Jollof Rice"])
+
+    def test_snapshot_expires_after_ttl(self):
+        menu_cache.settings.MENU_CACHE_TTL_SEC = 0
+        menu_cache.get_menu_snapshot(self.db)
+        menu_cache.get_menu_snapshot(self.db)
+        self.assertEqual(self.menu_queries, 2)
+
+    def test_version_bump_from_another_process_reloads(self):
+        menu_cache.settings.MENU_VERSION_CHECK_SEC = 0
+        self.fake_redis = FakeRedis()
+        menu_cache.get_menu_snapshot(self.db)
+        menu_cache.get_menu_snapshot(self.db)
+        self.assertEqual(self.menu_queries, 1)
+
+        self.fake_redis.incr(menu_cache.MENU_VERSION_KEY)
+        menu_cache.get_menu_snapshot(self.db)
+        self.assertEqual(self.menu_queries, 2)
+
+
+    def test_shared_version_is_read_once_per_check_window(self):
+        self.fake_redis = FakeRedis()
+        for _ in range(4):
+            menu_cache.get_menu_snapshot(self.db)
+        self.assertEqual(self.fake_redis.gets, 1)
+
+        # Another process bumps the version; it is seen once the window has passed.
+        self.fake_redis.incr(menu_cache.MENU_VERSION_KEY)
+        menu_cache.get_menu_snapshot(self.db)
+        self.assertEqual(self.menu_queries, 1)
+        menu_cache.settings.MENU_VERSION_CHECK_SEC = 0
+        menu_cache.get_menu_snapshot(self.db)
+        self.assertEqual(self.menu_queries, 2)
+        self.assertEqual(self.fake_redis.gets, 2)
+
+        # A local invalidation re-reads the version straight away.
+        menu_cache.settings.MENU_VERSION_CHECK_SEC = 60
+        menu_cache.invalidate_menu_cache()
+        menu_cache.get_menu_snapshot(self.db)
+        self.assertEqual(self.fake_redis.gets, 3)
+        self.assertEqual(self.menu_queries, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import random
+import unittest
+
+from app.services.menu_cache import MenuEntry
+from app.services.menu_index import MenuIndex, normalize_text
+
+
+def _entry(item_id: int, name: str) -> MenuEntry:
+    return MenuEntry(id=item_id, name=name, price=100, is_available=True, stock_qty=None, reorder_level=None)
+
+
+MENU = [
+    _entry(1, "Jollof Rice"),
+    _entry(2, "Fried Rice"),
+    _entry(3, "Chicken"),
+    _entry(4, "Beef"),
+    _entry(5, "Plantain"),
+    _entry(6, "Water"),
+    _entry(7, "Coca-Cola (50cl)"),
+    _entry(8, "Rice"),
+    _entry(9, "Jollof Rice & Chicken Combo"),
+    _entry(10, "Ice"),
+]
+
+
+def resolve_menu_item(raw_item: str, menu_items: list):
+    """The linear scan MenuIndex replaced; the reference its lookups must match."""
+    target = normalize_text(raw_item)
+    if not target:
+        return None
+
+    for item in menu_items:
+        item_name = normalize_text(item.name)
+        if target == item_name or target in item_name or item_name in target:
+            return item
+
+    target_tokens = set(target.split())
+    best_item = None
+    best_score = 0
+    for item in menu_items:
+        item_tokens = set(normalize_text(item.name).split())
+        score = len(target_tokens & item_tokens)
+        if score > best_score:
+            best_score = score
+            best_item = item
+
+    return best_item if best_score > 0 else None
+
+
+class MenuIndexTests(unittest.TestCase):
+    def assertSameAsLinear(self, menu, queries):
+        index = MenuIndex(menu)
+        for query in queries:
+            expected = resolve_menu_item(query, menu)
+            self.assertEqual(index.resolve(query), expected, query)
+            # Memoized lookups must agree too.
+            self.assertEqual(index.resolve(query), expected, query)
+
+    def test_matches_linear_resolver_on_known_queries(self):
+        self.assertSameAsLinear(
+            MENU,
+            [
+                "jollof",
+                "JOLLOF RICE",
+                "2 jollof rice please",
+                "rice",
+                "fried",
+                "coke",
+                "coca cola",
+                "cola 50cl",
+                "price",
+                "chicken combo",
+                "combo",
+                "spicy beef suya",
+                "nothing here",
+                "",
+                "   ",
+                "!!!",
+            ],
+        )
+
+    def test_examples(self):
+        index = MenuIndex(MENU)
+        self.assertEqual(index.resolve("2 jollof rice").id, 1)
+        self.assertEqual(index.resolve("rice").id, 1)
+        self.assertEqual(index.resolve("beef suya").id, 4)
+        self.assertIsNone(index.resolve("pizza"))
+        self.assertIsNone(MenuIndex([]).resolve("rice"))
+
+    def test_resolve_exactly_refuses_to_guess(self):
+        index = MenuIndex(MENU)
+        self.assertEqual(index.resolve_exactly("jollof rice").id, 1)
+        self.assertEqual(index.resolve_exactly("RICE").id, 8)  # exact name wins
+        self.assertEqual(index.resolve_exactly("coca cola").id, 7)
+        self.assertIsNone(index.resolve_exactly("jollof"))  # two items contain "jollof"
+        self.assertIsNone(index.resolve_exactly("jollof pizza"))
+        self.assertIsNone(index.resolve_exactly(""))
+
+    def test_empty_normalized_name_behaves_like_linear_scan(self):
+        menu = [_entry(1, "Water"), _entry(2, "***"), _entry(3, "Beef")]
+        self.assertSameAsLinear(menu, ["beef", "water", "pizza"])
+
+    def test_matches_linear_resolver_on_random_menus(self):
+        rng = random.Random(7)
+        words = ["rice", "jollof", "fried", "chicken", "beef", "ice", "cream", "pepper", "soup", "egg", "plantain"]
+        for _ in range(200):
+            menu = [
+                _entry(i, " ".join(rng.sample(words, rng.randint(1, 3))))
+                for i in range(rng.randint(1, 12))
+            ]
+            queries = [" ".join(rng.choices(words + ["2", "x", "please"], k=rng.randint(1, 4))) for _ in range(10)]
+            queries += [word[1:] for word in words]
+            self.assertSameAsLinear(menu, queries)
+
+
+if __name__ == "__main__":
+    unittest.main()
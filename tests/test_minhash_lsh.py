@@ -0,0 +1,35 @@
+import unittest
+
+from app.services import minhash_lsh
+
+
+class MinHashLshTests(unittest.TestCase):
+    def test_signature_is_deterministic_and_order_independent(self):
+        a = minhash_lsh.minhash_signature({"jollof", "rice", "price"}, 64)
+        b = minhash_lsh.minhash_signature(["price", "rice", "jollof"], 64)
+        self.assertEqual(a.tolist(), b.tolist())
+        self.assertEqual(len(a), 64)
+
+    def test_signature_agreement_estimates_jaccard(self):
+        base = {f"token{i}" for i in range(40)}
+        similar = set(list(base)[:30]) | {f"other{i}" for i in range(10)}  # J = 30 / 50
+        a = minhash_lsh.minhash_signature(base, 256)
+        b = minhash_lsh.minhash_signature(similar, 256)
+        estimate = float((a == b).mean())
+        self.assertAlmostEqual(estimate, 0.6, delta=0.12)
+
+    def test_band_keys(self):
+        bands, rows = minhash_lsh.lsh_params()
+        keys = minhash_lsh.lsh_band_keys({"how", "much", "jollof", "rice"})
+        self.assertEqual(len(keys), bands)
+        self.assertEqual(keys, minhash_lsh.lsh_band_keys(["rice", "jollof", "much", "how"]))
+        self.assertEqual(minhash_lsh.lsh_band_keys(set()), [])
+
+        near = set(minhash_lsh.lsh_band_keys({"how", "much", "jollof", "rice", "today"}))
+        far = set(minhash_lsh.lsh_band_keys({"where", "delivery", "campus"}))
+        self.assertTrue(near & set(keys))
+        self.assertFalse(far & set(keys))
+
+
+if __name__ == "__main__":
+    unittest.main()
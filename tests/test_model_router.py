@@ -0,0 +1,103 @@
+import unittest
+
+from app.services import model_router
+from app.services.model_router import (
+    LARGE_TIER,
+    SMALL_TIER,
+    choose_model_tier,
+    is_valid_extraction,
+    llm_tier_stats,
+    record_escalation,
+    record_llm_call,
+    reset_llm_tier_stats,
+    route_confidence,
+    tier_model_name,
+)
+
+
+class ModelRouterTests(unittest.TestCase):
+    def setUp(self):
+        self.original = {
+            name: getattr(model_router.settings, name)
+            for name in ("LLM_ROUTING_ENABLED", "LLM_ROUTER_MIN_CONFIDENCE", "LLM_ROUTER_SMALL_MAX_WORDS")
+        }
+        model_router.settings.LLM_ROUTING_ENABLED = True
+        model_router.settings.LLM_ROUTER_MIN_CONFIDENCE = 0.6
+        model_router.settings.LLM_ROUTER_SMALL_MAX_WORDS = 12
+        reset_llm_tier_stats()
+
+    def tearDown(self):
+        for name, value in self.original.items():
+            setattr(model_router.settings, name, value)
+        reset_llm_tier_stats()
+
+    def test_simple_turns_go_to_the_small_model(self):
+        for text in ["hello", "good afternoon auntie", "do you have pizza", "how much is jollof?", "add 1 jollof"]:
+            self.assertEqual(choose_model_tier(text), SMALL_TIER, text)
+
+    def test_hard_turns_go_to_the_large_model(self):
+        for text in [
+            "2 jollof and 1 beef",
+            "comot the meat, make I pay",
+            "I said I want exactly 1 coke",
+            "no drink, just the jollof is fine",
+            "my friend and I are coming from the hostel later and we want to know if you will still be open",
+        ]:
+            self.assertEqual(choose_model_tier(text), LARGE_TIER, text)
+        # Changing an existing cart needs the large model even for short input.
+        self.assertEqual(choose_model_tier("add 1 jollof", has_cart=True), LARGE_TIER)
+
+    def test_routing_disabled_always_uses_the_large_model(self):
+        model_router.settings.LLM_ROUTING_ENABLED = False
+        self.assertEqual(choose_model_tier("hello"), LARGE_TIER)
+
+    def test_confidence_is_bounded(self):
+        self.assertEqual(route_confidence(""), 1.0)
+        self.assertEqual(route_confidence("hi"), 1.0)
+        self.assertEqual(route_confidence("no no 2 3 4 remove and pay " * 5, has_cart=True), 0.0)
+
+    def test_tier_model_names_differ(self):
+        self.assertEqual(tier_model_name(LARGE_TIER), model_router.settings.ORDER_MODEL_NAME)
+        self.assertEqual(tier_model_name(SMALL_TIER), model_router.settings.ORDER_SMALL_MODEL_NAME)
+        self.assertNotEqual(tier_model_name(LARGE_TIER), tier_model_name(SMALL_TIER))
+
+    def test_is_valid_extraction(self):
+        self.assertTrue(is_valid_extraction({"intent": "greeting", "message": "Hello!", "extracted_items": []}))
+        self.assertTrue(
+            is_valid_extraction(
+                {
+                    "intent": "ordering",
+                    "message": "Done",
+                    "extracted_items": [{"item": "Jollof Rice", "quantity": 2, "action": "add"}],
+                }
+            )
+        )
+        for extraction in [
+            {},
+            None,
+            {"intent": "chit-chat", "message": "Hello"},
+            {"intent": "greeting", "message": "  "},
+            {"intent": "ordering", "message": "Done", "extracted_items": []},
+            {"intent": "ordering", "message": "Done", "extracted_items": [{"item": "", "quantity": 1}]},
+            {"intent": "ordering", "message": "Done", "extracted_items": [{"item": "Beef", "action": "swap"}]},
+            {"intent": "ordering", "message": "Done", "extracted_items": [{"item": "Beef", "quantity": "two"}]},
+        ]:
+            self.assertFalse(is_valid_extraction(extraction), extraction)
+
+    def test_tier_counters(self):
+        record_llm_call(SMALL_TIER, 100.0, input_tokens=1_000_000, output_tokens=0)
+        record_llm_call(SMALL_TIER, 300.0, failed=True)
+        record_escalation(SMALL_TIER)
+        record_llm_call(LARGE_TIER, 900.0, input_tokens=0, output_tokens=1_000_000)
+
+        stats = llm_tier_stats()
+        self.assertEqual(stats[SMALL_TIER]["calls"], 2)
+        self.assertEqual(stats[SMALL_TIER]["failures"], 1)
+        self.assertEqual(stats[SMALL_TIER]["escalations"], 1)
+        self.assertAlmostEqual(stats[SMALL_TIER]["latency_ms_avg"], 200.0)
+        self.assertAlmostEqual(stats[SMALL_TIER]["cost_usd"], model_router.settings.LLM_SMALL_COST_PER_M_INPUT)
+        self.assertAlmostEqual(stats[LARGE_TIER]["cost_usd"], model_router.settings.LLM_LARGE_COST_PER_M_OUTPUT)
+
+
+if __name__ == "__main__":
+    unittest.main()
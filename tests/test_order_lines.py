@@ -0,0 +1,196 @@
+import importlib.util
+import os
+import unittest
+from pathlib import Path
+from unittest import mock
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("SERPAPI_API_KEY", "test")
+
+from app.models.sql_models import MenuItem, Order, StockMovement
+from app.services import menu_cache
+from app.services.chat_manager import apply_cart_updates, apply_sale_stock_deduction, get_order_lines, lines_from_summary
+from app.services.fast_path import route_fast_path
+
+from db_testcase import DatabaseTestCase
+
+
+MIGRATION_PATH = Path(__file__).resolve().parents[1] / "alembic" / "versions" / "a3c7d2e9f180_add_order_lines.py"
+
+
+def _load_order_lines_migration():
+    spec = importlib.util.spec_from_file_location("add_order_lines_migration", MIGRATION_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def add(name, quantity=1):
+    return {"item": name, "quantity": quantity, "action": "add"}
+
+
+def remove(name, quantity=1):
+    return {"item": name, "quantity": quantity, "action": "remove"}
+
+
+class OrderLinesTests(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        redis_patch = mock.patch.object(menu_cache, "get_redis_client", lambda: None)
+        redis_patch.start()
+        self.addCleanup(redis_patch.stop)
+        menu_cache.invalidate_menu_cache()
+        self.addCleanup(menu_cache.invalidate_menu_cache)
+
+        self.jollof = MenuItem(name="Jollof Rice", price=500, is_available=True, stock_qty=10)
+        self.beef = MenuItem(name="Beef", price=200, is_available=True)
+        self.plantain = MenuItem(name="Fried Plantain", price=300, is_available=False)
+        self.db.add_all([self.jollof, self.beef, self.plantain])
+        self.db.commit()
+
+    def test_add_and_remove_are_keyed_by_menu_item_id(self):
+        lines, summary, total, unmatched = apply_cart_updates([], [add("jollof", 2), add("beef")], self.db)
+        self.assertEqual([(line["item_id"], line["qty"]) for line in lines], [(self.jollof.id, 2), (self.beef.id, 1)])
+        self.assertEqual(summary, "2 x Jollof Rice, 1 x Beef")
+        self.assertEqual((total, unmatched), (1200, []))
+
+        lines, summary, total, _ = apply_cart_updates(lines, [add("Jollof Rice"), remove("beef")], self.db)
+        self.assertEqual(summary, "3 x Jollof Rice")
+        self.assertEqual(total, 1500)
+
+    def test_an_item_whose_name_contains_another_is_not_picked_for_it(self):
+        # The longer name comes first in menu order, so a containment match lands on it.
+        special = self.jollof
+        special.name, special.price = "Jollof Rice Special", 900
+        jollof = MenuItem(name="Jollof Rice", price=500, is_available=True)
+        self.db.add(jollof)
+        self.db.commit()
+        menu_cache.invalidate_menu_cache()
+        self.assertEqual(menu_cache.get_menu_snapshot(self.db)["index"].resolve("Jollof Rice").id, special.id)
+
+        lines, summary, total, _ = apply_cart_updates([], [add("Jollof Rice", 2)], self.db)
+        self.assertEqual((lines[0]["item_id"], summary, total), (jollof.id, "2 x Jollof Rice", 1000))
+
+        extraction = route_fast_path("2 jollof rice", menu_cache.get_menu_snapshot(self.db))
+        self.assertEqual(extraction["extracted_items"][0]["item_id"], jollof.id)
+        lines, summary, total, _ = apply_cart_updates([], extraction["extracted_items"], self.db)
+        self.assertEqual((lines[0]["item_id"], summary, total), (jollof.id, "2 x Jollof Rice", 1000))
+
+        # With it in the cart, the fast path's correction guard checks the same id.
+        self.assertIsNone(route_fast_path("1 jollof rice", menu_cache.get_menu_snapshot(self.db), {jollof.id}))
+
+    def test_unavailable_items_cannot_be_added_but_can_be_removed(self):
+        carried = [{"item_id": self.plantain.id, "name": "Fried Plantain", "qty": 2, "unit_price": 300}]
+        lines, summary, total, unmatched = apply_cart_updates(carried, [add("pizza"), remove("plantain")], self.db)
+        self.assertEqual(unmatched, ["pizza"])
+        self.assertEqual(summary, "1 x Fried Plantain")
+        self.assertEqual(total, 300)
+
+    def test_totals_use_current_menu_prices(self):
+        stale = [{"item_id": self.jollof.id, "name": "Jollof", "qty": 2, "unit_price": 400}]
+        self.jollof.price = 550
+        self.db.commit()
+        menu_cache.invalidate_menu_cache()
+
+        lines, summary, total, _ = apply_cart_updates(stale, [], self.db)
+        self.assertEqual(lines, [{"item_id": self.jollof.id, "name": "Jollof Rice", "qty": 2, "unit_price": 550}])
+        self.assertEqual((summary, total), ("2 x Jollof Rice", 1100))
+
+    def test_legacy_unresolved_line_is_priced_and_merged_with_a_later_add(self):
+        legacy = [{"item_id": None, "name": "jollof", "qty": 2, "unit_price": 0}]
+        lines, summary, total, _ = apply_cart_updates(legacy, [add("Jollof Rice")], self.db)
+        self.assertEqual(lines, [{"item_id": self.jollof.id, "name": "Jollof Rice", "qty": 3, "unit_price": 500}])
+        self.assertEqual((summary, total), ("3 x Jollof Rice", 1500))
+
+        lines, summary, total, unmatched = apply_cart_updates(legacy, [remove("jollof", 2)], self.db)
+        self.assertEqual((lines, summary, total, unmatched), ([], "", 0, []))
+
+    def test_legacy_line_without_a_menu_match_is_kept_unpriced(self):
+        legacy = [{"item_id": None, "name": "Suya", "qty": 1, "unit_price": 0}]
+        lines, summary, total, _ = apply_cart_updates(legacy, [add("beef")], self.db)
+        self.assertEqual(summary, "1 x Suya, 1 x Beef")
+        self.assertEqual(total, 200)
+
+    def test_orders_without_lines_fall_back_to_the_summary(self):
+        index = menu_cache.get_menu_snapshot(self.db)["index"]
+        self.assertEqual(
+            lines_from_summary("2 x jollof, 1 x Suya, nonsense", index),
+            [
+                {"item_id": self.jollof.id, "name": "Jollof Rice", "qty": 2, "unit_price": 500},
+                {"item_id": None, "name": "Suya", "qty": 1, "unit_price": 0},
+            ],
+        )
+
+        order = Order(items="1 x Beef", lines=None, total_price=200, status="Pending")
+        self.assertEqual(get_order_lines(order, self.db), [{"item_id": self.beef.id, "name": "Beef", "qty": 1, "unit_price": 200}])
+        self.assertEqual(get_order_lines(None, self.db), [])
+
+    def test_stock_deduction_resolves_legacy_lines_by_name(self):
+        order = Order(
+            items="2 x jollof, 1 x Suya",
+            lines=[
+                {"item_id": None, "name": "jollof", "qty": 2, "unit_price": 0},
+                {"item_id": None, "name": "Suya", "qty": 1, "unit_price": 0},
+            ],
+            total_price=0,
+            status="Pending",
+        )
+        self.db.add(order)
+        self.db.flush()
+
+        ok, note, low_alerts = apply_sale_stock_deduction(self.db, order, "telegram", "owner")
+        self.assertTrue(ok)
+        self.assertEqual(note, "Unmapped items skipped for stock deduction: Suya")
+        self.assertEqual(low_alerts, [])
+        self.assertEqual(self.jollof.stock_qty, 8)
+        self.db.flush()
+        self.assertEqual(self.db.query(StockMovement).one().qty, 2)
+
+    def test_stock_deduction_refuses_insufficient_stock(self):
+        order = Order(items="11 x Jollof Rice", lines=[{"item_id": self.jollof.id, "name": "Jollof Rice", "qty": 11, "unit_price": 500}])
+        ok, message, _ = apply_sale_stock_deduction(self.db, order, "telegram", "owner")
+        self.assertFalse(ok)
+        self.assertIn("Jollof Rice (need 11, have 10)", message)
+        self.assertEqual(self.jollof.stock_qty, 10)
+
+
+class OrderLinesBackfillTests(DatabaseTestCase):
+    def test_backfill_resolves_pending_carts_by_menu_name(self):
+        self.db.add_all(
+            [
+                MenuItem(id=1, name="Jollof Rice", price=500),
+                MenuItem(id=2, name="Beef", price=200),
+                MenuItem(id=3, name="Beef Special", price=900),
+                Order(id=10, items="2 x Jollof Rice, 1 x beef", status="Pending"),
+                Order(id=11, items="1 x jollof, 3 x Suya", status="Pending"),
+                Order(id=12, items="1 x Beef", status="PAID"),
+                Order(id=13, items="1 x Beef Special, 2 x beef", status="Pending"),
+            ]
+        )
+        self.db.commit()
+
+        with self.engine.begin() as conn:
+            _load_order_lines_migration().backfill_order_lines(conn)
+
+        self.db.expire_all()
+        lines = {order.id: order.lines for order in self.db.query(Order)}
+        self.assertEqual(
+            lines[10],
+            [
+                {"item_id": 1, "name": "Jollof Rice", "qty": 2, "unit_price": 500},
+                {"item_id": 2, "name": "Beef", "qty": 1, "unit_price": 200},
+            ],
+        )
+        self.assertEqual(
+            lines[11],
+            [
+                {"item_id": 1, "name": "Jollof Rice", "qty": 1, "unit_price": 500},
+                {"item_id": None, "name": "Suya", "qty": 3, "unit_price": 0},
+            ],
+        )
+        self.assertIsNone(lines[12])
+        self.assertEqual([line["item_id"] for line in lines[13]], [3, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
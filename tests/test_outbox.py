@@ -0,0 +1,166 @@
+import asyncio
+import time
+import unittest
+
+import httpx
+
+from app.models.sql_models import Message
+from app.services import outbox
+
+from db_testcase import DatabaseTestCase
+
+
+class OutboxTests(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.original_settings = {
+            "TELEGRAM_BOT_TOKEN": outbox.settings.TELEGRAM_BOT_TOKEN,
+            "OUTBOX_MAX_ATTEMPTS": outbox.settings.OUTBOX_MAX_ATTEMPTS,
+            "OUTBOX_RETRY_BASE_MS": outbox.settings.OUTBOX_RETRY_BASE_MS,
+        }
+        outbox.settings.TELEGRAM_BOT_TOKEN = "test-token"
+        outbox.settings.OUTBOX_MAX_ATTEMPTS = 2
+        outbox.settings.OUTBOX_RETRY_BASE_MS = 1000
+
+        self.original_post = outbox.post_json
+        self.original_apost = outbox.apost_json
+        self.responses = []
+        self.sent = []
+
+        def fake_post(platform, url, payload, headers=None, timeout=None):
+            self.sent.append(payload)
+            status, body, extra_headers = self.responses.pop(0) if self.responses else (200, {"ok": True}, {})
+            return httpx.Response(status, json=body, headers=extra_headers, request=httpx.Request("POST", url))
+
+        async def fake_apost(platform, url, payload, headers=None, timeout=None):
+            return fake_post(platform, url, payload, headers, timeout)
+
+        outbox.post_json = fake_post
+        outbox.apost_json = fake_apost
+        outbox._limiters.clear()
+
+    def tearDown(self):
+        outbox.post_json = self.original_post
+        outbox.apost_json = self.original_apost
+        outbox._limiters.clear()
+        for key, value in self.original_settings.items():
+            setattr(outbox.settings, key, value)
+        super().tearDown()
+
+    def _queue(self, contact_id="42", body="hello"):
+        message = Message(
+            platform="telegram",
+            contact_id=contact_id,
+            direction="outbound",
+            body=body,
+            timestamp=outbox._now_ms(),
+            delivery_status=outbox.STATUS_PENDING,
+            next_attempt_at=outbox._now_ms(),
+        )
+        self.db.add(message)
+        self.db.commit()
+        return message
+
+    def test_pending_rows_are_sent_in_a_batch(self):
+        first = self._queue(contact_id="1", body="a")
+        second = self._queue(contact_id="2", body="b")
+        sent = asyncio.run(outbox.adispatch_outbound_messages(self.db))
+        self.assertEqual(sent, 2)
+        self.assertEqual({p["text"] for p in self.sent}, {"a", "b"})
+        for message in (first, second):
+            self.db.refresh(message)
+            self.assertEqual(message.delivery_status, outbox.STATUS_SENT)
+            self.assertIsNotNone(message.delivered_at)
+
+    def test_server_error_is_retried_with_backoff_then_failed(self):
+        message = self._queue()
+        self.responses = [(502, {"ok": False}, {}), (502, {"ok": False}, {})]
+
+        outbox.dispatch_outbound_messages(self.db)
+        self.db.refresh(message)
+        self.assertEqual(message.delivery_status, outbox.STATUS_PENDING)
+        self.assertEqual(message.delivery_attempts, 1)
+        self.assertGreaterEqual(message.next_attempt_at - outbox._now_ms(), 500)
+
+        # Not due yet: the dispatcher leaves it alone.
+        self.assertEqual(outbox.dispatch_outbound_messages(self.db), 0)
+        self.assertEqual(len(self.sent), 1)
+
+        self._wait_out_the_gap(message)
+        outbox.dispatch_outbound_messages(self.db)
+        self.db.refresh(message)
+        self.assertEqual(message.delivery_status, outbox.STATUS_FAILED)
+
+    def test_rate_limited_reply_honours_retry_after(self):
+        message = self._queue()
+        self.responses = [(429, {"ok": False, "parameters": {"retry_after": 30}}, {})]
+        outbox.dispatch_outbound_messages(self.db)
+        self.db.refresh(message)
+        self.assertEqual(message.delivery_status, outbox.STATUS_PENDING)
+        self.assertGreaterEqual(message.next_attempt_at - outbox._now_ms(), 29_000)
+        self.assertGreater(outbox.get_rate_limiter("telegram").reserve("other"), 29)
+
+    def test_client_error_fails_without_retry(self):
+        message = self._queue()
+        self.responses = [(403, {"ok": False, "description": "bot was blocked"}, {})]
+        outbox.dispatch_outbound_messages(self.db, [message.id])
+        self.db.refresh(message)
+        self.assertEqual(message.delivery_status, outbox.STATUS_FAILED)
+        self.assertEqual(message.delivery_attempts, 1)
+
+    def test_missing_credentials_are_skipped(self):
+        outbox.settings.TELEGRAM_BOT_TOKEN = None
+        message = self._queue()
+        outbox.dispatch_outbound_messages(self.db, [message.id])
+        self.db.refresh(message)
+        self.assertEqual(message.delivery_status, outbox.STATUS_SKIPPED)
+        self.assertEqual(self.sent, [])
+
+    def test_rate_limiter_spaces_messages_to_one_chat(self):
+        limiter = outbox.RateLimiter(rate_per_sec=100, chat_interval_ms=1000)
+        self.assertEqual(limiter.reserve("chat"), 0.0)
+        self.assertGreater(limiter.reserve("chat"), 0.9)
+        self.assertEqual(limiter.reserve("other-chat"), 0.0)
+
+    def test_rate_limiter_does_not_book_a_slot_past_max_wait(self):
+        limiter = outbox.RateLimiter(rate_per_sec=100, chat_interval_ms=1000)
+        limiter.reserve("chat")
+        for _ in range(3):
+            wait = limiter.reserve("chat", max_wait=0.1)
+            self.assertGreater(wait, 0.9)
+            self.assertLessEqual(wait, 1.0)
+
+    def _wait_out_the_gap(self, *messages):
+        outbox.get_rate_limiter("telegram")._chat_next_slot.clear()
+        for message in messages:
+            message.next_attempt_at = 0
+        self.db.commit()
+
+    def test_second_reply_to_a_chat_is_rescheduled_not_slept_on(self):
+        alert = self._queue(body="alert")
+        checkout = self._queue(body="checkout")
+        later = self._queue(body="later")
+
+        started = time.monotonic()
+        sent = outbox.dispatch_outbound_messages(self.db, [alert.id, checkout.id, later.id])
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(sent, 1)
+        self.assertEqual([payload["text"] for payload in self.sent], ["alert"])
+        for message in (checkout, later):
+            self.db.refresh(message)
+            self.assertEqual(message.delivery_status, outbox.STATUS_PENDING)
+            self.assertEqual(message.delivery_attempts, 0)
+            self.assertGreater(message.next_attempt_at - outbox._now_ms(), 800)
+
+        # Not due yet, then sent one gap apart in their original order.
+        self.assertEqual(asyncio.run(outbox.adispatch_outbound_messages(self.db)), 0)
+        self._wait_out_the_gap(checkout, later)
+        self.assertEqual(asyncio.run(outbox.adispatch_outbound_messages(self.db)), 1)
+        self._wait_out_the_gap(later)
+        self.assertEqual(asyncio.run(outbox.adispatch_outbound_messages(self.db)), 1)
+        self.assertEqual([payload["text"] for payload in self.sent], ["alert", "checkout", "later"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+import unittest
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from app.services.menu_cache import MenuEntry, render_compact_menu_text, render_menu_text
+from app.services.prompt_budget import (
+    FEW_SHOT_EXAMPLES,
+    build_order_system_prompt,
+    estimate_tokens,
+    measure_chain_input,
+    order_format_instructions,
+    static_prompt_prefix,
+)
+
+
+def _entry(item_id: int, name: str, price: int) -> MenuEntry:
+    return MenuEntry(id=item_id, name=name, price=price, is_available=True, stock_qty=None, reorder_level=None)
+
+
+MENU = [_entry(1, "Jollof Rice", 500), _entry(2, "Beef", 200), _entry(3, "Water", 100)]
+
+
+class PromptBudgetTests(unittest.TestCase):
+    def render(self, few_shot_set: str, menu_text: str, style: str = "compact") -> str:
+        prompt = ChatPromptTemplate.from_messages([("system", build_order_system_prompt(few_shot_set))])
+        messages = prompt.format_messages(menu=menu_text, format_instructions=order_format_instructions(style))
+        return messages[0].content
+
+    def test_static_prefix_is_byte_stable_across_menus(self):
+        template = build_order_system_prompt("compact")
+        prefix = static_prompt_prefix(template, order_format_instructions("compact"))
+        first = self.render("compact", render_compact_menu_text(MENU))
+        second = self.render("compact", render_compact_menu_text(MENU[:2]))
+        self.assertTrue(first.startswith(prefix))
+        self.assertTrue(second.startswith(prefix))
+        self.assertTrue(first.rstrip().endswith("Water N100"))
+        self.assertNotIn("{menu}", prefix)
+        self.assertNotIn("{format_instructions}", prefix)
+
+    def test_examples_render_as_valid_json(self):
+        for few_shot_set in ("full", "compact"):
+            rendered = self.render(few_shot_set, "Jollof Rice N500")
+            outputs = rendered.split("Output: ")[1:]
+            expected = len(FEW_SHOT_EXAMPLES) if few_shot_set == "full" else sum(e["compact"] for e in FEW_SHOT_EXAMPLES)
+            self.assertEqual(len(outputs), expected)
+            for output in outputs:
+                decoder = json.JSONDecoder()
+                data, _ = decoder.raw_decode(output)
+                self.assertEqual(set(data), {"thought", "message", "extracted_items", "intent"})
+        self.assertNotIn("### EXAMPLES", self.render("none", "Jollof Rice N500"))
+
+    def test_compact_configuration_is_smaller(self):
+        full = self.render("full", render_menu_text(MENU), style="schema")
+        compact = self.render("compact", render_compact_menu_text(MENU), style="compact")
+        self.assertLess(estimate_tokens(compact), estimate_tokens(full) * 0.75)
+
+    def test_compact_menu_keeps_names_and_prices(self):
+        self.assertEqual(render_compact_menu_text(MENU), "Jollof Rice N500; Beef N200; Water N100")
+
+    def test_measure_chain_input(self):
+        budget = measure_chain_input(
+            {"menu": "Jollof Rice N500", "chat_history": ["hello", "hi my dear"], "user_input": "2 jollof"},
+            static_prefix="You are Auntie Chioma.",
+        )
+        self.assertEqual(set(budget), {"static", "menu", "history", "input", "total"})
+        self.assertGreater(budget["history"], 0)
+        self.assertEqual(budget["total"], budget["static"] + budget["menu"] + budget["history"] + budget["input"])
+        self.assertEqual(estimate_tokens(""), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
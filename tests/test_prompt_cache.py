@@ -1,32 +1,103 @@
+import json
 import unittest
 
 from app.services import prompt_cache
 
 
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self):
+        self.redis.round_trips += 1
+        return [getattr(self.redis, name)(*args, _count=False, **kwargs) for name, args, kwargs in self.calls]
+
+
+class FakeLookupScript:
+    """Python stand-in for SEMANTIC_LOOKUP_SCRIPT that counts round trips (test_semantic_lookup_script.py runs the Lua)."""
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    def __call__(self, keys, args):
+        self.redis.round_trips += 1
+        index_key, lsh_key = keys
+        min_ts, max_candidates, entry_prefix, *band_keys = args
+        self.redis.zremrangebyscore(index_key, 0, min_ts, _count=False)
+        signatures = self.redis.zrevrange(index_key, 0, int(max_candidates) - 1, _count=False)
+        if band_keys:
+            signatures += [sig for sig in self.redis.hmget(lsh_key, band_keys, _count=False) if sig]
+        signatures = list(dict.fromkeys(signatures))
+        if not signatures:
+            return []
+        return self.redis.mget([entry_prefix + signature for signature in signatures], _count=False)
+
+
 class FakeRedis:
     def __init__(self):
         self.kv = {}
         self.zsets = {}
+        self.hashes = {}
+        self.round_trips = 0
+
+    def _hit(self, count):
+        if count:
+            self.round_trips += 1
 
-    def ping(self):
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def register_script(self, source):
+        assert "MGET" in source
+        return FakeLookupScript(self)
+
+    def hset(self, key, mapping, _count=True):
+        self._hit(_count)
+        self.hashes.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    def hmget(self, key, fields, _count=True):
+        self._hit(_count)
+        values = self.hashes.get(key, {})
+        return [values.get(field) for field in fields]
+
+    def mget(self, keys, _count=True):
+        self._hit(_count)
+        return [self.kv.get(key) for key in keys]
+
+    def ping(self, _count=True):
+        self._hit(_count)
         return True
 
-    def get(self, key):
+    def get(self, key, _count=True):
+        self._hit(_count)
         return self.kv.get(key)
 
-    def set(self, key, value, ex=None):
+    def set(self, key, value, ex=None, _count=True):
+        self._hit(_count)
         self.kv[key] = value
         return True
 
-    def expire(self, key, ttl):
+    def expire(self, key, ttl, _count=True):
+        self._hit(_count)
         return True
 
-    def zadd(self, key, mapping):
+    def zadd(self, key, mapping, _count=True):
+        self._hit(_count)
         zset = self.zsets.setdefault(key, {})
         zset.update(mapping)
         return True
 
-    def zrevrange(self, key, start, end):
+    def zrevrange(self, key, start, end, _count=True):
+        self._hit(_count)
         zset = self.zsets.get(key, {})
         ordered = sorted(zset.items(), key=lambda x: x[1], reverse=True)
         members = [member for member, _ in ordered]
@@ -34,7 +105,8 @@ class FakeRedis:
             return members[start:]
         return members[start:end + 1]
 
-    def zremrangebyscore(self, key, min_score, max_score):
+    def zremrangebyscore(self, key, min_score, max_score, _count=True):
+        self._hit(_count)
         zset = self.zsets.get(key, {})
         to_remove = [member for member, score in zset.items() if min_score <= score <= max_score]
         for member in to_remove:
@@ -55,6 +127,14 @@ class PromptCacheTests(unittest.TestCase):
             "CACHE_COOLDOWN_SEC": prompt_cache.settings.CACHE_COOLDOWN_SEC,
             "CACHE_SIMILARITY_THRESHOLD": prompt_cache.settings.CACHE_SIMILARITY_THRESHOLD,
             "CACHE_MAX_CANDIDATES": prompt_cache.settings.CACHE_MAX_CANDIDATES,
+            "CACHE_LOCAL_ENABLED": prompt_cache.settings.CACHE_LOCAL_ENABLED,
+            "CACHE_LOCAL_MAX_ENTRIES": prompt_cache.settings.CACHE_LOCAL_MAX_ENTRIES,
+            "CACHE_GLOBAL_ENABLED": prompt_cache.settings.CACHE_GLOBAL_ENABLED,
+            "CACHE_GLOBAL_TTL_SEC": prompt_cache.settings.CACHE_GLOBAL_TTL_SEC,
+            "CACHE_SEMANTIC_BACKEND": prompt_cache.settings.CACHE_SEMANTIC_BACKEND,
+            "CACHE_LSH_ENABLED": prompt_cache.settings.CACHE_LSH_ENABLED,
+            "CACHE_SWR_ENABLED": prompt_cache.settings.CACHE_SWR_ENABLED,
+            "CACHE_SWR_STALE_SEC": prompt_cache.settings.CACHE_SWR_STALE_SEC,
         }
 
         prompt_cache.settings.CACHE_ENABLED = True
@@ -63,8 +143,18 @@ class PromptCacheTests(unittest.TestCase):
         prompt_cache.settings.CACHE_COOLDOWN_SEC = 15
         prompt_cache.settings.CACHE_SIMILARITY_THRESHOLD = 0.4
         prompt_cache.settings.CACHE_MAX_CANDIDATES = 20
+        prompt_cache.settings.CACHE_LOCAL_ENABLED = True
+        prompt_cache.settings.CACHE_LOCAL_MAX_ENTRIES = 1024
+        prompt_cache.settings.CACHE_GLOBAL_ENABLED = True
+        prompt_cache.settings.CACHE_GLOBAL_TTL_SEC = 600
+        prompt_cache.settings.CACHE_SEMANTIC_BACKEND = "jaccard"
+        prompt_cache.settings.CACHE_LSH_ENABLED = True
+        prompt_cache.settings.CACHE_SWR_ENABLED = False
+        prompt_cache.settings.CACHE_SWR_STALE_SEC = 600
+        prompt_cache.clear_local_cache()
 
     def tearDown(self):
+        prompt_cache.clear_local_cache()
         prompt_cache.get_redis_client = self.original_get_redis
         for key, value in self.original_settings.items():
             setattr(prompt_cache.settings, key, value)
@@ -155,6 +245,234 @@ class PromptCacheTests(unittest.TestCase):
         )
         self.assertFalse(ok)
 
+    def _store(self, message_text, reply_text, **overrides):
+        kwargs = {
+            "platform": "telegram",
+            "user_id": "u1",
+            "role": "customer",
+            "message_text": message_text,
+            "menu_text": "- Jollof Rice: N500",
+            "model_identifier": "model-a",
+            "intent": "inquiry",
+            "reply_text": reply_text,
+        }
+        kwargs.update(overrides)
+        return prompt_cache.store_cached_reply(**kwargs)
+
+    def _semantic_lookup(self, message_text):
+        return prompt_cache.get_semantic_cached_reply(
+            platform="telegram",
+            user_id="u1",
+            role="customer",
+            message_text=message_text,
+            menu_text="- Jollof Rice: N500",
+            model_identifier="model-a",
+        )
+
+    def test_store_is_one_round_trip(self):
+        self.fake_redis.round_trips = 0
+        self.assertTrue(self._store("how much is jollof rice", "Jollof na N500"))
+        self.assertEqual(self.fake_redis.round_trips, 1)
+
+    def test_semantic_lookup_is_one_round_trip_regardless_of_candidates(self):
+        for i in range(15):
+            self._store(f"question number {i} about jollof rice", f"reply {i}")
+        self._store("how much is jollof rice", "Jollof na N500")
+
+        self.fake_redis.round_trips = 0
+        hit = self._semantic_lookup("price of jollof rice")
+        self.assertEqual(self.fake_redis.round_trips, 1)
+        self.assertIsNotNone(hit)
+        self.assertEqual(hit["reply"], "Jollof na N500")
+
+    def test_semantic_lookup_without_scripting_uses_pipeline(self):
+        class NoScriptRedis(FakeRedis):
+            register_script = None
+
+        fake = NoScriptRedis()
+        prompt_cache.get_redis_client = lambda: fake
+        self._store("how much is jollof rice", "Jollof na N500")
+
+        fake.round_trips = 0
+        hit = self._semantic_lookup("price of jollof rice")
+        self.assertIsNotNone(hit)
+        self.assertEqual(fake.round_trips, 2)
+
+    def test_embedding_backend_hits_pidgin_paraphrase(self):
+        self._store("what do you have", "We get jollof, beef and plantain")
+        self.assertIsNone(self._semantic_lookup("wetin una get"))
+
+        prompt_cache.settings.CACHE_SEMANTIC_BACKEND = "embedding"
+        self._store("what do you have", "We get jollof, beef and plantain")
+        hit = self._semantic_lookup("wetin una get")
+        self.assertIsNotNone(hit)
+        self.assertEqual(hit["reply"], "We get jollof, beef and plantain")
+
+    def test_lsh_finds_near_duplicates_outside_the_recent_window(self):
+        prompt_cache.settings.CACHE_MAX_CANDIDATES = 2
+        prompt_cache.settings.CACHE_SIMILARITY_THRESHOLD = 0.7
+        self._store("how much is jollof rice today", "Jollof na N500")
+        for i in range(5):
+            self._store(f"tell me about item{i} stuff", f"reply {i}")
+        # Stores can share a millisecond; make insertion order the recency order.
+        for zset in self.fake_redis.zsets.values():
+            for offset, signature in enumerate(list(zset)):
+                zset[signature] += offset
+
+        hit = self._semantic_lookup("how much is jollof rice")
+        self.assertIsNotNone(hit)
+        self.assertEqual(hit["reply"], "Jollof na N500")
+
+        prompt_cache.settings.CACHE_LSH_ENABLED = False
+        self.assertIsNone(self._semantic_lookup("how much is jollof rice"))
+
+    def test_semantic_cache_works_without_redis(self):
+        prompt_cache.get_redis_client = lambda: None
+        prompt_cache.settings.CACHE_MAX_CANDIDATES = 2
+        prompt_cache.settings.CACHE_SIMILARITY_THRESHOLD = 0.7
+        self._store("how much is jollof rice today", "Jollof na N500")
+        for i in range(5):
+            self._store(f"tell me about item{i} stuff", f"reply {i}")
+
+        hit = self._semantic_lookup("how much is jollof rice")
+        self.assertIsNotNone(hit)
+        self.assertEqual(hit["reply"], "Jollof na N500")
+
+        for scope in prompt_cache._local_semantic.values():
+            for signature, (_, payload, band_keys) in list(scope["entries"].items()):
+                scope["entries"][signature] = (0, payload, band_keys)
+        self.assertIsNone(self._semantic_lookup("how much is jollof rice"))
+        self.assertEqual(next(iter(prompt_cache._local_semantic.values()))["buckets"], {})
+
+    def test_semantic_lookup_prunes_expired_signatures(self):
+        self._store("how much is jollof rice", "Jollof na N500")
+        index_key = next(iter(self.fake_redis.zsets))
+        for signature in self.fake_redis.zsets[index_key]:
+            self.fake_redis.zsets[index_key][signature] = 1
+        self.assertIsNone(self._semantic_lookup("price of jollof rice"))
+        self.assertEqual(self.fake_redis.zsets[index_key], {})
+
+    def _exact_lookup(self, message_text, menu_text="- Jollof Rice: N500"):
+        return prompt_cache.get_exact_cached_reply(
+            platform="telegram",
+            user_id="u1",
+            role="customer",
+            message_text=message_text,
+            menu_text=menu_text,
+            model_identifier="model-a",
+        )
+
+    def test_exact_hit_is_served_from_local_cache(self):
+        self._store("hello", "Hello customer", intent="greeting")
+        self.fake_redis.round_trips = 0
+        hit = self._exact_lookup("hello")
+        self.assertEqual(hit["reply"], "Hello customer")
+        self.assertEqual(self.fake_redis.round_trips, 0)
+
+    def test_redis_hit_populates_local_cache(self):
+        self._store("hello", "Hello customer", intent="greeting")
+        prompt_cache.clear_local_cache()
+        self.assertEqual(self._exact_lookup("hello")["reply"], "Hello customer")
+        self.fake_redis.round_trips = 0
+        self.assertEqual(self._exact_lookup("hello")["reply"], "Hello customer")
+        self.assertEqual(self.fake_redis.round_trips, 0)
+
+    def test_local_cache_works_without_redis(self):
+        prompt_cache.get_redis_client = lambda: None
+        self.assertTrue(self._store("hello", "Hello customer", intent="greeting"))
+        self.assertEqual(self._exact_lookup("hello")["reply"], "Hello customer")
+        self.assertIsNone(self._exact_lookup("hello", menu_text="- Jollof Rice: N700"))
+
+        prompt_cache.settings.CACHE_LOCAL_ENABLED = False
+        self.assertFalse(self._store("hi", "Hi", intent="greeting"))
+        self.assertIsNone(self._exact_lookup("hello"))
+
+    def test_local_cache_expires_and_evicts(self):
+        prompt_cache.get_redis_client = lambda: None
+        prompt_cache.settings.CACHE_LOCAL_MAX_ENTRIES = 2
+        self._store("hello", "1", intent="greeting")
+        self._store("good morning", "2", intent="greeting")
+        self._exact_lookup("hello")  # most recently used now
+        self._store("good evening", "3", intent="greeting")
+        self.assertIsNotNone(self._exact_lookup("hello"))
+        self.assertIsNone(self._exact_lookup("good morning"))
+
+        for fingerprint, (_, payload) in list(prompt_cache._local_exact.items()):
+            prompt_cache._local_exact[fingerprint] = (0, payload)
+        self.assertIsNone(self._exact_lookup("hello"))
+        self.assertEqual(len(prompt_cache._local_exact), 1)
+
+    def _store_global(self, message_text, reply_text, intent="inquiry", user_name=None):
+        return prompt_cache.store_global_cached_reply(
+            role="customer",
+            message_text=message_text,
+            menu_text="- Jollof Rice: N500",
+            model_identifier="model-a",
+            intent=intent,
+            reply_text=reply_text,
+            user_name=user_name,
+        )
+
+    def _global_lookup(self, message_text, menu_text="- Jollof Rice: N500", role="customer"):
+        return prompt_cache.get_global_cached_reply(
+            role=role,
+            message_text=message_text,
+            menu_text=menu_text,
+            model_identifier="model-a",
+        )
+
+    def test_global_cache_is_shared_across_users_and_word_order(self):
+        self.assertTrue(self._store_global("How much is jollof?", "Jollof na N500 o"))
+        prompt_cache.clear_local_cache()  # force the Redis tier
+        hit = self._global_lookup("jollof how much")
+        self.assertEqual(hit["reply"], "Jollof na N500 o")
+        self.assertIsNone(self._global_lookup("how much is jollof", menu_text="- Jollof Rice: N700"))
+        self.assertIsNone(self._global_lookup("how much is jollof", role="owner"))
+
+    def test_global_cache_refuses_personal_replies(self):
+        self.assertFalse(self._store_global("how much is jollof", "Your cart is empty, jollof na N500"))
+        self.assertFalse(self._store_global("how much is jollof", "Total: N500, reply PAID when done"))
+        self.assertFalse(self._store_global("hello", "Hello Chidinma!", intent="greeting", user_name="Chidinma Obi"))
+        self.assertFalse(self._store_global("what can I eat", "Sure", intent="irrelevant"))
+        self.assertFalse(self._store_global("add 2 jollof", "Okay"))
+        self.assertIsNone(self._global_lookup("how much is jollof"))
+        self.assertTrue(self._store_global("hello", "Hello dear! Wetin you go chop?", intent="greeting", user_name="Chidinma"))
+
+    def test_global_cache_is_opt_in(self):
+        prompt_cache.settings.CACHE_GLOBAL_ENABLED = False
+        self.assertFalse(self._store_global("how much is jollof", "Jollof na N500"))
+        self.assertIsNone(self._global_lookup("how much is jollof"))
+
+    def _age_all_entries(self, seconds):
+        for key, raw in list(self.fake_redis.kv.items()):
+            payload = json.loads(raw)
+            payload["ts_ms"] -= seconds * 1000
+            self.fake_redis.kv[key] = json.dumps(payload)
+        prompt_cache.clear_local_cache()
+
+    def test_expired_entries_are_served_stale_only_with_swr(self):
+        self._store("hello", "Hello customer", intent="greeting")
+        self._store_global("how much is jollof", "Jollof na N500 o")
+        self._age_all_entries(prompt_cache.settings.CACHE_GLOBAL_TTL_SEC + 1)
+        self.assertIsNone(self._exact_lookup("hello"))
+        self.assertIsNone(self._global_lookup("how much is jollof"))
+
+        prompt_cache.settings.CACHE_SWR_ENABLED = True
+        exact = self._exact_lookup("hello")
+        self.assertTrue(exact["stale"])
+        self.assertEqual(exact["reply"], "Hello customer")
+        self.assertTrue(self._global_lookup("how much is jollof")["stale"])
+
+        self._age_all_entries(prompt_cache.settings.CACHE_SWR_STALE_SEC)
+        self.assertIsNone(self._exact_lookup("hello"))
+
+    def test_fresh_entries_are_not_stale(self):
+        prompt_cache.settings.CACHE_SWR_ENABLED = True
+        self._store("hello", "Hello customer", intent="greeting")
+        self.assertNotIn("stale", self._exact_lookup("hello"))
+        prompt_cache.clear_local_cache()
+        self.assertNotIn("stale", self._exact_lookup("hello"))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,84 @@
+import random
+import unittest
+
+from sqlalchemy import create_engine, insert, text
+
+from app.core.database import Base
+from app.models.sql_models import Message, Order, User
+
+
+# The hot-path statements, in the shape the ORM emits them.
+QUERIES = {
+    "conversation_history": (
+        "SELECT id, direction, body FROM messages "
+        "WHERE platform = :platform AND contact_id = :contact_id AND id > :last_id "
+        "ORDER BY timestamp DESC, id DESC LIMIT 20",
+        "ix_messages_contact_platform_ts",
+    ),
+    "demo_chats": (
+        "SELECT id, contact_id, body FROM messages ORDER BY timestamp DESC LIMIT 50",
+        "ix_messages_timestamp",
+    ),
+    "pending_order": (
+        "SELECT id FROM orders WHERE user_id = :user_id AND status = 'Pending' LIMIT 1",
+        "ix_orders_pending_user_id",
+    ),
+}
+
+
+class HotPathQueryPlanTests(unittest.TestCase):
+    """
+    EXPLAIN QUERY PLAN on an analyzed SQLite dataset. The full-size run
+    (1M messages, optionally on Postgres) is scripts/explain_message_queries.py.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = create_engine("sqlite://")
+        Base.metadata.create_all(cls.engine)
+        rng = random.Random(3)
+        contacts = 500
+        with cls.engine.begin() as conn:
+            conn.execute(insert(User), [{"id": i + 1, "phone_number": f"c{i}", "name": f"User {i}"} for i in range(contacts)])
+            conn.execute(
+                insert(Order),
+                [{"user_id": i + 1, "status": "Pending" if i % 10 == 0 else "PAID"} for i in range(contacts * 4)],
+            )
+            conn.execute(
+                insert(Message),
+                [
+                    {
+                        "platform": "telegram" if n % 3 else "whatsapp",
+                        "contact_id": f"c{rng.randrange(contacts)}",
+                        "direction": "inbound" if n % 2 == 0 else "outbound",
+                        "body": f"message {n}",
+                        "timestamp": 1_700_000_000_000 + n,
+                    }
+                    for n in range(20_000)
+                ],
+            )
+            conn.execute(text("ANALYZE"))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.dispose()
+
+    def _plan(self, sql: str) -> str:
+        params = {"platform": "telegram", "contact_id": "c42", "last_id": 100, "user_id": 43}
+        with self.engine.connect() as conn:
+            return "\n".join(row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql), params))
+
+    def test_hot_path_queries_use_their_index(self):
+        for name, (sql, index_name) in QUERIES.items():
+            with self.subTest(query=name):
+                plan = self._plan(sql)
+                self.assertIn(index_name, plan)
+                self.assertNotIn("SCAN messages\n", plan + "\n")
+                self.assertNotIn("SCAN orders", plan)
+
+    def test_ordering_comes_from_the_index(self):
+        self.assertNotIn("TEMP B-TREE", self._plan(QUERIES["demo_chats"][0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import base64
+import unittest
+
+import numpy as np
+
+from app.services import semantic_backends
+from app.services.prompt_cache import normalize_prompt_text, tokenise_prompt
+
+
+def _entry(text: str, backend) -> dict:
+    normalized = normalize_prompt_text(text)
+    entry = {"reply": text, "tokens": sorted(tokenise_prompt(normalized))}
+    entry.update(backend.features(normalized))
+    return entry
+
+
+def decode_vector(encoded: str) -> np.ndarray | None:
+    """Inverse of encode_vector (EmbeddingBackend decodes its batch inline)."""
+    try:
+        vector = np.frombuffer(base64.b64decode(encoded), dtype=np.float16).astype(np.float32)
+    except Exception:
+        return None
+    return vector if vector.shape == (semantic_backends.EMBEDDING_DIM,) else None
+
+
+class SemanticBackendTests(unittest.TestCase):
+    def test_embedding_is_unit_length_and_deterministic(self):
+        a = semantic_backends.embed_text("how much is jollof rice")
+        b = semantic_backends.embed_text("how much is jollof rice")
+        self.assertAlmostEqual(float(np.linalg.norm(a)), 1.0, places=5)
+        self.assertTrue(np.array_equal(a, b))
+        self.assertFalse(semantic_backends.embed_text("").any())
+
+    def test_vector_encoding_roundtrip(self):
+        vector = semantic_backends.embed_text("una get chicken")
+        decoded = decode_vector(semantic_backends.encode_vector(vector))
+        self.assertTrue(np.allclose(decoded, vector, atol=1e-3))
+        self.assertIsNone(decode_vector("not-base64!"))
+
+    def test_embedding_backend_matches_pidgin_paraphrase(self):
+        backend = semantic_backends.get_semantic_backend("embedding")
+        entries = [
+            _entry("how much is chicken", backend),
+            _entry("what do you have", backend),
+            _entry("how much is jollof rice", backend),
+        ]
+        match, score = backend.best_match(normalize_prompt_text("wetin una get"), set(), entries)
+        self.assertEqual(match["reply"], "what do you have")
+        self.assertGreaterEqual(score, 0.82)
+
+        match, _ = backend.best_match(normalize_prompt_text("price of jollof rice"), set(), entries)
+        self.assertEqual(match["reply"], "how much is jollof rice")
+
+        match, _ = backend.best_match(normalize_prompt_text("how much is fried rice"), set(), entries)
+        self.assertIsNone(match)
+
+    def test_embedding_backend_skips_entries_without_vectors(self):
+        backend = semantic_backends.get_semantic_backend("embedding")
+        jaccard_entry = _entry("what do you have", semantic_backends.get_semantic_backend("jaccard"))
+        self.assertEqual(backend.best_match("what do you have", set(), [jaccard_entry]), (None, 0.0))
+
+    def test_unknown_backend_falls_back_to_jaccard(self):
+        self.assertEqual(semantic_backends.get_semantic_backend("nope").name, "jaccard")
+
+    def test_cosine_top_k_orders_by_score_then_row(self):
+        matrix = np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 0.0], [0.6, 0.8]], dtype=np.float32)
+        top = semantic_backends.cosine_top_k(matrix, np.array([1.0, 0.0], dtype=np.float32), 3)
+        self.assertEqual([row for row, _ in top], [0, 2, 3])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import time
+import unittest
+from unittest import mock
+
+import fakeredis
+
+from app.services import prompt_cache
+
+
+class NoScriptClient:
+    """The same Redis data seen through a client without scripting (the pipelined fallback)."""
+
+    register_script = None
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class SemanticLookupScriptTests(unittest.TestCase):
+    """Runs SEMANTIC_LOOKUP_SCRIPT in fakeredis' Lua runtime against the pipelined fallback."""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        patches = [
+            mock.patch.object(prompt_cache, "get_redis_client", lambda: self.redis),
+            mock.patch.multiple(
+                prompt_cache.settings,
+                CACHE_ENABLED=True,
+                CACHE_SEMANTIC_TTL_SEC=180,
+                CACHE_COOLDOWN_SEC=15,
+                CACHE_SIMILARITY_THRESHOLD=0.4,
+                CACHE_MAX_CANDIDATES=2,
+                CACHE_LOCAL_ENABLED=False,
+                CACHE_SEMANTIC_BACKEND="jaccard",
+                CACHE_LSH_ENABLED=True,
+                CACHE_SWR_ENABLED=False,
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        prompt_cache.clear_local_cache()
+        self.addCleanup(prompt_cache.clear_local_cache)
+        self.parts = prompt_cache._build_context_parts(
+            platform="telegram",
+            user_id="u1",
+            role="customer",
+            message_text="",
+            menu_text="- Jollof Rice: N500",
+            model_identifier="model-a",
+        )
+        self.index_key = prompt_cache._semantic_index_key("telegram", "u1", "customer")
+
+    def _store(self, message_text, reply_text):
+        before = set(self.redis.zrange(self.index_key, 0, -1))
+        self.assertTrue(
+            prompt_cache.store_cached_reply(
+                platform="telegram",
+                user_id="u1",
+                role="customer",
+                message_text=message_text,
+                menu_text="- Jollof Rice: N500",
+                model_identifier="model-a",
+                intent="inquiry",
+                reply_text=reply_text,
+            )
+        )
+        # Stores can share a millisecond; make insertion order the recency order.
+        [signature] = set(self.redis.zrange(self.index_key, 0, -1)) - before
+        self.redis.zadd(self.index_key, {signature: int(time.time() * 1000) + len(before)})
+
+    def _candidates(self, message_text, min_ts=None):
+        """(script result, fallback result) for the same lookup over the same data."""
+        tokens = prompt_cache.tokenise_prompt(prompt_cache.normalize_prompt_text(message_text))
+        band_keys = prompt_cache._band_keys(tokens)
+        if min_ts is None:
+            min_ts = int(time.time() * 1000) - 180 * 1000
+        scripted = prompt_cache._fetch_semantic_candidates(self.redis, self.parts, min_ts, band_keys)
+        pipelined = prompt_cache._fetch_semantic_candidates(NoScriptClient(self.redis), self.parts, min_ts, band_keys)
+        return scripted, pipelined
+
+    def _replies(self, raw_entries):
+        return [prompt_cache._safe_json_loads(raw)["reply"] for raw in raw_entries]
+
+    def test_empty_index_returns_nothing(self):
+        self.assertEqual(self._candidates("how much is jollof rice"), ([], []))
+
+    def test_recent_window_and_lsh_hits_match_the_fallback(self):
+        self._store("how much is jollof rice today", "Jollof na N500")
+        for i in range(4):
+            self._store(f"tell me about item{i} stuff", f"reply {i}")
+
+        scripted, pipelined = self._candidates("how much is jollof rice")
+        self.assertEqual(scripted, pipelined)
+        # The two most recent signatures, then the LSH near-duplicate outside that window.
+        self.assertEqual(self._replies(scripted), ["reply 3", "reply 2", "Jollof na N500"])
+
+    def test_a_signature_in_both_the_window_and_a_bucket_is_fetched_once(self):
+        self._store("tell me about item0 stuff", "reply 0")
+        self._store("how much is jollof rice today", "Jollof na N500")
+
+        scripted, pipelined = self._candidates("how much is jollof rice")
+        self.assertEqual(scripted, pipelined)
+        self.assertEqual(self._replies(scripted), ["Jollof na N500", "reply 0"])
+
+    def test_lookup_without_band_keys_reads_only_the_window(self):
+        self._store("how much is jollof rice today", "Jollof na N500")
+        prompt_cache.settings.CACHE_LSH_ENABLED = False
+
+        scripted, pipelined = self._candidates("how much is jollof rice")
+        self.assertEqual(scripted, pipelined)
+        self.assertEqual(self._replies(scripted), ["Jollof na N500"])
+
+    def test_expired_signatures_are_pruned(self):
+        self._store("how much is jollof rice", "Jollof na N500")
+        self._store("wetin una get", "We get jollof")
+        [old, _] = self.redis.zrange(self.index_key, 0, -1)
+        self.redis.zadd(self.index_key, {old: 1})
+
+        scripted = prompt_cache._fetch_semantic_candidates(self.redis, self.parts, 1000, [])
+        self.assertEqual(len(scripted), 1)
+        self.assertEqual(self.redis.zcard(self.index_key), 1)
+        self.assertEqual(self._candidates("anything", min_ts=1000), (scripted, scripted))
+
+    def test_semantic_hit_through_the_script(self):
+        self._store("how much is jollof rice", "Jollof na N500")
+        hit = prompt_cache.get_semantic_cached_reply(
+            platform="telegram",
+            user_id="u1",
+            role="customer",
+            message_text="price of jollof rice",
+            menu_text="- Jollof Rice: N500",
+            model_identifier="model-a",
+        )
+        self.assertEqual(hit["reply"], "Jollof na N500")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from app.services.single_flight import SingleFlight
+
+
+class SingleFlightTests(unittest.TestCase):
+    def test_threads_share_one_call(self):
+        flights = SingleFlight()
+        calls = []
+        started = threading.Event()
+
+        def slow():
+            calls.append(1)
+            started.set()
+            time.sleep(0.1)
+            return {"message": "hello"}
+
+        results = []
+
+        def worker():
+            results.append(flights.do("hi", slow))
+
+        leader = threading.Thread(target=worker)
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=worker) for _ in range(5)]
+        for thread in followers:
+            thread.start()
+        for thread in [leader, *followers]:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False] + [True] * 5)
+        self.assertTrue(all(result == {"message": "hello"} for result, _ in results))
+        self.assertFalse(flights.in_flight("hi"))
+
+    def test_thread_errors_reach_followers(self):
+        flights = SingleFlight()
+        started = threading.Event()
+        errors = []
+
+        def boom():
+            started.set()
+            time.sleep(0.05)
+            raise ValueError("llm down")
+
+        def worker():
+            try:
+                flights.do("k", boom)
+            except ValueError as exc:
+                errors.append(str(exc))
+
+        threads = [threading.Thread(target=worker)]
+        threads[0].start()
+        started.wait()
+        threads.append(threading.Thread(target=worker))
+        threads[1].start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, ["llm down", "llm down"])
+
+    def test_coroutines_share_one_call(self):
+        flights = SingleFlight()
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "reply"
+
+        async def main():
+            return await asyncio.gather(*[flights.ado("hi", slow) for _ in range(10)])
+
+        results = asyncio.run(main())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([result for result, _ in results], ["reply"] * 10)
+        self.assertEqual(sum(1 for _, shared in results if not shared), 1)
+
+    def test_sequential_calls_do_not_share(self):
+        flights = SingleFlight()
+
+        async def main():
+            first = await flights.ado("k", lambda: asyncio.sleep(0, result=1))
+            second = await flights.ado("k", lambda: asyncio.sleep(0, result=2))
+            return first, second
+
+        self.assertEqual(asyncio.run(main()), ((1, False), (2, False)))
+
+    def test_leader_cancellation_propagates_to_followers(self):
+        flights = SingleFlight()
+
+        async def slow():
+            await asyncio.sleep(1)
+            return "never"
+
+        async def main():
+            leader = asyncio.create_task(flights.ado("k", slow))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(flights.ado("k", slow))
+            await asyncio.sleep(0)
+            leader.cancel()
+            outcomes = await asyncio.gather(leader, follower, return_exceptions=True)
+            return [type(outcome) for outcome in outcomes], flights.in_flight("k")
+
+        outcomes, in_flight = asyncio.run(main())
+        self.assertEqual(outcomes, [asyncio.CancelledError, asyncio.CancelledError])
+        self.assertFalse(in_flight)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import json
+import random
+import unittest
+
+from app.services.stream_json import JsonStringFieldExtractor
+
+
+def _feed_in_chunks(text: str, sizes: list[int]) -> tuple[str | None, int]:
+    """Returns the extracted value and how many characters had been fed when it appeared."""
+    extractor = JsonStringFieldExtractor("message")
+    position = 0
+    for size in sizes:
+        chunk = text[position:position + size]
+        position += size
+        value = extractor.feed(chunk)
+        if value is not None:
+            return value, position
+    return None, position
+
+
+class JsonStringFieldExtractorTests(unittest.TestCase):
+    PAYLOAD = {
+        "thought": 'User typed \\"message\\": \\"hi\\" in pidgin; quote "message": "trap"',
+        "message": 'My dear, na "Jollof" \\o/ \u00e9 \n new line',
+        "extracted_items": [{"item": "Jollof Rice", "quantity": 2, "action": "add"}],
+        "intent": "ordering",
+    }
+
+    def test_value_is_returned_before_the_object_finishes(self):
+        text = json.dumps(self.PAYLOAD)
+        value, consumed = _feed_in_chunks(text, [1] * len(text))
+        self.assertEqual(value, self.PAYLOAD["message"])
+        self.assertLess(consumed, text.index('"extracted_items"'))
+
+    def test_random_chunk_boundaries(self):
+        rng = random.Random(7)
+        for ensure_ascii in (True, False):
+            text = json.dumps(self.PAYLOAD, ensure_ascii=ensure_ascii)
+            for _ in range(200):
+                sizes = [rng.randint(1, 12) for _ in range(len(text))]
+                value, _ = _feed_in_chunks(text, sizes)
+                self.assertEqual(value, self.PAYLOAD["message"])
+
+    def test_pretty_printed_and_fenced_output(self):
+        text = "```json\n" + json.dumps(self.PAYLOAD, indent=4) + "\n```"
+        self.assertEqual(_feed_in_chunks(text, [3] * len(text))[0], self.PAYLOAD["message"])
+
+    def test_value_is_reported_once(self):
+        extractor = JsonStringFieldExtractor("message")
+        self.assertIsNone(extractor.feed('{"message": "hel'))
+        self.assertFalse(extractor.done)
+        self.assertEqual(extractor.feed('lo", "intent": '), "hello")
+        self.assertTrue(extractor.done)
+        self.assertIsNone(extractor.feed('"greeting"}'))
+        self.assertEqual(extractor.value, "hello")
+
+    def test_missing_field(self):
+        text = json.dumps({"thought": "x", "intent": "greeting"})
+        self.assertIsNone(_feed_in_chunks(text, [5] * len(text))[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
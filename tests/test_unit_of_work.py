@@ -0,0 +1,82 @@
+import unittest
+from unittest import mock
+
+from app.models.sql_models import Message
+from app.services import unit_of_work as uow
+from app.services.unit_of_work import commit_count, commit_or_flush, run_after_commit, unit_of_work
+
+from db_testcase import DatabaseTestCase
+
+
+class UnitOfWorkTests(DatabaseTestCase):
+    def _write(self, body: str) -> Message:
+        message = Message(platform="telegram", contact_id="u1", direction="outbound", body=body, timestamp=1)
+        self.db.add(message)
+        commit_or_flush(self.db)
+        return message
+
+    def _stored_bodies(self) -> list[str]:
+        other = self.Session()
+        try:
+            return [row.body for row in other.query(Message).order_by(Message.id)]
+        finally:
+            other.close()
+
+    def test_writes_inside_the_unit_commit_once(self):
+        before = commit_count(self.db)
+        with unit_of_work(self.db):
+            first = self._write("one")
+            self.assertIsNotNone(first.id)  # flushed, so ids are usable mid-turn
+            self._write("two")
+            self.assertEqual(commit_count(self.db), before)
+        self.assertEqual(commit_count(self.db), before + 1)
+        self.assertEqual(self._stored_bodies(), ["one", "two"])
+
+    def test_outside_a_unit_every_write_commits(self):
+        before = commit_count(self.db)
+        self._write("one")
+        self._write("two")
+        self.assertEqual(commit_count(self.db), before + 2)
+
+    def test_exception_rolls_the_whole_unit_back(self):
+        callback = mock.Mock()
+        with self.assertRaises(RuntimeError):
+            with unit_of_work(self.db):
+                self._write("one")
+                run_after_commit(self.db, callback)
+                raise RuntimeError("boom")
+        self.assertEqual(self._stored_bodies(), [])
+        callback.assert_not_called()
+        self.assertNotIn(uow.UOW_ACTIVE_KEY, self.db.info)
+
+    def test_after_commit_callbacks_run_once_the_data_is_visible(self):
+        seen = []
+        with unit_of_work(self.db):
+            self._write("menu change")
+            run_after_commit(self.db, lambda: seen.append(self._stored_bodies()))
+            self.assertEqual(seen, [])
+        self.assertEqual(seen, [["menu change"]])
+
+        run_after_commit(self.db, lambda: seen.append("immediately"))
+        self.assertEqual(seen[-1], "immediately")
+
+    def test_nested_units_join_the_outer_one(self):
+        before = commit_count(self.db)
+        with unit_of_work(self.db):
+            with unit_of_work(self.db):
+                self._write("inner")
+            self.assertEqual(commit_count(self.db), before)
+            self._write("outer")
+        self.assertEqual(commit_count(self.db), before + 1)
+
+    def test_disabled_setting_keeps_per_write_commits(self):
+        before = commit_count(self.db)
+        with mock.patch.object(uow.settings, "UNIT_OF_WORK_ENABLED", False):
+            with unit_of_work(self.db):
+                self._write("one")
+                self._write("two")
+        self.assertEqual(commit_count(self.db), before + 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+# worker.py
+import asyncio
+import logging
+import multiprocessing
+import os
+import socket
+
+from app.core.config import settings
+from app.core.database import engine
+from app.services.delivery_client import aclose_delivery_clients
+from app.services.inbound_queue import run_inbound_worker
+from app.services.outbox import run_outbox_dispatcher
+
+
+async def serve_worker(worker_id: str, index: int, count: int) -> None:
+    try:
+        await run_inbound_worker(worker_id, worker_index=index, worker_count=count)
+    finally:
+        await aclose_delivery_clients()
+
+
+async def serve_outbox() -> None:
+    try:
+        await run_outbox_dispatcher()
+    finally:
+        await aclose_delivery_clients()
+
+
+def _init_process() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+    )
+    # Never reuse pooled connections inherited from the parent process.
+    engine.dispose(close=False)
+
+
+def run_outbox_process() -> None:
+    _init_process()
+    asyncio.run(serve_outbox())
+
+
+def run_worker_process(index: int, count: int) -> None:
+    _init_process()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    asyncio.run(serve_worker(worker_id, index, count))
+
+
+if __name__ == "__main__":
+    # Each process owns a fixed slice of conversation shards, so one chat is
+    # always handled by the same worker and its messages stay in order.
+    worker_count = max(settings.INBOUND_WORKER_COUNT, 1)
+    processes = [
+        multiprocessing.Process(
+            target=run_worker_process,
+            args=(index, worker_count),
+            name=f"inbound-worker-{index}",
+        )
+        for index in range(worker_count)
+    ]
+    if settings.OUTBOX_DISPATCHER_ENABLED:
+        processes.append(multiprocessing.Process(target=run_outbox_process, name="outbox-dispatcher"))
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()